@@ -1,10 +1,69 @@
+import json
+
 from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from route_settings_builder import models, models_utils, search
+
+
+# Количество строк, начиная с которого в перечне показывается оценка количества вместо COUNT(*)
+EXACT_COUNT_LIMIT = 10000
+
+# Наибольшее количество мест маршрута, редактируемых на странице маршрута
+ROUTE_PLACES_INLINE_LIMIT = 100
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Пагинатор с оценкой количества строк по плану запроса: точный COUNT(*) только для небольших выборок """
+    @cached_property
+    def count(self) -> int:
+        plan = json.loads(self.object_list.explain(format='json'))
+        estimated_count = int(plan[0]['Plan']['Plan Rows'])
+        if estimated_count < EXACT_COUNT_LIMIT:
+            return super().count
+        return estimated_count
+
+
+class FullTextSearchMixin:  # pylint: disable=too-few-public-methods
+    """
+    Поиск в перечне и автодополнении по полнотекстовому индексу модели (search.SEARCH_FIELDS) по началам слов.
+    Поля search_exact_fields сравниваются с запросом на точное совпадение
+    """
+    search_exact_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Отбор строк перечня по поисковому запросу
+        :param request: запрос
+        :param queryset: выборка строк перечня
+        :param search_term: поисковый запрос
+        :return: отобранная выборка и признак возможных дубликатов строк
+        """
+        if (query := search.get_prefix_query(search_term)) is None:
+            return queryset, False
 
-from route_settings_builder import models
+        condition = Q(search_vector=query)
+        for field_name in self.search_exact_fields:
+            try:
+                value = get_fields_from_path(self.model, field_name)[-1].to_python(search_term.strip())
+            except ValidationError:
+                continue
+            condition |= Q(**{field_name: value})
+
+        queryset = queryset.alias(search_vector=search.get_search_vector(self.model.__name__)).filter(condition)
+        return queryset, False
 
 
 @admin.register(models.Criterion)
-class CriterionAdmin(admin.ModelAdmin):
+class CriterionAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """ Администраторская страница для критериев """
     search_fields = ('internal_name', 'name', )
     list_display = ('internal_name', 'name', 'value_type', 'updated_at', 'created_at', )
@@ -21,20 +80,32 @@ class PlaceCriterionInline(admin.TabularInline):
 
 
 @admin.register(models.Place)
-class PlaceAdmin(admin.ModelAdmin):
+class PlaceAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """ Администраторская страница для мест """
-    search_fields = ('uuid', 'name', )
+    search_fields = ('name', )
+    search_exact_fields = ('id', )
     list_display = ('name', 'latitude', 'longitude', 'updated_at', 'created_at', )
     ordering = ('-updated_at', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     inlines = (PlaceCriterionInline, )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # описание места входит в подготовленные путеводители маршрутов
+        models.RouteGuide.objects.filter(route__places=obj).delete()
+
 
-class RoutePlaceInline(admin.StackedInline):
-    """ Inline-панель для страницы маршрута. Отображает блок мест для маршрута """
+class RoutePlaceInline(admin.TabularInline):
+    """
+    Inline-панель для страницы маршрута. Отображает блок мест для маршрута.
+    Для маршрутов более чем из ROUTE_PLACES_INLINE_LIMIT мест не выводится: места редактируются в перечне мест маршрута
+    """
     model = models.RoutePlace
 
     autocomplete_fields = ('place',)
+    ordering = ('position', )
     extra = 0
 
 
@@ -47,12 +118,184 @@ class RouteCriterionInline(admin.TabularInline):
 
 
 @admin.register(models.Route)
-class RouteAdmin(admin.ModelAdmin):
+class RouteAdmin(FullTextSearchMixin, admin.ModelAdmin):
     """ Администраторская страница для маршрутов """
-    search_fields = ('uuid', 'name', 'author__username', )
-    list_display = ('name', 'author', 'updated_at', 'created_at', )
+    search_fields = ('name', )
+    search_exact_fields = ('uuid', 'author__username', )
+    list_display = ('name', 'author', 'is_draft', 'places_count', 'updated_at', 'created_at', )
+    list_filter = ('is_draft', )
+    list_select_related = ('author', )
     ordering = ('-updated_at', )
-    readonly_fields = ('uuid', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ('uuid', 'is_draft', 'places_count', 'route_places_link', 'places_bbox', 'criteria_map',
+                       'details_digest', 'details_summary', )
 
     autocomplete_fields = ('author', )
     inlines = (RoutePlaceInline, RouteCriterionInline, )
+
+    def get_inlines(self, request, obj):
+        """
+        Inline-панели страницы маршрута: места большого маршрута не выводятся
+        :param request: запрос
+        :param obj: маршрут
+        :return: классы inline-панелей
+        """
+        if obj is not None and obj.places_count > ROUTE_PLACES_INLINE_LIMIT:
+            return [inline for inline in self.inlines if inline is not RoutePlaceInline]
+        return self.inlines
+
+    @admin.display(description='Места маршрута')
+    def route_places_link(self, obj):
+        """
+        Ссылка на перечень мест маршрута
+        :param obj: маршрут
+        :return: html-ссылка с количеством мест
+        """
+        if obj.pk is None:
+            return '-'
+        return format_html('<a href="{}?route__id__exact={}">{}</a>',
+                           reverse('admin:route_settings_builder_routeplace_changelist'), obj.pk, obj.places_count)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # удаленные в inline-панелях места и критерии не пересчитывают сводку сигналами
+        models_utils.update_routes_summary([form.instance.id])
+        models.RouteGuide.objects.filter(route=form.instance).delete()
+
+
+@admin.register(models.RoutePlace)
+class RoutePlaceAdmin(admin.ModelAdmin):
+    """ Администраторская страница для мест маршрутов: постраничное редактирование мест больших маршрутов """
+    list_display = ('route', 'position', 'place', )
+    list_select_related = ('route', 'place', )
+    list_per_page = ROUTE_PLACES_INLINE_LIMIT
+    ordering = ('route', 'position', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    autocomplete_fields = ('route', 'place', )
+
+    def has_module_permission(self, request):
+        # перечень открывается со страницы маршрута
+        return False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        models.RouteGuide.objects.filter(route_id=obj.route_id).delete()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        models_utils.update_routes_summary([obj.route_id])
+        models.RouteGuide.objects.filter(route_id=obj.route_id).delete()
+
+    def delete_queryset(self, request, queryset):
+        route_ids = set(queryset.values_list('route_id', flat=True))
+        super().delete_queryset(request, queryset)
+        models_utils.update_routes_summary(route_ids)
+        models.RouteGuide.objects.filter(route_id__in=route_ids).delete()
+
+
+@admin.register(models.SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """ Администраторская страница для сводки медленных запросов. Записи добавляются журналом медленных запросов """
+    search_fields = ('fingerprint', 'operation', )
+    list_display = ('fingerprint', 'operation', 'calls', 'average_duration', 'max_duration', 'last_seen_at', )
+    ordering = ('-total_duration', )
+    readonly_fields = ('fingerprint', 'operation', 'sql', 'calls', 'total_duration', 'average_duration',
+                       'max_duration', 'formatted_plan', 'last_seen_at', )
+    exclude = ('plan', )
+
+    @admin.display(description='Средняя длительность, мс')
+    def average_duration(self, obj):
+        """
+        Средняя длительность запроса
+        :param obj: сводка медленного запроса
+        :return: длительность, мс
+        """
+        return round(obj.average_duration, 3)
+
+    @admin.display(description='Последний план запроса')
+    def formatted_plan(self, obj):
+        """
+        Последний план запроса в читаемом виде
+        :param obj: сводка медленного запроса
+        :return: html с планом в формате JSON
+        """
+        if obj.plan is None:
+            return '-'
+        return format_html('<pre>{}</pre>', json.dumps(obj.plan, ensure_ascii=False, indent=2))
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """ Администраторская страница для профилей запросов. Профиль можно скачать в формате pstats """
+    list_display = ('operation', 'status_code', 'duration', 'queries_count', 'queries_duration', 'user',
+                    'created_at', )
+    list_select_related = ('user', )
+    ordering = ('-id', )
+    readonly_fields = ('operation', 'path', 'status_code', 'duration', 'queries_count', 'queries_duration', 'user',
+                       'created_at', 'profile_link', 'formatted_stats', 'formatted_queries', )
+    exclude = ('queries', 'stats', 'profile', )
+
+    def get_urls(self):
+        return [
+            path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_profile),
+                 name='route_settings_builder_requestprofile_download'),
+            *super().get_urls(),
+        ]
+
+    def download_profile(self, request, profile_id: int):
+        """
+        Скачивание профиля запроса в формате pstats
+        :param request: запрос
+        :param profile_id: id профиля
+        :return: файл профиля
+        """
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        request_profile = get_object_or_404(models.RequestProfile.objects.only('profile'), id=profile_id)
+        response = HttpResponse(bytes(request_profile.profile), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.prof"'
+        return response
+
+    @admin.display(description='Профиль (pstats)')
+    def profile_link(self, obj):
+        """
+        Ссылка на скачивание профиля
+        :param obj: профиль запроса
+        :return: html-ссылка
+        """
+        return format_html('<a href="{}">profile-{}.prof</a>',
+                           reverse('admin:route_settings_builder_requestprofile_download', args=(obj.id, )), obj.id)
+
+    @admin.display(description='Статистика профиля')
+    def formatted_stats(self, obj):
+        """
+        Текстовая статистика профиля
+        :param obj: профиль запроса
+        :return: html со статистикой
+        """
+        return format_html('<pre>{}</pre>', obj.stats)
+
+    @admin.display(description='Запросы к БД')
+    def formatted_queries(self, obj):
+        """
+        Журнал запросов к БД с длительностью и БД каждого запроса
+        :param obj: профиль запроса
+        :return: html с журналом
+        """
+        return format_html('<pre>{}</pre>', '\n'.join(f'{query["duration"]:>10.3f} ms  [{query["database"]}] '
+                                                        f'{query["sql"]}' for query in obj.queries))
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
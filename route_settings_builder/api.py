@@ -1,20 +1,33 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
 
 from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, HttpResponseNotModified
 
-from django.shortcuts import render
 from ninja import NinjaAPI, Query, pagination, errors
 from ninja_apikey.security import APIKeyAuth
 
-from route_settings_builder import models, schemas, filters, models_utils, gateways
+from route_settings_builder import (models, schemas, filters, fieldsets, renderers, compression, search, routers,
+                                    throttling, build_events, models_utils)
+from route_settings_builder.db_pool import pool as db_pool
 
 
-auth = APIKeyAuth()  # TODO: bearer token авторизация
-api = NinjaAPI(csrf=True, auth=auth)
+class RoutedAPIKeyAuth(APIKeyAuth):  # pylint: disable=too-few-public-methods
+    """ Авторизация по API-ключу. Чтения пользователя, недавно изменявшего данные, выполняются на основной БД """
 
+    def authenticate(self, request, key):
+        user = super().authenticate(request, key)
+        if user:
+            routers.use_primary_if_pinned(user.id)
+        return user
 
-class AsyncAPIKeyAuth(APIKeyAuth):  # pylint: disable=too-few-public-methods
+
+auth = RoutedAPIKeyAuth()  # TODO: bearer token авторизация
+api = NinjaAPI(csrf=True, auth=auth, renderer=renderers.ORJSONRenderer())
+
+
+class AsyncAPIKeyAuth(RoutedAPIKeyAuth):  # pylint: disable=too-few-public-methods
     """ Асинхронная авторизация """
 
     @sync_to_async
@@ -28,21 +41,77 @@ def health_status(request):
     return {'status': 'ok'}
 
 
+@api.get('/health/db-pools', response={200: dict})
+def get_db_pools_stats(request):
+    """ Статистика пулов подключений процесса к БД (ENGINE route_settings_builder.db_pool). Для сотрудников """
+    if not request.user.is_staff:
+        raise errors.HttpError(403, 'Недостаточно прав')
+
+    return db_pool.get_pools_stats()
+
+
 @api.get('/places', response={200: List[schemas.PlaceSchema]})
+@renderers.render_rows(schemas.PlaceSchema)
 @pagination.paginate()
-def get_places(request, request_filters: filters.PlaceFilterSchema = Query(...)):
+def get_places(request, request_filters: filters.PlaceFilterSchema = Query(...),
+               search_query: filters.SearchSchema = Query(...), fieldset: fieldsets.FieldsetSchema = Query(...)):
     """ Получение перечня мест """
-    places = models.Place.objects.all()
-    places = request_filters.filter(places)
-    return places
+    places = search_query.apply(request_filters.filter(models.Place.objects.all()))
+    return places.values_rows(fieldset.select(schemas.PlaceSchema))
+
+
+@api.post('/places/distances', response=schemas.PlaceDistancesSchema)
+def get_places_distances(request, payload: schemas.PlaceDistancesRequestSchema):
+    """ Получение матрицы расстояний между местами """
+    # модули с numpy загружаются при первом обращении, а не при запуске процесса
+    from route_settings_builder import distances  # pylint: disable=import-outside-toplevel
+
+    try:
+        distance_matrix = distances.place_distances.get_distance_matrix(payload.place_ids, payload.other_place_ids)
+    except models.Place.DoesNotExist as ex:
+        raise errors.HttpError(404, str(ex)) from ex
+
+    return renderers.json_response({'distances': distance_matrix})
+
+
+@api.get('/places/clusters', response=List[schemas.PlaceClusterSchema])
+def get_places_clusters(request, bbox: str, zoom: int = Query(..., ge=0)):
+    """ Получение кластеров мест в границах области bbox (запад,юг,восток,север) на масштабе карты zoom """
+    from route_settings_builder import clusters, geo  # pylint: disable=import-outside-toplevel
+
+    try:
+        bounds = geo.parse_bbox(bbox)
+    except ValueError as ex:
+        raise errors.HttpError(400, str(ex)) from ex
+
+    return clusters.get_clusters(bounds, zoom)
+
+
+@api.get('/places/tiles/{zoom}/{tile_x}/{tile_y}', response={200: bytes})
+def get_places_tile(request, zoom: int, tile_x: int, tile_y: int):
+    """ Получение тайла мест в двоичном формате (см. route_settings_builder.tiles) """
+    from route_settings_builder import tiles  # pylint: disable=import-outside-toplevel
+
+    if not tiles.is_valid_tile(zoom, tile_x, tile_y):
+        raise errors.HttpError(404, 'Тайл не найден')
+
+    content = tiles.get_tile(zoom, tile_x, tile_y)
+    etag = f'"{compression.get_digest(content)}"'
+    if request.headers.get('If-None-Match') in (etag, f'W/{etag}'):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=tiles.TILE_CONTENT_TYPE)
+
+    response.headers['ETag'] = etag
+    return response
 
 
 @api.get('/places/{place_id}', response=schemas.DetailedPlaceSchema)
-def get_place(request, place_id: int):
+@fieldsets.sparse(schemas.DetailedPlaceSchema)
+def get_place(request, place_id: int, fieldset: fieldsets.FieldsetSchema = Query(...)):
     """ Получение места """
     try:
-        # TODO: Оптимизация запросов к БД
-        place = models.Place.objects.get(uuid=place_id)
+        place = models.Place.objects.select_fields(fieldset.select(schemas.DetailedPlaceSchema)).get(id=place_id)
     except models.Place.DoesNotExist as ex:
         raise errors.HttpError(404, 'Место не найдено') from ex
 
@@ -50,26 +119,61 @@ def get_place(request, place_id: int):
 
 
 @api.get('/criteria', response=List[schemas.CriterionSchema])
-def get_criteria(request, request_filters: filters.CriterionFilterSchema = Query(...)):
+def get_criteria(request, request_filters: filters.CriterionFilterSchema = Query(...),
+                 search_query: filters.SearchSchema = Query(...)):
     """ Получение перечня критериев """
     criteria = models.Criterion.objects.all()
     criteria = request_filters.filter(criteria)
-    return criteria
+    return search_query.apply(criteria)
+
+
+@api.get('/search/typeahead', response=schemas.TypeaheadSchema)
+def get_typeahead(request, text: str = Query(..., alias='q'), limit: int = Query(search.TYPEAHEAD_LIMIT, ge=1, le=20)):
+    """ Подсказки при вводе по началам слов наименований (q - введенный текст) """
+    return {
+        'places': search.typeahead(models.Place.objects.all(), text, ('id', 'name'), limit),
+        'routes': search.typeahead(models.Route.objects.filter(author=request.user), text, ('uuid', 'name'), limit),
+        'criteria': search.typeahead(models.Criterion.objects.all(), text, ('id', 'name', 'internal_name'), limit),
+    }
 
 
 @api.get('/routes', response=List[schemas.ListRouteSchema])
+@renderers.render_rows(schemas.ListRouteSchema)
 @pagination.paginate()
-def get_routes(request, request_filters: filters.RouteFilterSchema = Query(...)):
+def get_routes(request, request_filters: filters.RouteFilterSchema = Query(...),
+               search_query: filters.SearchSchema = Query(...), fieldset: fieldsets.FieldsetSchema = Query(...)):
     """ Получение перечня мест """
-    routes = models.Route.objects.filter(author=request.user).add_is_draft_field().all()
-    routes = request_filters.filter(routes)
-    return routes
+    routes = models.Route.objects.filter(author=request.user)
+    routes = search_query.apply(request_filters.filter(routes))
+    return routes.values_rows(fieldset.select(schemas.ListRouteSchema))
+
+
+@api.post('/routes/batch/delete/', response=List[schemas.BatchRouteResultSchema])
+def delete_routes(request, payload: schemas.BatchRoutesSchema):
+    """ Удаление нескольких маршрутов. Результат - по каждому UUID запроса """
+    return models_utils.delete_routes(request.user, payload.uuids)
+
+
+@api.patch('/routes/batch/', response=List[schemas.BatchRouteResultSchema])
+def update_routes(request, payload: schemas.BatchUpdateRoutesSchema):
+    """ Изменение нескольких маршрутов. Результат - по каждому UUID запроса """
+    route_data = payload.dict(exclude_unset=True)
+    routes_uuids = route_data.pop('uuids')
+
+    try:
+        return models_utils.update_routes(request.user, routes_uuids, route_data)
+    except Exception as ex:
+        raise errors.HttpError(400, str(ex)) from ex
 
 
 @api.get('/routes/{route_uuid}', response=schemas.DetailedRouteSchema)
-def get_route(request, route_uuid: uuid.UUID):
-    """ Получение маршрута """
-    return _get_route(request, route_uuid, prefetch=('places', ))
+@fieldsets.sparse(schemas.DetailedRouteSchema)
+def get_route(request, route_uuid: uuid.UUID, response: HttpResponse,
+              fieldset: fieldsets.FieldsetSchema = Query(...)):
+    """ Получение маршрута. ETag - версия маршрута для If-Match при обновлении """
+    route = _get_route(request, route_uuid, fields=fieldset.select(schemas.DetailedRouteSchema))
+    response.headers['ETag'] = _get_route_etag(route)
+    return route
 
 
 @api.post('/routes/', response=schemas.DetailedRouteSchema)
@@ -82,31 +186,75 @@ def create_route(request, payload: schemas.CreateRouteSchema):
 
 
 @api.put('/routes/{route_uuid}/', response=schemas.DetailedRouteSchema)
-def update_route(request, route_uuid: uuid.UUID, payload: schemas.CreateRouteSchema):
-    """ Обновление маршрута """
-    try:
-        request_data = payload.dict()
-        for not_required_field_name in ('guide_description', 'criteria'):
-            if not_required_field_name not in request_data:
-                request_data[not_required_field_name] = None
+def update_route(request, route_uuid: uuid.UUID, payload: schemas.CreateRouteSchema, response: HttpResponse):
+    """ Обновление маршрута. If-Match - версия маршрута из ETag, при несовпадении ответ 412 """
+    request_data = payload.dict()
+    for not_required_field_name in ('guide_description', 'criteria'):
+        if not_required_field_name not in request_data:
+            request_data[not_required_field_name] = None
 
-        return _operate_route(request, request_data, route_uuid)
-    except models.Route.DoesNotExist as ex:
-        raise errors.HttpError(404, 'Маршрут не найден') from ex
-    except Exception as ex:
-        raise errors.HttpError(400, str(ex)) from ex
+    return _update_route(request, route_uuid, request_data, response)
 
 
 @api.patch('/routes/{route_uuid}/', response=schemas.DetailedRouteSchema)
-def partial_update_route(request, route_uuid: uuid.UUID, payload: schemas.UpdateRouteSchema):
-    """ Частичное обновление маршрута """
+def partial_update_route(request, route_uuid: uuid.UUID, payload: schemas.UpdateRouteSchema, response: HttpResponse):
+    """ Частичное обновление маршрута. If-Match - версия маршрута из ETag, при несовпадении ответ 412 """
+    return _update_route(request, route_uuid, payload.dict(exclude_unset=True), response)
+
+
+@api.post('/routes/{route_uuid}/clone/', response=schemas.DetailedRouteSchema)
+def clone_route(request, route_uuid: uuid.UUID, payload: schemas.CloneRouteSchema):
+    """ Копирование маршрута с местами, критериями и, если указано, результатом строительства """
     try:
-        return _operate_route(request, payload.dict(exclude_unset=True), route_uuid)
+        return models_utils.clone_route(route_uuid, request.user, payload.name, payload.details)
     except models.Route.DoesNotExist as ex:
         raise errors.HttpError(404, 'Маршрут не найден') from ex
+
+
+@api.get('/routes/{route_uuid}/suggested-places', response=List[schemas.SuggestedPlaceSchema])
+def get_suggested_places(request, route_uuid: uuid.UUID,
+                         limit: Optional[int] = Query(None, ge=1, le=100), near_route: bool = False):
+    """
+    Подбор мест по критериям маршрута. limit по умолчанию - recommendations.DEFAULT_LIMIT,
+    near_route - только в границах мест маршрута
+    """
+    from route_settings_builder import recommendations  # pylint: disable=import-outside-toplevel
+
+    route = _get_route(request, route_uuid, fields=())
+
+    return [schemas.SuggestedPlaceSchema(id=place.id, name=place.name, latitude=place.latitude,
+                                         longitude=place.longitude, score=score)
+            for place, score in recommendations.suggest_places(route, limit or recommendations.DEFAULT_LIMIT,
+                                                               near_route)]
+
+
+@api.post('/routes/{route_uuid}/places/', response={204: None})
+def insert_route_place(request, route_uuid: uuid.UUID, payload: schemas.InsertRoutePlaceSchema):
+    """ Добавление места в маршрут после указанного места """
+    route = _get_route(request, route_uuid, fields=())
+
+    try:
+        models_utils.insert_route_place(route, payload.place_id, payload.after_place_id)
+    except models.RoutePlace.DoesNotExist as ex:
+        raise errors.HttpError(404, 'Место маршрута не найдено') from ex
     except Exception as ex:
         raise errors.HttpError(400, str(ex)) from ex
 
+    return 204, None
+
+
+@api.post('/routes/{route_uuid}/places/{place_id}/move/', response={204: None})
+def move_route_place(request, route_uuid: uuid.UUID, place_id: int, payload: schemas.MoveRoutePlaceSchema):
+    """ Перемещение места маршрута после указанного места """
+    route = _get_route(request, route_uuid, fields=())
+
+    try:
+        models_utils.move_route_place(route, place_id, payload.after_place_id)
+    except models.RoutePlace.DoesNotExist as ex:
+        raise errors.HttpError(404, 'Место маршрута не найдено') from ex
+
+    return 204, None
+
 
 @api.delete('/routes/{route_uuid}/', response={204: None}, auth=AsyncAPIKeyAuth())
 async def remove_route(request, route_uuid: uuid.UUID):
@@ -117,12 +265,14 @@ async def remove_route(request, route_uuid: uuid.UUID):
     if not delete_count:
         raise errors.HttpError(404, 'Маршрут не найден')
 
+    await sync_to_async(routers.pin_primary)(request.user.id)
+
     return 204, None
 
 
 @api.post('/routes/{route_uuid}/build/', auth=AsyncAPIKeyAuth(), response={204: None})
-async def build_route(request, route_uuid: uuid.UUID):
-    """ Запрос на строительство маршрута """
+async def build_route(request, route_uuid: uuid.UUID, optimize: bool = False):
+    """ Запрос на строительство маршрута. optimize - предварительно оптимизировать порядок мест """
     await request.auth
 
     try:
@@ -130,6 +280,18 @@ async def build_route(request, route_uuid: uuid.UUID):
     except models.Route.DoesNotExist as ex:
         raise errors.HttpError(404, 'Маршрут не найден') from ex
 
+    # клиент брокера загружается при первом строительстве, а не при запуске процесса
+    from route_settings_builder import gateways  # pylint: disable=import-outside-toplevel
+
+    try:
+        await gateways.check_queue_depth()
+        await sync_to_async(throttling.consume_build_token)(request.user.id)
+    except throttling.Throttled as ex:
+        return _get_throttled_response(request, ex)
+
+    if optimize:
+        await sync_to_async(models_utils.optimize_route_places_order)(route)
+
     request = {
         'points_coordinates': await sync_to_async(models_utils.get_points_coordinates_from_route_places)(route),
         **await sync_to_async(models_utils.get_criteria_from_route)(route)
@@ -138,19 +300,67 @@ async def build_route(request, route_uuid: uuid.UUID):
     await gateways.build_route(route_uuid, request)
 
 
+@api.get('/routes/{route_uuid}/build/events/', auth=AsyncAPIKeyAuth(), response={200: None})
+async def get_route_build_events(request, route_uuid: uuid.UUID, after: Optional[str] = None):
+    """
+    Ожидание завершения строительства маршрута (text/event-stream, одно событие на запрос).
+    after или заголовок Last-Event-ID - известный клиенту хеш результата: если результат уже другой,
+    событие отправляется сразу. Без известного результата событие отправляется сразу, если маршрут уже построен.
+    Без события за BUILD_EVENTS_TIMEOUT секунд ответ не содержит событий
+    """
+    await request.auth
+    last_event_id = after or request.headers.get('Last-Event-ID')
+
+    # после уведомления чтение с основной БД: реплика может еще не содержать результат
+    route_query = (models.Route.objects.using(DEFAULT_DB_ALIAS)
+                   .filter(author=request.user, uuid=route_uuid)
+                   .values('uuid', 'is_draft', 'details_digest', 'details_summary'))
+
+    # подписка до чтения маршрута, чтобы не пропустить событие между чтением и ожиданием
+    async with build_events.listener.subscribe(route_uuid) as build_finished:
+        if (route_data := await route_query.afirst()) is None:
+            raise errors.HttpError(404, 'Маршрут не найден')
+
+        if last_event_id is None:
+            is_waiting = route_data['is_draft']
+        else:
+            is_waiting = last_event_id == route_data['details_digest']
+
+        if is_waiting:
+            route_data = await route_query.afirst() if await build_events.listener.wait(build_finished) else None
+
+    response = HttpResponse(build_events.format_event(route_data), content_type='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
 @api.get('/routes/{route_uuid}/guide/', response={200: str})
 def get_route_guide(request, route_uuid: uuid.UUID):
     """ Запрос на получение гида """
-    route = _get_route(request, route_uuid, add_draft_field=False, prefetch=('places', ))
+    route = _get_route(request, route_uuid)
 
     if guide_description := route.guide_description:
         return guide_description
 
-    route_places = route.places.values('name', 'description')
-    return render(request, 'guide.html', context={
-        'route': route,
-        'route_places': list(route_places),
-    })
+    try:
+        route_guide = route.stored_guide
+    except models.RouteGuide.DoesNotExist:
+        route_guide = models_utils.save_route_guide(route)
+
+    return compression.precompressed_response(request, route_guide.get_variants(),
+                                              'text/html; charset=utf-8', route_guide.digest)
+
+
+@api.get('/routes/{route_uuid}/details/', response={200: dict})
+def get_route_details(request, route_uuid: uuid.UUID):
+    """ Получение результата строительства маршрута в заранее сжатом виде """
+    try:
+        stored_details = models.RouteDetails.objects.get(route__author=request.user, route__uuid=route_uuid)
+    except models.RouteDetails.DoesNotExist as ex:
+        raise errors.HttpError(404, 'Результат строительства маршрута не найден') from ex
+
+    return compression.precompressed_response(request, stored_details.get_variants(),
+                                              renderers.JSON_CONTENT_TYPE, stored_details.digest)
 
 
 def _operate_route(request, route_data: dict, *args):
@@ -165,22 +375,81 @@ def _operate_route(request, route_data: dict, *args):
     return models_utils.create_or_update_route(route_data, *args)
 
 
-def _get_route(request, route_uuid: uuid.UUID, add_draft_field: Optional[bool] = True,
-               prefetch: Optional[tuple] = None) -> models.Route:
+def _update_route(request, route_uuid: uuid.UUID, route_data: dict, response: HttpResponse) -> models.Route:
+    """
+    Обновление маршрута с проверкой версии из заголовка If-Match
+    :param request: запрос
+    :param route_uuid: значение uuid маршрута
+    :param route_data: данные маршрута
+    :param response: ответ, в который добавляется ETag новой версии
+    :return: маршрут
+    """
+    try:
+        route = _operate_route(request, route_data, route_uuid, _get_expected_route_version(request))
+    except models.Route.DoesNotExist as ex:
+        raise errors.HttpError(404, 'Маршрут не найден') from ex
+    except models_utils.RouteVersionConflict as ex:
+        raise errors.HttpError(412, str(ex)) from ex
+    except Exception as ex:
+        raise errors.HttpError(400, str(ex)) from ex
+
+    response.headers['ETag'] = _get_route_etag(route)
+    return route
+
+
+def _get_throttled_response(request, exception: throttling.Throttled) -> HttpResponse:
+    """
+    Получение ответа на отклоненный запрос
+    :param request: запрос
+    :param exception: причина отклонения
+    :return: ответ 429 или 503 с заголовком Retry-After
+    """
+    response = api.create_response(request, {'detail': str(exception)}, status=exception.status_code)
+    response.headers['Retry-After'] = str(exception.retry_after)
+    return response
+
+
+def _get_route_etag(route: models.Route) -> str:
+    """
+    Получение ETag маршрута по его версии
+    :param route: маршрут
+    :return: значение заголовка ETag
+    """
+    return f'"{route.version}"'
+
+
+def _get_expected_route_version(request) -> Optional[int]:
+    """
+    Получение версии маршрута из заголовка If-Match
+    :param request: запрос
+    :return: версия или None, если заголовок не передан или равен *
+    """
+    if_match = request.headers.get('If-Match', '').strip()
+    if not if_match or if_match == '*':
+        return None
+
+    try:
+        return int(if_match.removeprefix('W/').strip('"'))
+    except ValueError as ex:
+        raise errors.HttpError(412, 'Некорректное значение If-Match') from ex
+
+
+def _get_route(request, route_uuid: uuid.UUID, prefetch: Optional[tuple] = None,
+               fields: Optional[Tuple[str, ...]] = None) -> models.Route:
     """
     Запрос на получение маршрута по uuid
     :param route_uuid: значение uuid маршрута
+    :param fields: перечень полей схемы ответа, ограничивающий выборку
     :return: маршрут
     """
     base_query = models.Route.objects.filter(author=request.user)
 
-    if add_draft_field:
-        base_query = base_query.add_is_draft_field()
+    if fields is not None:
+        base_query = base_query.select_fields(fields)
     if prefetch:
         base_query = base_query.prefetch_related(*prefetch)
 
     try:
-        # TODO: оптимизация запросов к БД
         route = base_query.get(uuid=route_uuid)
     except models.Route.DoesNotExist as ex:
         raise errors.HttpError(404, 'Маршрут не найден') from ex
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RouteSettingsBuilderConfig(AppConfig):
+    """ Конфигурация приложения """
+    name = 'route_settings_builder'
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel,unused-import
+        from route_settings_builder import signals  # noqa: F401
@@ -0,0 +1,219 @@
+"""
+События завершения строительства маршрутов.
+Сохранение результата строительства отправляет NOTIFY в канал BUILD_EVENTS_CHANNEL (доставляется
+при фиксации транзакции), поэтому событие получают процессы сервиса, не обрабатывавшие ответ строителя.
+В каждом процессе одно подключение LISTEN читается циклом событий отдельного потока и будит ожидающие запросы
+в их циклах событий, поэтому подключение не зависит от цикла запроса (под WSGI каждый асинхронный запрос
+выполняется в новом цикле async_to_sync).
+Ответ в формате text/event-stream содержит одно событие: клиент EventSource переподключается
+и передает id последнего события в Last-Event-ID.
+"""
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, Optional, Set
+import asyncio
+import json
+import threading
+import uuid
+
+import psycopg2
+from psycopg2 import extensions
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+
+BUILD_EVENTS_CHANNEL = 'route_builds'
+BUILD_EVENT_NAME = 'built'
+
+# Время ожидания события в одном запросе, сек.; интервал переподключения клиента, мс
+BUILD_EVENTS_TIMEOUT = 25
+BUILD_EVENTS_RETRY = 1000
+
+
+def notify(route_uuid: uuid.UUID) -> None:
+    """
+    Отправка события о завершении строительства маршрута при фиксации текущей транзакции
+    :param route_uuid: UUID маршрута
+    :return: None
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [BUILD_EVENTS_CHANNEL, str(route_uuid)])
+
+
+def format_event(route_data: Optional[dict]) -> str:
+    """
+    Форматирование ответа text/event-stream
+    :param route_data: uuid, is_draft, details_digest и details_summary маршрута. None - событий нет
+    :return: тело ответа
+    """
+    if route_data is None:
+        return f'retry: {BUILD_EVENTS_RETRY}\n: no events\n\n'
+
+    return (f'retry: {BUILD_EVENTS_RETRY}\n'
+            f'id: {route_data["details_digest"] or ""}\n'
+            f'event: {BUILD_EVENT_NAME}\n'
+            f'data: {json.dumps(route_data, ensure_ascii=False, default=str)}\n\n')
+
+
+class BuildEventsListener:
+    """
+    Подписка на события строительства маршрутов через LISTEN.
+    Подключение обслуживается циклом событий потока listener'а, подписки завершаются в циклах подписчиков
+    """
+    def __init__(self) -> None:
+        self._subscribers: Dict[str, Set[asyncio.Future]] = defaultdict(set)
+        self._subscribers_lock = threading.Lock()
+        self._connection: Optional[extensions.connection] = None
+        # дескриптор подключения: у закрытого сервером подключения fileno() недоступен
+        self._connection_fileno: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._listen_lock: Optional[asyncio.Lock] = None
+
+    @asynccontextmanager
+    async def subscribe(self, route_uuid: uuid.UUID):
+        """
+        Подписка на событие маршрута. Подписка действует до выхода из контекста
+        :param route_uuid: UUID маршрута
+        :return: future, завершающийся при событии
+        """
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._listen(), self._get_loop()))
+
+        key = str(route_uuid)
+        future = asyncio.get_running_loop().create_future()
+        with self._subscribers_lock:
+            self._subscribers[key].add(future)
+        try:
+            yield future
+        finally:
+            with self._subscribers_lock:
+                self._subscribers[key].discard(future)
+                if not self._subscribers[key]:
+                    del self._subscribers[key]
+
+    @staticmethod
+    async def wait(future: asyncio.Future, timeout: Optional[float] = None) -> bool:
+        """
+        Ожидание события подписки
+        :param future: future подписки
+        :param timeout: время ожидания, сек. None - BUILD_EVENTS_TIMEOUT
+        :return: событие получено
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or BUILD_EVENTS_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+    def close(self) -> None:
+        """
+        Закрытие подключения LISTEN. Ожидающие подписки завершаются без события.
+        Поток listener'а продолжает работать, следующая подписка открывает новое подключение
+        :return: None
+        """
+        if self._loop is None:
+            return
+
+        try:
+            is_listener_thread = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            is_listener_thread = False
+
+        if is_listener_thread:
+            self._close_connection()
+        else:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Получение цикла событий потока listener'а. Поток запускается при первой подписке
+        :return: цикл событий
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='build-events-listener', daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _listen(self) -> None:
+        """
+        Подключение LISTEN, если его еще нет. Выполняется в цикле событий потока listener'а
+        :return: None
+        """
+        if self._listen_lock is None:
+            self._listen_lock = asyncio.Lock()
+
+        async with self._listen_lock:
+            if self._connection is not None and not self._connection.closed:
+                return
+            self._close_connection()
+
+            conn_params = connections[DEFAULT_DB_ALIAS].get_connection_params()
+            listen_connection = await self._loop.run_in_executor(None, partial(psycopg2.connect, **conn_params))
+            listen_connection.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with listen_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {BUILD_EVENTS_CHANNEL}')
+
+            self._connection, self._connection_fileno = listen_connection, listen_connection.fileno()
+            self._loop.add_reader(self._connection_fileno, self._on_readable)
+
+    async def _close(self) -> None:
+        """
+        Закрытие подключения LISTEN в цикле событий потока listener'а
+        :return: None
+        """
+        self._close_connection()
+
+    def _close_connection(self) -> None:
+        """
+        Закрытие подключения LISTEN и завершение подписок без события
+        :return: None
+        """
+        if self._connection is not None:
+            self._loop.remove_reader(self._connection_fileno)
+            self._connection.close()
+        self._connection, self._connection_fileno = None, None
+
+        with self._subscribers_lock:
+            futures = [future for key_futures in self._subscribers.values() for future in key_futures]
+        for future in futures:
+            _set_result_threadsafe(future, False)
+
+    def _on_readable(self) -> None:
+        """
+        Чтение уведомлений подключения LISTEN и завершение подписок маршрутов
+        :return: None
+        """
+        try:
+            self._connection.poll()
+        except psycopg2.Error:
+            self._close_connection()
+            return
+
+        while self._connection.notifies:
+            notification = self._connection.notifies.pop(0)
+            with self._subscribers_lock:
+                futures = list(self._subscribers.get(notification.payload, ()))
+            for future in futures:
+                _set_result_threadsafe(future, True)
+
+
+def _set_result_threadsafe(future: asyncio.Future, result: bool) -> None:
+    """
+    Завершение future подписки в цикле событий подписчика
+    :param future: future подписки
+    :param result: событие получено
+    :return: None
+    """
+    def set_result():
+        if not future.done():
+            future.set_result(result)
+
+    try:
+        future.get_loop().call_soon_threadsafe(set_result)
+    except RuntimeError:
+        # цикл подписчика уже закрыт: запрос завершен
+        pass
+
+
+listener = BuildEventsListener()
@@ -0,0 +1,168 @@
+"""
+Кластеры мест для карты.
+Для каждого уровня масштаба места группируются по ячейкам сетки Web Mercator
+(CLUSTER_GRID_SHIFT уровней мельче тайлов карты). Кластер хранит количество мест,
+суммы координат (для центра) и границы мест. Кластеры изменяются вместе с местами,
+поэтому ответ строится выборкой готовых кластеров без агрегации мест.
+"""
+from decimal import Decimal
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+from django.db import connection, models as db_models
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+from route_settings_builder import models, geo
+
+
+MAX_CLUSTER_ZOOM = 16
+
+# 4 x 4 ячейки на тайл карты
+CLUSTER_GRID_SHIFT = 2
+
+# Наибольшее количество ячеек в ответе: при превышении масштаб уменьшается
+MAX_CLUSTER_CELLS = 1024
+
+Coordinate = Union[float, Decimal]
+
+
+def get_place_cells(latitude: Coordinate, longitude: Coordinate) -> List[Tuple[int, int, int]]:
+    """
+    Получение ячеек, содержащих место, на всех уровнях масштаба
+    :param latitude: широта места
+    :param longitude: долгота места
+    :return: список (масштаб, x, y)
+    """
+    coordinates = np.array([[float(latitude), float(longitude)]])
+    return [(zoom, *geo.get_grid_cells(coordinates, zoom + CLUSTER_GRID_SHIFT)[0].tolist())
+            for zoom in range(MAX_CLUSTER_ZOOM + 1)]
+
+
+def add_place(latitude: Coordinate, longitude: Coordinate) -> None:
+    """
+    Добавление места в кластеры всех уровней масштаба
+    :param latitude: широта места
+    :param longitude: долгота места
+    :return: None
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    table_name = models.PlaceCluster._meta.db_table  # pylint: disable=protected-access
+    cells = get_place_cells(latitude, longitude)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table_name} AS cluster
+                (zoom, x, y, count, latitude_sum, longitude_sum,
+                 min_latitude, max_latitude, min_longitude, max_longitude)
+            VALUES {', '.join(['(%s, %s, %s, 1, %s, %s, %s, %s, %s, %s)'] * len(cells))}
+            ON CONFLICT (zoom, x, y) DO UPDATE SET
+                count = cluster.count + 1,
+                latitude_sum = cluster.latitude_sum + EXCLUDED.latitude_sum,
+                longitude_sum = cluster.longitude_sum + EXCLUDED.longitude_sum,
+                min_latitude = LEAST(cluster.min_latitude, EXCLUDED.min_latitude),
+                max_latitude = GREATEST(cluster.max_latitude, EXCLUDED.max_latitude),
+                min_longitude = LEAST(cluster.min_longitude, EXCLUDED.min_longitude),
+                max_longitude = GREATEST(cluster.max_longitude, EXCLUDED.max_longitude)
+            """,
+            [value for cell in cells
+             for value in (*cell, latitude, longitude, latitude, latitude, longitude, longitude)]
+        )
+
+
+def remove_place(latitude: Coordinate, longitude: Coordinate) -> None:
+    """
+    Удаление места из кластеров всех уровней масштаба.
+    Границы пересчитываются только у кластеров, на границе которых находилось место
+    :param latitude: широта места
+    :param longitude: долгота места
+    :return: None
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    cells_query = _get_cells_query(get_place_cells(latitude, longitude))
+
+    models.PlaceCluster.objects.filter(cells_query).update(count=F('count') - 1,
+                                                           latitude_sum=F('latitude_sum') - latitude,
+                                                           longitude_sum=F('longitude_sum') - longitude)
+    models.PlaceCluster.objects.filter(cells_query, count=0).delete()
+
+    bordering_clusters = models.PlaceCluster.objects.filter(
+        cells_query,
+        Q(min_latitude=latitude) | Q(max_latitude=latitude) | Q(min_longitude=longitude) | Q(max_longitude=longitude)
+    )
+    for cluster in bordering_clusters:
+        west, south, east, north = geo.get_grid_cell_bounds(cluster.x, cluster.y, cluster.zoom + CLUSTER_GRID_SHIFT)
+        bounds = (models.Place.objects
+                  .filter(latitude__gt=south, latitude__lte=north, longitude__gte=west, longitude__lt=east)
+                  .aggregate(min_latitude=db_models.Min(Cast('latitude', FloatField())),
+                             max_latitude=db_models.Max(Cast('latitude', FloatField())),
+                             min_longitude=db_models.Min(Cast('longitude', FloatField())),
+                             max_longitude=db_models.Max(Cast('longitude', FloatField()))))
+        if None not in bounds.values():
+            models.PlaceCluster.objects.filter(id=cluster.id).update(**bounds)
+
+
+def rebuild_place_clusters() -> None:
+    """
+    Полное построение кластеров по всем местам
+    :return: None
+    """
+    coordinates = np.array(list(models.Place.objects.values_list(Cast('latitude', FloatField()),
+                                                                 Cast('longitude', FloatField()))),
+                           dtype=np.float64).reshape(-1, 2)
+    models.PlaceCluster.objects.all().delete()
+
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        cells, indexes, counts = np.unique(geo.get_grid_cells(coordinates, zoom + CLUSTER_GRID_SHIFT),
+                                           axis=0, return_inverse=True, return_counts=True)
+        indexes = indexes.reshape(-1)
+        sums = [np.bincount(indexes, weights=coordinates[:, axis], minlength=len(cells)) for axis in (0, 1)]
+        minimums = np.full((len(cells), 2), np.inf)
+        maximums = np.full((len(cells), 2), -np.inf)
+        np.minimum.at(minimums, indexes, coordinates)
+        np.maximum.at(maximums, indexes, coordinates)
+
+        models.PlaceCluster.objects.bulk_create(
+            (models.PlaceCluster(zoom=zoom, x=cell_x, y=cell_y, count=count,
+                                 latitude_sum=latitude_sum, longitude_sum=longitude_sum,
+                                 min_latitude=minimum[0], max_latitude=maximum[0],
+                                 min_longitude=minimum[1], max_longitude=maximum[1])
+             for (cell_x, cell_y), count, latitude_sum, longitude_sum, minimum, maximum
+             in zip(cells.tolist(), counts.tolist(), sums[0].tolist(), sums[1].tolist(),
+                    minimums.tolist(), maximums.tolist())),
+            batch_size=1000,
+        )
+
+
+def get_clusters(bbox: Tuple[float, float, float, float], zoom: int):
+    """
+    Получение кластеров мест в границах области.
+    Масштаб уменьшается, пока количество ячеек в области не станет не больше MAX_CLUSTER_CELLS
+    :param bbox: границы области (запад, юг, восток, север)
+    :param zoom: масштаб карты
+    :return: QuerySet кластеров
+    """
+    west, south, east, north = bbox
+    zoom = min(zoom, MAX_CLUSTER_ZOOM)
+
+    while True:
+        (min_x, min_y), (max_x, max_y) = geo.get_grid_cells([[north, west], [south, east]],
+                                                            zoom + CLUSTER_GRID_SHIFT).tolist()
+        if zoom == 0 or (max_x - min_x + 1) * (max_y - min_y + 1) <= MAX_CLUSTER_CELLS:
+            break
+        zoom -= 1
+
+    return models.PlaceCluster.objects.filter(zoom=zoom, x__range=(min_x, max_x), y__range=(min_y, max_y))
+
+
+def _get_cells_query(cells: Iterable[Tuple[int, int, int]]) -> Q:
+    """
+    Получение условия выборки кластеров по ячейкам
+    :param cells: список (масштаб, x, y)
+    :return: query
+    """
+    query = Q()
+    for zoom, cell_x, cell_y in cells:
+        query |= Q(zoom=zoom, x=cell_x, y=cell_y)
+    return query
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional
+
+import brotli
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+
+GZIP_ENCODING = 'gzip'
+BROTLI_ENCODING = 'br'
+
+# Сжатие при сохранении выполняется один раз, поэтому уровни максимальные
+STORED_GZIP_LEVEL = 9
+STORED_BROTLI_QUALITY = 11
+
+# Сжатие ответа "на лету" выполняется на каждый запрос
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_BROTLI_QUALITY = 4
+
+MIN_COMPRESSED_SIZE = 200
+
+
+def dump_json(data: Any) -> bytes:
+    """
+    Сериализация JSON-данных в каноническом виде (одинаковые данные дают одинаковый хеш)
+    :param data: данные
+    :return: JSON
+    """
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+
+
+def get_digest(content: bytes) -> str:
+    """
+    Получение хеша содержимого
+    :param content: содержимое
+    :return: sha256-хеш
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def compress_variants(content: bytes) -> Dict[str, Any]:
+    """
+    Подготовка вариантов сжатого содержимого для хранения
+    :param content: содержимое
+    :return: значения полей CompressedContentMixin
+    """
+    return {
+        'digest': get_digest(content),
+        'encoding': GZIP_ENCODING,
+        'payload': compress(content, GZIP_ENCODING, stored=True),
+        'brotli_payload': compress(content, BROTLI_ENCODING, stored=True),
+        'size': len(content),
+    }
+
+
+def decode_json(payload: bytes, encoding: str = GZIP_ENCODING) -> Any:
+    """
+    Распаковка и десериализация JSON-данных
+    :param payload: сжатое содержимое
+    :param encoding: способ сжатия
+    :return: данные
+    """
+    return json.loads(decompress(payload, encoding))
+
+
+def compress(content: bytes, encoding: str, stored: bool = False) -> bytes:
+    """
+    Сжатие содержимого
+    :param content: содержимое
+    :param encoding: способ сжатия
+    :param stored: сжатие для хранения (максимальный уровень)
+    :return: сжатое содержимое
+    """
+    if encoding == GZIP_ENCODING:
+        return gzip.compress(content, compresslevel=STORED_GZIP_LEVEL if stored else RESPONSE_GZIP_LEVEL)
+    if encoding == BROTLI_ENCODING:
+        return brotli.compress(content, quality=STORED_BROTLI_QUALITY if stored else RESPONSE_BROTLI_QUALITY)
+
+    raise ValueError(f'Неподдерживаемый способ сжатия: {encoding}')
+
+
+def decompress(payload: bytes, encoding: str) -> bytes:
+    """
+    Распаковка содержимого
+    :param payload: сжатое содержимое
+    :param encoding: способ сжатия
+    :return: содержимое
+    """
+    if encoding == GZIP_ENCODING:
+        return gzip.decompress(bytes(payload))
+    if encoding == BROTLI_ENCODING:
+        return brotli.decompress(bytes(payload))
+
+    raise ValueError(f'Неподдерживаемый способ сжатия: {encoding}')
+
+
+def choose_encoding(accept_encoding: str, available_encodings: Iterable[str]) -> Optional[str]:
+    """
+    Выбор способа сжатия по заголовку Accept-Encoding. Brotli предпочтительнее gzip при равном весе
+    :param accept_encoding: значение заголовка Accept-Encoding
+    :param available_encodings: доступные способы сжатия
+    :return: способ сжатия или None, если клиент не принимает ни один из доступных
+    """
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        weight = 1.0
+        if params.strip().startswith('q='):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    candidates = [encoding for encoding in (BROTLI_ENCODING, GZIP_ENCODING)
+                  if encoding in available_encodings and weights.get(encoding, weights.get('*', 0.0)) > 0]
+    if not candidates:
+        return None
+
+    return max(candidates, key=lambda encoding: weights.get(encoding, weights.get('*', 0.0)))
+
+
+def precompressed_response(request, variants: Dict[str, bytes], content_type: str,
+                           etag: Optional[str] = None) -> HttpResponse:
+    """
+    Получение ответа из заранее сжатых вариантов содержимого без повторного сжатия
+    :param request: запрос
+    :param variants: словарь вида {способ сжатия: сжатое содержимое}, обязателен вариант gzip
+    :param content_type: тип содержимого
+    :param etag: хеш исходного содержимого
+    :return: ответ
+    """
+    if etag and request.headers.get('If-None-Match') in (f'"{etag}"', f'W/"{etag}"'):
+        response = HttpResponseNotModified()
+    else:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''),
+                                   [encoding for encoding, payload in variants.items() if payload])
+        if encoding:
+            response = HttpResponse(bytes(variants[encoding]), content_type=content_type)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = HttpResponse(decompress(variants[GZIP_ENCODING], GZIP_ENCODING), content_type=content_type)
+
+    if etag:
+        response.headers['ETag'] = f'"{etag}"'
+    patch_vary_headers(response, ('Accept-Encoding', ))
+
+    return response
@@ -0,0 +1,6 @@
+"""
+Бэкенд PostgreSQL с общим для процесса пулом подключений (ENGINE = 'route_settings_builder.db_pool').
+Подключение берется из пула при открытии соединения Django и возвращается в пул при его закрытии
+(CONN_MAX_AGE = 0), поэтому количество подключений процесса к PostgreSQL не превышает размер пула.
+Параметры пула задаются в OPTIONS['pool'] (см. pool.ConnectionPool)
+"""
@@ -0,0 +1,53 @@
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+from route_settings_builder.db_pool import pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """ Создание тестовой БД. Перед удалением БД свободные подключения пула к ней закрываются """
+    def _destroy_test_db(self, test_database_name, verbosity):
+        pool.close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """ Подключение Django к PostgreSQL через пул подключений процесса. OPTIONS['pool'] - параметры пула """
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.isolation_level = None
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_pool(self) -> pool.ConnectionPool:
+        """
+        Получение пула подключений
+        :return: пул
+        """
+        return pool.get_pool(self.alias, self.get_connection_params(), self.settings_dict['OPTIONS'].get('pool', {}))
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool().getconn()
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool().putconn(self.connection, close=self.errors_occurred and not self.is_usable())
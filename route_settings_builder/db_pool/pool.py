@@ -0,0 +1,297 @@
+"""
+Пул подключений psycopg2 с ограничением размера, ожиданием свободного подключения и проверкой подключений
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional
+import logging
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(psycopg2.OperationalError):  # pylint: disable=too-few-public-methods
+    """ Нет свободного подключения в течение времени ожидания """
+
+
+@dataclass
+class PoolOptions:
+    """
+    Параметры пула подключений:
+    min_size - количество подключений, открываемых при создании пула и сохраняемых открытыми;
+    max_size - наибольшее количество подключений;
+    timeout - время ожидания свободного подключения, сек.;
+    health_check_interval - время простоя, после которого подключение проверяется; None - не проверять;
+    max_idle - время простоя, после которого подключение сверх min_size закрывается; None - не закрывать
+    """
+    min_size: int = 1
+    max_size: int = 10
+    timeout: float = 30
+    health_check_interval: Optional[float] = 30
+    max_idle: Optional[float] = 600
+
+
+class ConnectionPool:
+    """
+    Пул подключений.
+    При отсутствии свободного подключения и достижении max_size запрос ждет освобождения подключения
+    не дольше timeout секунд. Подключение, простаивавшее дольше health_check_interval секунд,
+    перед выдачей проверяется запросом SELECT 1 и заменяется новым, если не отвечает
+    """
+    def __init__(self, conn_params: dict, options: Optional[PoolOptions] = None) -> None:
+        """
+        :param conn_params: параметры подключения psycopg2.connect
+        :param options: параметры пула
+        """
+        self.conn_params = conn_params
+        self.options = options or PoolOptions()
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.options.max_size)
+        # Свободные подключения: (подключение, время возврата в пул)
+        self._idle = []
+        # Текущие значения (in_use, waiting), суммарное время ожидания и счетчики
+        self._stats = dict.fromkeys(('in_use', 'waiting', 'wait_time', 'connections_opened', 'connections_discarded',
+                                     'checkouts', 'waits', 'timeouts', 'peak_in_use', 'peak_waiting'), 0)
+
+    def warm_up(self) -> None:
+        """
+        Открытие подключений до min_size заранее, чтобы первые запросы не ждали подключения к БД
+        :return: None
+        """
+        while True:
+            with self._lock:
+                if len(self._idle) + self._stats['in_use'] >= self.options.min_size:
+                    return
+
+            connection = psycopg2.connect(**self.conn_params)
+            with self._lock:
+                self._stats['connections_opened'] += 1
+                self._idle.append((connection, time.monotonic()))
+
+    def getconn(self) -> extensions.connection:
+        """
+        Получение подключения из пула
+        :return: подключение
+        """
+        with self._lock:
+            self._stats['waiting'] += 1
+            self._stats['peak_waiting'] = max(self._stats['peak_waiting'], self._stats['waiting'])
+
+        # слот занимается до возврата подключения в putconn, поэтому with неприменим
+        started_at = time.monotonic()
+        is_acquired = self._slots.acquire(blocking=False)  # pylint: disable=consider-using-with
+        if not is_acquired:
+            with self._lock:
+                self._stats['waits'] += 1
+            is_acquired = self._slots.acquire(timeout=self.options.timeout)  # pylint: disable=consider-using-with
+
+        with self._lock:
+            self._stats['waiting'] -= 1
+            self._stats['wait_time'] += time.monotonic() - started_at
+            if is_acquired:
+                self._stats['in_use'] += 1
+                self._stats['checkouts'] += 1
+                self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._stats['in_use'])
+            else:
+                self._stats['timeouts'] += 1
+
+        if not is_acquired:
+            logger.warning('Database pool exhausted: %s', self.get_stats())
+            raise PoolTimeout(f'No free database connection in {self.options.timeout} s '
+                              f'(max_size={self.options.max_size})')
+
+        try:
+            return self._get_healthy_connection()
+        except BaseException:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+            raise
+
+    def putconn(self, connection: extensions.connection, close: bool = False) -> None:
+        """
+        Возврат подключения в пул. Незавершенная транзакция откатывается
+        :param connection: подключение
+        :param close: закрыть подключение
+        :return: None
+        """
+        try:
+            if not close and not connection.closed:
+                status = connection.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+        except psycopg2.Error:
+            close = True
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            if close or connection.closed:
+                self._stats['connections_discarded'] += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+        self._slots.release()
+
+        if connection is not None:
+            _close_quietly(connection)
+        self._close_expired()
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Получение статистики пула
+        :return: словарь показателей
+        """
+        with self._lock:
+            return {
+                'min_size': self.options.min_size,
+                'max_size': self.options.max_size,
+                'idle': len(self._idle),
+                **self._stats,
+                'wait_time': round(self._stats['wait_time'], 6),
+            }
+
+    def close(self) -> None:
+        """
+        Закрытие свободных подключений
+        :return: None
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            _close_quietly(connection)
+
+    def _get_healthy_connection(self) -> extensions.connection:
+        """
+        Получение рабочего свободного подключения или открытие нового
+        :return: подключение
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released_at = self._idle.pop()
+
+            if connection.closed:
+                self._discard(connection)
+                continue
+            if (self.options.health_check_interval is not None
+                    and time.monotonic() - released_at >= self.options.health_check_interval
+                    and not _is_usable(connection)):
+                self._discard(connection)
+                continue
+            return connection
+
+        connection = psycopg2.connect(**self.conn_params)
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return connection
+
+    def _discard(self, connection: extensions.connection) -> None:
+        """
+        Закрытие неработающего подключения
+        :param connection: подключение
+        :return: None
+        """
+        with self._lock:
+            self._stats['connections_discarded'] += 1
+        _close_quietly(connection)
+
+    def _close_expired(self) -> None:
+        """
+        Закрытие подключений сверх min_size, простаивавших дольше max_idle
+        :return: None
+        """
+        if self.options.max_idle is None:
+            return
+
+        expired_before = time.monotonic() - self.options.max_idle
+        with self._lock:
+            expired_count = min(len(self._idle) + self._stats['in_use'] - self.options.min_size,
+                                sum(released_at < expired_before for _, released_at in self._idle))
+            if expired_count <= 0:
+                return
+            # Свободные подключения упорядочены по времени возврата, первыми выдаются последние
+            expired, self._idle = self._idle[:expired_count], self._idle[expired_count:]
+            self._stats['connections_discarded'] += expired_count
+
+        for connection, _ in expired:
+            _close_quietly(connection)
+
+
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, conn_params: dict, pool_options: dict) -> ConnectionPool:
+    """
+    Получение общего для процесса пула подключений. Новый пул открывает min_size подключений
+    :param alias: псевдоним подключения Django
+    :param conn_params: параметры подключения psycopg2.connect
+    :param pool_options: параметры пула
+    :return: пул
+    """
+    key = (alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with _pools_lock:
+        is_created = (pool := _pools.get(key)) is None
+        if is_created:
+            pool = _pools[key] = ConnectionPool(conn_params, PoolOptions(**pool_options))
+
+    if is_created:
+        pool.warm_up()
+    return pool
+
+
+def get_pools_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Получение статистики пулов процесса
+    :return: словарь {псевдоним подключения: статистика пула}
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {alias: pool.get_stats() for (alias, _), pool in pools}
+
+
+def close_pools(alias: str) -> None:
+    """
+    Закрытие свободных подключений пулов подключения Django
+    :param alias: псевдоним подключения Django
+    :return: None
+    """
+    with _pools_lock:
+        pools = [pool for (pool_alias, _), pool in _pools.items() if pool_alias == alias]
+    for pool in pools:
+        pool.close()
+
+
+def _is_usable(connection: extensions.connection) -> bool:
+    """
+    Проверка подключения запросом
+    :param connection: подключение
+    :return: подключение работает
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def _close_quietly(connection: extensions.connection) -> None:
+    """
+    Закрытие подключения без ошибок
+    :param connection: подключение
+    :return: None
+    """
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
@@ -0,0 +1,70 @@
+"""
+Расстояния между местами каталога.
+Координаты мест хранятся в снимке с отсортированными id и координатами float32.
+"""
+from typing import Iterable, Optional
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from route_settings_builder import models, geo, snapshots
+
+
+SNAPSHOT_FILE_NAME = 'places.npy'
+
+SNAPSHOT_DTYPE = np.dtype([('id', np.int64), ('coordinates', np.float32, (2, ))])
+
+
+class PlaceDistanceService(snapshots.Snapshot):
+    """ Сервис расстояний между местами по снимку координат """
+    file_name = SNAPSHOT_FILE_NAME
+
+    def collect(self) -> np.ndarray:
+        """
+        Сбор координат мест
+        :return: структурированный массив SNAPSHOT_DTYPE, отсортированный по id
+        """
+        rows = (models.Place.objects
+                .order_by('id')
+                .values_list('id', Cast('latitude', FloatField()), Cast('longitude', FloatField())))
+        return np.fromiter(((place_id, (latitude, longitude)) for place_id, latitude, longitude in rows.iterator()),
+                           dtype=SNAPSHOT_DTYPE)
+
+    def get_coordinates(self, place_ids: Iterable[int]) -> np.ndarray:
+        """
+        Получение координат мест. Если места нет в снимке, снимок перестраивается один раз
+        :param place_ids: id мест
+        :return: массив (n, 2) координат (широта, долгота)
+        """
+        place_ids = np.fromiter(place_ids, dtype=np.int64)
+
+        for is_rebuilt in (False, True):
+            if is_rebuilt:
+                self.build_snapshot()
+
+            snapshot = self.get_snapshot()
+            found = np.zeros(len(place_ids), dtype=bool)
+            if len(snapshot):
+                indexes = np.minimum(np.searchsorted(snapshot['id'], place_ids), len(snapshot) - 1)
+                found = snapshot['id'][indexes] == place_ids
+
+            if found.all():
+                return np.asarray(snapshot['coordinates'][indexes] if len(place_ids) else np.empty((0, 2)))
+
+        raise models.Place.DoesNotExist(f'Места не найдены: {", ".join(map(str, place_ids[~found].tolist()))}')
+
+    def get_distance_matrix(self, place_ids: Iterable[int],
+                            other_place_ids: Optional[Iterable[int]] = None) -> np.ndarray:
+        """
+        Получение матрицы расстояний между местами
+        :param place_ids: id мест (строки матрицы)
+        :param other_place_ids: id мест (столбцы матрицы). По умолчанию совпадают с place_ids
+        :return: матрица (n, m) расстояний в метрах
+        """
+        coordinates = self.get_coordinates(place_ids)
+        other_coordinates = None if other_place_ids is None else self.get_coordinates(other_place_ids)
+        return geo.haversine_matrix(coordinates, other_coordinates).astype(np.float32)
+
+
+place_distances = PlaceDistanceService()
@@ -0,0 +1,86 @@
+# pylint: disable=too-few-public-methods
+from functools import lru_cache, wraps
+from typing import Optional, Tuple, Type
+
+import pydantic
+from ninja import Schema, errors
+
+from route_settings_builder import renderers
+
+
+class FieldsetSchema(Schema):
+    """ Схема параметров выборки полей ответа: ?fields=name,places / ?exclude=details """
+    fields: Optional[str] = None
+    exclude: Optional[str] = None
+
+    def select(self, schema: Type[Schema]) -> Tuple[str, ...]:
+        """
+        Получение перечня запрошенных полей схемы
+        :param schema: схема ответа
+        :return: кортеж наименований полей в порядке объявления в схеме
+        """
+        available_fields = tuple(schema.__fields__)
+        requested_fields = _split(self.fields) or set(available_fields)
+        excluded_fields = _split(self.exclude)
+
+        if unknown_fields := (requested_fields | excluded_fields) - set(available_fields):
+            raise errors.HttpError(400, f'Неизвестные поля: {", ".join(sorted(unknown_fields))}')
+
+        selected_fields = tuple(field_name for field_name in available_fields
+                                if field_name in requested_fields and field_name not in excluded_fields)
+        if not selected_fields:
+            raise errors.HttpError(400, 'Не выбрано ни одного поля')
+
+        return selected_fields
+
+
+def sparse(schema: Type[Schema]):
+    """
+    Декоратор сериализации ответа по запрошенному набору полей.
+    Ожидает параметр fieldset у представления. Если выбраны все поля,
+    ответ возвращается без изменений и сериализуется схемой операции.
+    Заголовки, добавленные представлением в параметр response, переносятся в ответ.
+    :param schema: схема ответа
+    :return: декоратор
+    """
+    def decorator(func):
+        @wraps(func)
+        def view(request, *args, **kwargs):
+            result = func(request, *args, **kwargs)
+
+            fields = kwargs['fieldset'].select(schema)
+            if len(fields) == len(schema.__fields__):
+                return result
+
+            response = renderers.json_response(get_partial_schema(schema, fields).from_orm(result).dict())
+            if temporal_response := kwargs.get('response'):
+                for header, value in temporal_response.items():
+                    response.headers.setdefault(header, value)
+            return response
+
+        return view
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def get_partial_schema(schema: Type[Schema], fields: Tuple[str, ...]) -> Type[Schema]:
+    """
+    Получение схемы, ограниченной набором полей
+    :param schema: исходная схема
+    :param fields: наименования полей
+    :return: схема
+    """
+    return pydantic.create_model(f'{schema.__name__}Partial', __base__=Schema,
+                                 **{field_name: (schema.__fields__[field_name].annotation,
+                                                 schema.__fields__[field_name].field_info)
+                                    for field_name in fields})
+
+
+def _split(value: Optional[str]) -> set:
+    """
+    Разбор перечня полей, переданного через запятую
+    :param value: значение параметра
+    :return: множество наименований полей
+    """
+    return {field_name.strip() for field_name in (value or '').split(',') if field_name.strip()}
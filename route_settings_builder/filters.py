@@ -2,8 +2,10 @@
 from typing import Optional, List
 import uuid
 
-from django.db.models import Q
-from ninja import FilterSchema, Field
+from django.db.models import Q, QuerySet
+from ninja import FilterSchema, Field, Schema
+
+from route_settings_builder import search
 
 
 class PlaceFilterSchema(FilterSchema):
@@ -60,6 +62,19 @@ class RouteFilterSchema(FilterSchema):
         expression_connector = 'AND'
 
 
+class SearchSchema(Schema):
+    """ Схема параметра полнотекстового поиска: ?q=музей москвы """
+    q: Optional[str] = None
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        """
+        Поиск по наименованию с сортировкой по релевантности
+        :param queryset: QuerySet
+        :return: QuerySet
+        """
+        return search.apply(queryset, self.q)
+
+
 def _filter_by_criteria(through_field_name: str, filter_criteria: Optional[List[str]]) -> Q:
     """
     Фильтрация по критериям
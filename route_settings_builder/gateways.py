@@ -1,11 +1,19 @@
+import asyncio
+import time
 import uuid
+from typing import Dict
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 import aio_pika
 
-from mq_misc.amqp import ReplyToConsumer, create_weak_publisher
+from mq_misc.amqp import Publisher, ReplyToConsumer, create_weak_publisher
 
-from route_settings_builder import models
+from route_settings_builder import models_utils, segments, throttling
+
+
+# Глубина очереди строительства и время ее получения (time.monotonic)
+_queue_depth = (0, float('-inf'))
 
 
 class ReplyToRouteBuilderConsumer(ReplyToConsumer):
@@ -28,19 +36,106 @@ class ReplyToRouteBuilderConsumer(ReplyToConsumer):
         :param raw_message: "сырое" сообщение
         :return: None
         """
-        await models.Route.objects.filter(uuid=self.route_uuid).aupdate(details=body)
+        await sync_to_async(models_utils.save_route_details)(self.route_uuid, body)
+
+
+class ReplyToRouteSegmentsBuilderConsumer(ReplyToRouteBuilderConsumer):
+    """
+    Consumer ответов на запросы строительства сегментов маршрута одной группы.
+    Номера сегментов хранятся на стороне consumer по correlation_id и не передаются строителю маршрутов
+    """
+    group: uuid.UUID
+    segment_indexes: Dict[str, int]
+
+    def __init__(self, route_uuid: uuid.UUID, group: uuid.UUID, *args, **kwargs) -> None:
+        """
+        :param route_uuid: UUID маршрута
+        :param group: UUID группы строительства
+        :param args:
+        :param kwargs:
+        """
+        super().__init__(route_uuid, *args, **kwargs)
+        self.group = group
+        self.segment_indexes = {}
+
+    async def publish_segment(self, index: int, message: dict, publisher: Publisher) -> None:
+        """
+        Публикация запроса строительства сегмента с сохранением номера сегмента по correlation_id
+        :param index: номер сегмента
+        :param message: запрос строительства сегмента
+        :param publisher: издатель
+        :return: None
+        """
+        correlation_id = str(uuid.uuid4())
+        future = self.loop.create_future()
+        self.segment_indexes[correlation_id] = index
+        self.futures[correlation_id] = future, message
+
+        await self._publish(message, correlation_id, publisher)
+        await asyncio.wait_for(future, timeout=self.timeout)
+
+    async def process_message(self, body: dict, raw_message: aio_pika.IncomingMessage) -> None:
+        """
+        Обработка ответа на запрос строительства сегмента
+        :param body: тело response
+        :param raw_message: "сырое" сообщение
+        :return: None
+        """
+        index = self.segment_indexes.pop(raw_message.correlation_id)
+        await sync_to_async(models_utils.save_route_segment_details)(self.route_uuid, self.group, index, body)
 
 
 async def build_route(route_uuid: uuid.UUID, request: dict) -> None:
     """
-    Построение маршрута
+    Построение маршрута. При BUILD_SEGMENT_SIZE длинный маршрут строится сегментами параллельно
     :param route_uuid: UUID маршрута
     :param request: запрос
     :return: None
     """
     params = {'url': settings.RMQ_URL, 'queue_name': 'route-settings-builder'}
+    points_segments = segments.split_points(request['points_coordinates'], settings.BUILD_SEGMENT_SIZE)
 
     async with create_weak_publisher(settings.RMQ_URL, settings.RMQ_QUEUE) as publisher:
-        request_consumer = ReplyToRouteBuilderConsumer(route_uuid, **params)
+        if len(points_segments) == 1:
+            request_consumer = ReplyToRouteBuilderConsumer(route_uuid, **params)
+            await request_consumer.create_consume_connection()
+            await request_consumer.publish(request, publisher)
+            return
+
+        group = await sync_to_async(models_utils.start_segmented_build)(route_uuid, len(points_segments))
+        request_consumer = ReplyToRouteSegmentsBuilderConsumer(route_uuid, group, **params)
         await request_consumer.create_consume_connection()
-        await request_consumer.publish(request, publisher)
+        await asyncio.gather(*(request_consumer.publish_segment(index, {**request, 'points_coordinates': points},
+                                                                publisher)
+                               for index, points in enumerate(points_segments)))
+
+
+async def get_queue_depth() -> int:
+    """
+    Получение количества сообщений в очереди строительства (пассивное объявление очереди)
+    :return: количество сообщений
+    """
+    async with create_weak_publisher(settings.RMQ_URL, settings.RMQ_QUEUE) as publisher:
+        queue = await publisher.declare_queue(passive=True)
+        return queue.declaration_result.message_count
+
+
+async def check_queue_depth() -> None:
+    """
+    Проверка, что строитель маршрутов успевает обрабатывать очередь.
+    Глубина очереди запрашивается не чаще раза в RMQ_QUEUE_DEPTH_TTL секунд
+    :return: None
+    """
+    global _queue_depth  # pylint: disable=global-statement
+
+    if not settings.RMQ_QUEUE_MAX_DEPTH:
+        return
+
+    depth, checked_at = _queue_depth
+    if time.monotonic() - checked_at >= settings.RMQ_QUEUE_DEPTH_TTL:
+        depth = await get_queue_depth()
+        _queue_depth = (depth, time.monotonic())
+
+    if depth >= settings.RMQ_QUEUE_MAX_DEPTH:
+        raise throttling.BuildQueueOverloaded('Очередь строительства маршрутов переполнена',
+                                              retry_after=settings.RMQ_QUEUE_RETRY_AFTER)
@@ -0,0 +1,88 @@
+from typing import Tuple
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_METERS = 6371008.8
+
+
+def haversine_matrix(coordinates: np.ndarray, other_coordinates: np.ndarray = None) -> np.ndarray:
+    """
+    Получение матрицы расстояний по формуле гаверсинусов
+    :param coordinates: массив (n, 2) координат (широта, долгота) в градусах
+    :param other_coordinates: массив (m, 2) координат. По умолчанию совпадает с coordinates
+    :return: матрица (n, m) расстояний в метрах
+    """
+    coordinates = np.radians(np.asarray(coordinates, dtype=np.float64))
+    other_coordinates = (coordinates if other_coordinates is None
+                         else np.radians(np.asarray(other_coordinates, dtype=np.float64)))
+
+    latitudes = coordinates[:, 0, np.newaxis]
+    other_latitudes = other_coordinates[np.newaxis, :, 0]
+    latitudes_delta = other_latitudes - latitudes
+    longitudes_delta = other_coordinates[np.newaxis, :, 1] - coordinates[:, 1, np.newaxis]
+
+    value = (np.sin(latitudes_delta / 2) ** 2
+             + np.cos(latitudes) * np.cos(other_latitudes) * np.sin(longitudes_delta / 2) ** 2)
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(value, 0, 1)))
+
+
+# Граница проекции Web Mercator по широте
+MERCATOR_MAX_LATITUDE = 85.05112878
+
+
+def to_mercator(coordinates: np.ndarray) -> np.ndarray:
+    """
+    Перевод координат в нормированные координаты проекции Web Mercator
+    :param coordinates: массив (n, 2) координат (широта, долгота) в градусах
+    :return: массив (n, 2) координат (x, y) от 0 до 1; y растет к югу
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    latitudes = np.radians(np.clip(coordinates[:, 0], -MERCATOR_MAX_LATITUDE, MERCATOR_MAX_LATITUDE))
+
+    return np.stack(((coordinates[:, 1] + 180) / 360,
+                     (1 - np.arcsinh(np.tan(latitudes)) / np.pi) / 2), axis=1)
+
+
+def get_grid_cells(coordinates: np.ndarray, level: int) -> np.ndarray:
+    """
+    Получение ячеек сетки проекции Web Mercator, содержащих точки
+    :param coordinates: массив (n, 2) координат (широта, долгота) в градусах
+    :param level: уровень сетки - 2 ** level ячеек по каждой оси
+    :return: массив (n, 2) номеров ячеек (x, y); y растет к югу
+    """
+    size = 1 << level
+    return np.clip(np.floor(to_mercator(coordinates) * size), 0, size - 1).astype(np.int64)
+
+
+def get_grid_cell_bounds(cell_x: int, cell_y: int, level: int) -> Tuple[float, float, float, float]:
+    """
+    Получение границ ячейки сетки проекции Web Mercator
+    :param cell_x: номер ячейки по долготе
+    :param cell_y: номер ячейки по широте
+    :param level: уровень сетки
+    :return: границы (запад, юг, восток, север) в градусах
+    """
+    size = 1 << level
+    return (cell_x / size * 360 - 180,
+            math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (cell_y + 1) / size)))),
+            (cell_x + 1) / size * 360 - 180,
+            math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * cell_y / size)))))
+
+
+def parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    """
+    Разбор границ области вида 'запад,юг,восток,север'
+    :param value: строка границ в градусах
+    :return: границы (запад, юг, восток, север)
+    """
+    try:
+        west, south, east, north = map(float, value.split(','))
+    except ValueError as ex:
+        raise ValueError('Границы области задаются в виде: запад,юг,восток,север') from ex
+
+    if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError('Некорректные границы области')
+
+    return west, south, east, north
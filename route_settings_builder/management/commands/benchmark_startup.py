@@ -0,0 +1,75 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Модули, которые не должны загружаться при запуске процесса API
+LAZY_MODULES = ('aio_pika', 'mq_misc', 'PIL', 'numpy')
+
+# Запуск процесса: настройка Django, обработчик WSGI и разбор URL-конфигурации, как при первом запросе
+STARTUP_SCRIPT = '''
+import json, sys, time
+started_at = time.perf_counter()
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+get_wsgi_application()
+get_resolver().url_patterns
+print(json.dumps({'duration': (time.perf_counter() - started_at) * 1000,
+                  'modules': [module for module in sys.argv[1:] if module in sys.modules]}))
+'''
+
+
+class Command(BaseCommand):
+    """
+    Замер времени запуска процесса сервиса для каждого модуля настроек в отдельных процессах.
+    Сообщает медиану и модули из LAZY_MODULES, загруженные при запуске
+    """
+    help = 'Замер времени запуска процесса сервиса с бюджетом времени импорта'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settings-module', dest='settings_modules', action='append',
+                            help='Модуль настроек (можно указать несколько). По умолчанию - '
+                                 'route_settings_builder.settings и route_settings_builder.settings.api')
+        parser.add_argument('--runs', type=int, default=5, help='Количество запусков')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Бюджет времени запуска, мс: при превышении медианой команда завершается с ошибкой')
+
+    def handle(self, *args, **options):
+        settings_modules = options['settings_modules'] or ['route_settings_builder.settings',
+                                                           'route_settings_builder.settings.api']
+        exceeded = []
+
+        for settings_module in settings_modules:
+            results = [self._run(settings_module) for _ in range(options['runs'])]
+            durations = [result['duration'] for result in results]
+            median = statistics.median(durations)
+            self.stdout.write(f'{settings_module}: медиана {median:.1f} мс, минимум {min(durations):.1f} мс, '
+                              f'максимум {max(durations):.1f} мс')
+
+            if loaded_modules := results[0]['modules']:
+                self.stdout.write(self.style.WARNING(f'  загружены при запуске: {", ".join(loaded_modules)}'))
+            if options['budget'] is not None and median > options['budget']:
+                exceeded.append(settings_module)
+
+        if exceeded:
+            raise CommandError(f'Превышен бюджет времени запуска {options["budget"]} мс: {", ".join(exceeded)}')
+
+    @staticmethod
+    def _run(settings_module: str) -> dict:
+        """
+        Запуск процесса с модулем настроек
+        :param settings_module: модуль настроек
+        :return: длительность запуска в мс и загруженные модули из LAZY_MODULES
+        """
+        completed_process = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, *LAZY_MODULES],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module},
+            capture_output=True, text=True, check=True,
+        )
+        return json.loads(completed_process.stdout.strip().splitlines()[-1])
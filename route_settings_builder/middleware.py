@@ -0,0 +1,119 @@
+# pylint: disable=too-few-public-methods
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+
+from route_settings_builder import compression, profiling, routers, slow_queries
+
+
+_weak_etag_re = _lazy_re_compile(r'^W/')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжатие ответов brotli или gzip в зависимости от Accept-Encoding.
+    Ответы, уже содержащие Content-Encoding (заранее сжатые варианты), не сжимаются повторно
+    """
+    def process_response(self, request, response):
+        """
+        Сжатие ответа
+        :param request: запрос
+        :param response: ответ
+        :return: ответ
+        """
+        if (response.streaming or response.has_header('Content-Encoding')
+                or len(response.content) < compression.MIN_COMPRESSED_SIZE):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding', ))
+
+        encoding = compression.choose_encoding(request.headers.get('Accept-Encoding', ''),
+                                               (compression.BROTLI_ENCODING, compression.GZIP_ENCODING))
+        if not encoding:
+            return response
+
+        compressed_content = compression.compress(response.content, encoding)
+        if len(compressed_content) >= len(response.content):
+            return response
+
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(compressed_content))
+        response.headers['Content-Encoding'] = encoding
+
+        if (etag := response.get('ETag')) and not _weak_etag_re.match(etag):
+            response.headers['ETag'] = f'W/{etag}'
+
+        return response
+
+
+class DatabaseRoutingMiddleware(MiddlewareMixin):
+    """
+    Сброс привязки чтений к основной БД в начале запроса.
+    Пользователь сессии, недавно изменявший данные, читает с основной БД
+    """
+    def process_request(self, request):
+        """
+        Сброс привязки и привязка чтений недавно изменявшего данные пользователя сессии
+        :param request: запрос
+        :return: None
+        """
+        routers.reset()
+        if request.user.is_authenticated:
+            routers.use_primary_if_pinned(request.user.id)
+
+
+class SlowQueryMiddleware:
+    """ Запись медленных запросов к БД с операцией API, в которой они выполнены """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with slow_queries.record(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        """
+        Асинхронная обработка запроса с записью медленных запросов к БД
+        :param request: запрос
+        :return: ответ
+        """
+        async with slow_queries.arecord(request):
+            return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """ Профилирование запроса сотрудника с заголовком X-Profile или параметром ?profile=1 """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not profiling.is_requested(request) or (user := profiling.get_staff_user(request)) is None:
+            return self.get_response(request)
+        return profiling.profile_request(request, self.get_response, user)
+
+    async def __acall__(self, request):
+        """
+        Асинхронная обработка запроса с профилированием по требованию сотрудника
+        :param request: запрос
+        :return: ответ
+        """
+        if not profiling.is_requested(request):
+            return await self.get_response(request)
+        if (user := await sync_to_async(profiling.get_staff_user)(request)) is None:
+            return await self.get_response(request)
+        return await profiling.aprofile_request(request, self.get_response, user)
@@ -0,0 +1,88 @@
+# Generated by Django 4.1.7 on 2026-10-19 10:44
+
+import gzip
+import hashlib
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Копии вспомогательных функций на момент миграции: последующие изменения модулей не должны ее менять
+DETAILS_SUMMARY_MAX_LENGTH = 255
+
+
+def encode_json(data):
+    """ Сериализация и сжатие JSON-данных: sha256-хеш исходного JSON, сжатое содержимое, размер """
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(raw).hexdigest(), gzip.compress(raw), len(raw)
+
+
+def summarize_details(details):
+    """ Получение краткой детализации маршрута из небольших скалярных значений """
+    return {key: value for key, value in details.items()
+            if value is None or isinstance(value, (bool, int, float))
+            or (isinstance(value, str) and len(value) <= DETAILS_SUMMARY_MAX_LENGTH)}
+
+
+def move_details_to_storage(apps, schema_editor):
+    """ Перенос детализации маршрутов в таблицу сжатых результатов """
+    Route = apps.get_model('route_settings_builder', 'Route')
+    RouteDetails = apps.get_model('route_settings_builder', 'RouteDetails')
+
+    for route in Route.objects.exclude(details=None).exclude(details={}).only('id', 'details').iterator():
+        digest, payload, size = encode_json(route.details)
+        RouteDetails.objects.create(route_id=route.id, digest=digest, payload=payload, size=size)
+        Route.objects.filter(id=route.id).update(details_digest=digest,
+                                                 details_summary=summarize_details(route.details))
+
+
+def restore_details_from_storage(apps, schema_editor):
+    """ Возврат детализации маршрутов из таблицы сжатых результатов в поле маршрута """
+    Route = apps.get_model('route_settings_builder', 'Route')
+    RouteDetails = apps.get_model('route_settings_builder', 'RouteDetails')
+
+    for stored_details in RouteDetails.objects.only('route_id', 'payload').iterator():
+        details = json.loads(gzip.decompress(bytes(stored_details.payload)))
+        Route.objects.filter(id=stored_details.route_id).update(details=details)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='details_digest',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Хеш детализации маршрута'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='details_summary',
+            field=models.JSONField(blank=True, null=True, verbose_name='Краткая детализация маршрута'),
+        ),
+        migrations.CreateModel(
+            name='RouteDetails',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, verbose_name='Хеш содержимого')),
+                ('encoding', models.CharField(default='gzip', max_length=15, verbose_name='Способ сжатия')),
+                ('payload', models.BinaryField(verbose_name='Сжатое содержимое')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер содержимого')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stored_details', to='route_settings_builder.route', verbose_name='Маршрут')),
+            ],
+            options={
+                'verbose_name': 'Детализация маршрута',
+                'verbose_name_plural': 'детализации маршрутов',
+            },
+        ),
+        migrations.RunPython(move_details_to_storage, restore_details_from_storage),
+        migrations.RemoveField(
+            model_name='route',
+            name='details',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.7 on 2026-10-19 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0002_route_details'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routedetails',
+            name='brotli_payload',
+            field=models.BinaryField(null=True, verbose_name='Содержимое, сжатое brotli'),
+        ),
+        migrations.CreateModel(
+            name='RouteGuide',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, verbose_name='Хеш содержимого')),
+                ('encoding', models.CharField(default='gzip', max_length=15, verbose_name='Способ сжатия')),
+                ('payload', models.BinaryField(verbose_name='Сжатое содержимое')),
+                ('brotli_payload', models.BinaryField(null=True, verbose_name='Содержимое, сжатое brotli')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер содержимого')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('route', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stored_guide', to='route_settings_builder.route', verbose_name='Маршрут')),
+            ],
+            options={
+                'verbose_name': 'Путеводитель маршрута',
+                'verbose_name_plural': 'путеводители маршрутов',
+            },
+        ),
+    ]
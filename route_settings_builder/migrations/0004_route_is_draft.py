@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-19 10:49
+
+from django.db import migrations, models
+
+
+def fill_is_draft(apps, schema_editor):
+    """ Заполнение признака черновика по наличию результата строительства """
+    Route = apps.get_model('route_settings_builder', 'Route')
+    Route.objects.exclude(details_digest=None).update(is_draft=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0003_route_guide'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='is_draft',
+            field=models.BooleanField(default=True, verbose_name='Черновик'),
+        ),
+        migrations.RunPython(fill_is_draft, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='route',
+            index=models.Index(condition=models.Q(('is_draft', True)), fields=['author'], name='route_author_draft_idx'),
+        ),
+    ]
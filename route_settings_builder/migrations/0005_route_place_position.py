@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0004_route_is_draft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routeplace',
+            name='position',
+            field=models.BigIntegerField(blank=True, default=0, verbose_name='Позиция'),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE route_settings_builder_routeplace AS route_place
+            SET position = numbered.row_number * 65536
+            FROM (SELECT id, row_number() OVER (PARTITION BY route_id ORDER BY id) AS row_number
+                  FROM route_settings_builder_routeplace) AS numbered
+            WHERE route_place.id = numbered.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='routeplace',
+            index=models.Index(fields=['route', 'position'], name='route_place_position_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.1.7 on 2026-10-19 11:00
+
+from django.db import migrations, models
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+import numpy as np
+
+
+# Копии параметров и функций кластеризации на момент миграции: последующие изменения модулей не должны ее менять
+MAX_CLUSTER_ZOOM = 16
+CLUSTER_GRID_SHIFT = 2
+MERCATOR_MAX_LATITUDE = 85.05112878
+
+
+def get_grid_cells(coordinates, level):
+    """ Получение ячеек (x, y) сетки проекции Web Mercator уровня level, содержащих точки (широта, долгота) """
+    size = 1 << level
+    latitudes = np.radians(np.clip(coordinates[:, 0], -MERCATOR_MAX_LATITUDE, MERCATOR_MAX_LATITUDE))
+    mercator = np.stack(((coordinates[:, 1] + 180) / 360,
+                         (1 - np.arcsinh(np.tan(latitudes)) / np.pi) / 2), axis=1)
+    return np.clip(np.floor(mercator * size), 0, size - 1).astype(np.int64)
+
+
+def build_place_clusters(apps, schema_editor):
+    """ Построение кластеров по существующим местам """
+    Place = apps.get_model('route_settings_builder', 'Place')
+    PlaceCluster = apps.get_model('route_settings_builder', 'PlaceCluster')
+
+    coordinates = np.array(list(Place.objects.values_list(Cast('latitude', FloatField()),
+                                                          Cast('longitude', FloatField()))),
+                           dtype=np.float64).reshape(-1, 2)
+
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        cells, indexes, counts = np.unique(get_grid_cells(coordinates, zoom + CLUSTER_GRID_SHIFT),
+                                           axis=0, return_inverse=True, return_counts=True)
+        indexes = indexes.reshape(-1)
+        sums = [np.bincount(indexes, weights=coordinates[:, axis], minlength=len(cells)) for axis in (0, 1)]
+        minimums = np.full((len(cells), 2), np.inf)
+        maximums = np.full((len(cells), 2), -np.inf)
+        np.minimum.at(minimums, indexes, coordinates)
+        np.maximum.at(maximums, indexes, coordinates)
+
+        PlaceCluster.objects.bulk_create(
+            (PlaceCluster(zoom=zoom, x=cell_x, y=cell_y, count=count,
+                          latitude_sum=latitude_sum, longitude_sum=longitude_sum,
+                          min_latitude=minimum[0], max_latitude=maximum[0],
+                          min_longitude=minimum[1], max_longitude=maximum[1])
+             for (cell_x, cell_y), count, latitude_sum, longitude_sum, minimum, maximum
+             in zip(cells.tolist(), counts.tolist(), sums[0].tolist(), sums[1].tolist(),
+                    minimums.tolist(), maximums.tolist())),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0005_route_place_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField(verbose_name='Масштаб')),
+                ('x', models.IntegerField(verbose_name='Номер ячейки по долготе')),
+                ('y', models.IntegerField(verbose_name='Номер ячейки по широте')),
+                ('count', models.PositiveIntegerField(verbose_name='Количество мест')),
+                ('latitude_sum', models.FloatField(verbose_name='Сумма широт')),
+                ('longitude_sum', models.FloatField(verbose_name='Сумма долгот')),
+                ('min_latitude', models.FloatField(verbose_name='Минимальная широта')),
+                ('max_latitude', models.FloatField(verbose_name='Максимальная широта')),
+                ('min_longitude', models.FloatField(verbose_name='Минимальная долгота')),
+                ('max_longitude', models.FloatField(verbose_name='Максимальная долгота')),
+            ],
+            options={
+                'verbose_name': 'Кластер мест',
+                'verbose_name_plural': 'кластеры мест',
+                'unique_together': {('zoom', 'x', 'y')},
+            },
+        ),
+        migrations.RunPython(build_place_clusters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-19 11:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0006_place_cluster'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='criterion',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'internal_name', config='russian'), name='criterion_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', config='russian'), name='place_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='route',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', config='russian'), name='route_search_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.1.7 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0007_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='criteria_map',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Значения критериев'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='places_bbox',
+            field=models.JSONField(blank=True, null=True, verbose_name='Границы мест (запад, юг, восток, север)'),
+        ),
+        migrations.AddField(
+            model_name='route',
+            name='places_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество мест'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE route_settings_builder_route AS route
+            SET places_count = summary.places_count, places_bbox = summary.places_bbox
+            FROM (SELECT route_place.route_id,
+                         count(*) AS places_count,
+                         jsonb_build_array(min(place.longitude)::float, min(place.latitude)::float,
+                                           max(place.longitude)::float, max(place.latitude)::float) AS places_bbox
+                  FROM route_settings_builder_routeplace AS route_place
+                  JOIN route_settings_builder_place AS place ON place.id = route_place.place_id
+                  GROUP BY route_place.route_id) AS summary
+            WHERE route.id = summary.route_id;
+
+            UPDATE route_settings_builder_route AS route
+            SET criteria_map = summary.criteria_map
+            FROM (SELECT route_criterion.route_id,
+                         jsonb_object_agg(criterion.internal_name, route_criterion.value) AS criteria_map
+                  FROM route_settings_builder_routecriterion AS route_criterion
+                  JOIN route_settings_builder_criterion AS criterion ON criterion.id = route_criterion.criterion_id
+                  GROUP BY route_criterion.route_id) AS summary
+            WHERE route.id = summary.route_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.7 on 2026-10-19 11:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # индексы больших таблиц строятся без блокировки записи
+    atomic = False
+
+    dependencies = [
+        ('route_settings_builder', '0009_route_version'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='place',
+            index=models.Index(fields=['-updated_at', '-id'], name='place_updated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='route',
+            index=models.Index(fields=['-updated_at', '-id'], name='route_updated_at_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.7 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0010_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=16, verbose_name='Отпечаток SQL')),
+                ('operation', models.CharField(blank=True, max_length=255, verbose_name='Операция')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Количество записей')),
+                ('total_duration', models.FloatField(default=0, verbose_name='Суммарная длительность, мс')),
+                ('max_duration', models.FloatField(default=0, verbose_name='Наибольшая длительность, мс')),
+                ('plan', models.JSONField(blank=True, null=True, verbose_name='Последний план запроса')),
+                ('last_seen_at', models.DateTimeField(verbose_name='Последняя запись')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'медленные запросы',
+                'unique_together': {('fingerprint', 'operation')},
+            },
+        ),
+    ]
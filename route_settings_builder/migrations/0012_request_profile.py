@@ -0,0 +1,37 @@
+# Generated by Django 4.1.7 on 2026-10-19 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('route_settings_builder', '0011_slow_query'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(max_length=255, verbose_name='Операция')),
+                ('path', models.TextField(verbose_name='Путь запроса')),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='Код ответа')),
+                ('duration', models.FloatField(verbose_name='Длительность, мс')),
+                ('queries_count', models.PositiveIntegerField(verbose_name='Количество запросов к БД')),
+                ('queries_duration', models.FloatField(verbose_name='Длительность запросов к БД, мс')),
+                ('queries', models.JSONField(default=list, verbose_name='Запросы к БД')),
+                ('stats', models.TextField(verbose_name='Статистика профиля')),
+                ('profile', models.BinaryField(verbose_name='Профиль (pstats)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'профили запросов',
+            },
+        ),
+    ]
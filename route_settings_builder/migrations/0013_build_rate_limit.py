@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('route_settings_builder', '0012_request_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildRateLimit',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('tokens', models.FloatField(verbose_name='Запас запросов')),
+                ('updated_at', models.DateTimeField(verbose_name='Время пополнения')),
+            ],
+            options={
+                'verbose_name': 'Ограничение строительства маршрутов',
+                'verbose_name_plural': 'ограничения строительства маршрутов',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('route_settings_builder', '0013_build_rate_limit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteBuildSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.UUIDField(verbose_name='Группа строительства')),
+                ('index', models.PositiveIntegerField(verbose_name='Номер сегмента')),
+                ('details', models.JSONField(blank=True, null=True, verbose_name='Детализация сегмента')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время отправки')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='build_segments', to='route_settings_builder.route', verbose_name='Маршрут')),
+            ],
+            options={
+                'verbose_name': 'Сегмент строительства маршрута',
+                'verbose_name_plural': 'сегменты строительства маршрутов',
+                'unique_together': {('group', 'index')},
+            },
+        ),
+    ]
@@ -1,12 +1,19 @@
+from typing import Dict, Optional, Tuple
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.utils.functional import cached_property
 
 from ckeditor import fields
 
-from route_settings_builder import validators, querysets
+from route_settings_builder import validators, querysets, compression, search
+
+
+# Шаг между позициями соседних мест маршрута: оставляет место для вставки без перенумерации
+ROUTE_PLACE_POSITION_STEP = 1 << 16
 
 
 def validate_value(value_type: str, value: str) -> str:
@@ -36,6 +43,44 @@ class UpdateDescriptionMixin(models.Model):
         abstract = True
 
 
+class CompressedContentMixin(models.Model):
+    """ Сжатое содержимое с заранее подготовленными вариантами для ответа """
+    digest = models.CharField(max_length=64,
+                              null=False,
+                              blank=False,
+                              verbose_name='Хеш содержимого')
+
+    encoding = models.CharField(max_length=15,
+                                null=False,
+                                blank=False,
+                                default=compression.GZIP_ENCODING,
+                                verbose_name='Способ сжатия')
+
+    payload = models.BinaryField(null=False,
+                                 verbose_name='Сжатое содержимое')
+
+    brotli_payload = models.BinaryField(null=True,
+                                        verbose_name='Содержимое, сжатое brotli')
+
+    size = models.PositiveIntegerField(null=False,
+                                       verbose_name='Размер содержимого')
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        abstract = True
+
+    def __str__(self) -> str:
+        return self.digest
+
+    def get_variants(self) -> Dict[str, bytes]:
+        """
+        Получение вариантов сжатого содержимого
+        :return: словарь вида {способ сжатия: содержимое}
+        """
+        return {self.encoding: self.payload, compression.BROTLI_ENCODING: self.brotli_payload}
+
+
 class Criterion(UpdateDescriptionMixin, models.Model):
     """ Критерий """
     name = models.CharField(max_length=255,
@@ -65,6 +110,9 @@ class Criterion(UpdateDescriptionMixin, models.Model):
     class Meta:
         verbose_name = 'Критерий'
         verbose_name_plural = 'критерии'
+        indexes = [
+            GinIndex(search.get_search_vector('Criterion'), name='criterion_search_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}'
@@ -101,9 +149,15 @@ class Place(UpdateDescriptionMixin, models.Model):
                                       related_name='places',
                                       verbose_name='Критерии')
 
+    objects = querysets.PlaceQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Место'
         verbose_name_plural = 'места'
+        indexes = [
+            GinIndex(search.get_search_vector('Place'), name='place_search_idx'),
+            models.Index(fields=['-updated_at', '-id'], name='place_updated_at_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}'
@@ -141,6 +195,62 @@ class PlaceCriterion(models.Model):
         return f'{self.criterion.internal_name}'
 
 
+class PlaceCluster(models.Model):
+    """ Кластер мест - ячейка сетки карты на уровне масштаба """
+    zoom = models.PositiveSmallIntegerField(null=False,
+                                            verbose_name='Масштаб')
+
+    x = models.IntegerField(null=False,
+                            verbose_name='Номер ячейки по долготе')
+
+    y = models.IntegerField(null=False,
+                            verbose_name='Номер ячейки по широте')
+
+    count = models.PositiveIntegerField(null=False,
+                                        verbose_name='Количество мест')
+
+    latitude_sum = models.FloatField(null=False,
+                                     verbose_name='Сумма широт')
+
+    longitude_sum = models.FloatField(null=False,
+                                      verbose_name='Сумма долгот')
+
+    min_latitude = models.FloatField(null=False,
+                                     verbose_name='Минимальная широта')
+
+    max_latitude = models.FloatField(null=False,
+                                     verbose_name='Максимальная широта')
+
+    min_longitude = models.FloatField(null=False,
+                                      verbose_name='Минимальная долгота')
+
+    max_longitude = models.FloatField(null=False,
+                                      verbose_name='Максимальная долгота')
+
+    class Meta:
+        unique_together = ['zoom', 'x', 'y']
+        verbose_name = 'Кластер мест'
+        verbose_name_plural = 'кластеры мест'
+
+    def __str__(self) -> str:
+        return f'{self.zoom}/{self.x}/{self.y}'
+
+    @property
+    def latitude(self) -> float:
+        """ Широта центра кластера """
+        return self.latitude_sum / self.count
+
+    @property
+    def longitude(self) -> float:
+        """ Долгота центра кластера """
+        return self.longitude_sum / self.count
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """ Границы мест кластера (запад, юг, восток, север) """
+        return self.min_longitude, self.min_latitude, self.max_longitude, self.max_latitude
+
+
 class Route(UpdateDescriptionMixin, models.Model):
     """ Маршрут """
     uuid = models.UUIDField(default=uuid.uuid4,
@@ -155,9 +265,35 @@ class Route(UpdateDescriptionMixin, models.Model):
                             db_index=True,
                             verbose_name='Наименование')
 
-    details = models.JSONField(null=True,
-                               blank=True,
-                               verbose_name='Детализация маршрута')
+    details_digest = models.CharField(max_length=64,
+                                      null=True,
+                                      blank=True,
+                                      verbose_name='Хеш детализации маршрута')
+
+    details_summary = models.JSONField(null=True,
+                                       blank=True,
+                                       verbose_name='Краткая детализация маршрута')
+
+    is_draft = models.BooleanField(null=False,
+                                   default=True,
+                                   verbose_name='Черновик')
+
+    places_count = models.PositiveIntegerField(null=False,
+                                               default=0,
+                                               verbose_name='Количество мест')
+
+    places_bbox = models.JSONField(null=True,
+                                   blank=True,
+                                   verbose_name='Границы мест (запад, юг, восток, север)')
+
+    criteria_map = models.JSONField(null=False,
+                                    blank=True,
+                                    default=dict,
+                                    verbose_name='Значения критериев')
+
+    version = models.PositiveIntegerField(null=False,
+                                          default=1,
+                                          verbose_name='Версия')
 
     places = models.ManyToManyField(Place,
                                     through='RoutePlace',
@@ -189,10 +325,55 @@ class Route(UpdateDescriptionMixin, models.Model):
     class Meta:
         verbose_name = 'Маршрут'
         verbose_name_plural = 'маршруты'
+        indexes = [
+            models.Index(fields=['author'], condition=models.Q(is_draft=True), name='route_author_draft_idx'),
+            GinIndex(search.get_search_vector('Route'), name='route_search_idx'),
+            models.Index(fields=['-updated_at', '-id'], name='route_updated_at_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
+    @property
+    def details(self) -> Optional[dict]:
+        """ Детализация маршрута. Загружается из хранилища при обращении """
+        if not self.details_digest:
+            return None
+
+        try:
+            return self.stored_details.content  # pylint: disable=no-member
+        except RouteDetails.DoesNotExist:
+            return None
+
+
+class RouteDetails(CompressedContentMixin, models.Model):
+    """ Сжатый результат строительства маршрута """
+    route = models.OneToOneField(Route,
+                                 on_delete=models.CASCADE,
+                                 related_name='stored_details',
+                                 verbose_name='Маршрут')
+
+    class Meta:
+        verbose_name = 'Детализация маршрута'
+        verbose_name_plural = 'детализации маршрутов'
+
+    @cached_property
+    def content(self) -> dict:
+        """ Распакованное содержимое """
+        return compression.decode_json(self.payload, self.encoding)
+
+
+class RouteGuide(CompressedContentMixin, models.Model):
+    """ Сжатый путеводитель маршрута, подготовленный при строительстве """
+    route = models.OneToOneField(Route,
+                                 on_delete=models.CASCADE,
+                                 related_name='stored_guide',
+                                 verbose_name='Маршрут')
+
+    class Meta:
+        verbose_name = 'Путеводитель маршрута'
+        verbose_name_plural = 'путеводители маршрутов'
+
 
 class RouteCriterion(models.Model):
     """ Критерий для маршрута """
@@ -236,7 +417,160 @@ class RoutePlace(models.Model):
                               on_delete=models.PROTECT,
                               verbose_name='Место')
 
+    position = models.BigIntegerField(null=False,
+                                      blank=True,
+                                      verbose_name='Позиция')
+
+    def save(self, *args, **kwargs):
+        if self.position is None:
+            last_position = (RoutePlace.objects.filter(route_id=self.route_id)
+                             .aggregate(last_position=models.Max('position'))['last_position'])
+            self.position = (last_position or 0) + ROUTE_PLACE_POSITION_STEP
+        super().save(*args, **kwargs)
+
     class Meta:
         unique_together = ['route', 'place']
+        indexes = [
+            models.Index(fields=['route', 'position'], name='route_place_position_idx'),
+        ]
         verbose_name = 'Место маршрута'
         verbose_name_plural = 'места маршрута'
+
+
+class SlowQuery(models.Model):
+    """ Сводка медленных запросов к БД по отпечатку SQL и операции API """
+    fingerprint = models.CharField(max_length=16,
+                                   null=False,
+                                   verbose_name='Отпечаток SQL')
+
+    operation = models.CharField(max_length=255,
+                                 null=False,
+                                 blank=True,
+                                 verbose_name='Операция')
+
+    sql = models.TextField(null=False,
+                           verbose_name='Нормализованный SQL')
+
+    calls = models.PositiveIntegerField(null=False,
+                                        default=0,
+                                        verbose_name='Количество записей')
+
+    total_duration = models.FloatField(null=False,
+                                       default=0,
+                                       verbose_name='Суммарная длительность, мс')
+
+    max_duration = models.FloatField(null=False,
+                                     default=0,
+                                     verbose_name='Наибольшая длительность, мс')
+
+    plan = models.JSONField(null=True,
+                            blank=True,
+                            verbose_name='Последний план запроса')
+
+    last_seen_at = models.DateTimeField(null=False,
+                                        verbose_name='Последняя запись')
+
+    class Meta:
+        unique_together = ['fingerprint', 'operation']
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'медленные запросы'
+
+    def __str__(self) -> str:
+        return f'{self.fingerprint} {self.operation}'
+
+    @property
+    def average_duration(self) -> float:
+        """ Средняя длительность, мс """
+        return self.total_duration / self.calls if self.calls else 0
+
+
+class RequestProfile(models.Model):
+    """ Профиль выполнения запроса к API с журналом запросов к БД """
+    operation = models.CharField(max_length=255,
+                                 null=False,
+                                 verbose_name='Операция')
+
+    path = models.TextField(null=False,
+                            verbose_name='Путь запроса')
+
+    status_code = models.PositiveSmallIntegerField(null=False,
+                                                   verbose_name='Код ответа')
+
+    duration = models.FloatField(null=False,
+                                 verbose_name='Длительность, мс')
+
+    queries_count = models.PositiveIntegerField(null=False,
+                                                verbose_name='Количество запросов к БД')
+
+    queries_duration = models.FloatField(null=False,
+                                         verbose_name='Длительность запросов к БД, мс')
+
+    queries = models.JSONField(null=False,
+                               default=list,
+                               verbose_name='Запросы к БД')
+
+    stats = models.TextField(null=False,
+                             verbose_name='Статистика профиля')
+
+    profile = models.BinaryField(null=False,
+                                 verbose_name='Профиль (pstats)')
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             null=True,
+                             on_delete=models.SET_NULL,
+                             related_name='+',
+                             verbose_name='Пользователь')
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'профили запросов'
+
+    def __str__(self) -> str:
+        return f'{self.operation} {self.created_at:%Y-%m-%d %H:%M:%S}'
+
+
+class BuildRateLimit(models.Model):
+    """ Запас запросов автора на строительство маршрутов (token bucket) """
+    author = models.OneToOneField(settings.AUTH_USER_MODEL,
+                                  primary_key=True,
+                                  on_delete=models.CASCADE,
+                                  related_name='+',
+                                  verbose_name='Автор')
+
+    tokens = models.FloatField(null=False,
+                               verbose_name='Запас запросов')
+
+    updated_at = models.DateTimeField(null=False,
+                                      verbose_name='Время пополнения')
+
+    class Meta:
+        verbose_name = 'Ограничение строительства маршрутов'
+        verbose_name_plural = 'ограничения строительства маршрутов'
+
+
+class RouteBuildSegment(models.Model):
+    """ Сегмент строительства длинного маршрута. details заполняется ответом строителя """
+    route = models.ForeignKey(Route,
+                              on_delete=models.CASCADE,
+                              related_name='build_segments',
+                              verbose_name='Маршрут')
+
+    group = models.UUIDField(null=False,
+                             verbose_name='Группа строительства')
+
+    index = models.PositiveIntegerField(null=False,
+                                        verbose_name='Номер сегмента')
+
+    details = models.JSONField(null=True,
+                               blank=True,
+                               verbose_name='Детализация сегмента')
+
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Время отправки')
+
+    class Meta:
+        verbose_name = 'Сегмент строительства маршрута'
+        verbose_name_plural = 'сегменты строительства маршрутов'
+        unique_together = ['group', 'index']
@@ -1,69 +1,563 @@
 # TODO: оптимизация запросов
+from contextlib import contextmanager
+from contextvars import ContextVar
 import decimal
 import uuid
-from typing import Tuple, List, Optional
+from typing import Iterable, Tuple, List, Optional
 
-from django.db import transaction
-from django.db.models import F, Case, When, ExpressionWrapper, FloatField, BooleanField
-from django.db.models.functions import Cast
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.db.models import (F, Case, When, ExpressionWrapper, FloatField, BooleanField, JSONField, Func,
+                              OuterRef, Subquery, Count, Min, Max, Value)
+from django.db.models.functions import Cast, Coalesce
 
-from route_settings_builder import models
+from route_settings_builder import models, build_events, compression, routers, segments
+
+
+DETAILS_SUMMARY_MAX_LENGTH = 255
+
+# Результаты операций над несколькими маршрутами
+ROUTE_DELETED = 'deleted'
+ROUTE_UPDATED = 'updated'
+ROUTE_NOT_FOUND = 'not_found'
+
+_routes_summary_deferred = ContextVar('routes_summary_deferred', default=False)
+
+
+class RouteVersionConflict(Exception):
+    """ Маршрут изменен после получения клиентом его версии """
 
 
 @transaction.atomic
-def create_or_update_route(route_data: dict, route_uuid: Optional[uuid.UUID] = None):
-    """ Создание или обновление маршрута """
+def create_or_update_route(route_data: dict, route_uuid: Optional[uuid.UUID] = None,
+                           expected_version: Optional[int] = None):
+    """
+    Создание или обновление маршрута.
+    Маршрут не блокируется на время изменения связей: версия проверяется и увеличивается
+    вместе с обновлением полей и сводки одним UPDATE в конце транзакции (compare-and-swap)
+    :param route_data: данные маршрута
+    :param route_uuid: UUID обновляемого маршрута. None - создание
+    :param expected_version: версия маршрута, известная клиенту (If-Match). None - без проверки версии
+    :return: маршрут
+    """
     route_data = dict(route_data)
 
+    author = route_data.pop('author')
     criteria_data = route_data.pop('criteria', None)
     places_ids = route_data.pop('places', None)
-
-    is_create_operation = False
-    existed_criteria_ids = set()
-    existed_places_ids = set()
+    has_details = 'details' in route_data
+    details = route_data.pop('details', None)
 
     if not route_uuid:
-        is_create_operation = True
-        route = models.Route.objects.create(author=route_data.pop('author'), **route_data)
+        route = models.Route.objects.create(author=author, **route_data)
     else:
-        models.Route.objects.filter(author=route_data.pop('author'), uuid=route_uuid).update(**route_data)
-        route = models.Route.objects.select_for_update().get(uuid=route_uuid)
-        existed_criteria_ids = set(route.criteria.values_list('id', flat=True) if not is_create_operation else [])
-        existed_places_ids = set(route.places.values_list('id', flat=True) if not is_create_operation else [])
-
-    added_criteria_ids = []
-    if criteria_data is not None:
-        for criterion_data in criteria_data:
-            models.RouteCriterion.objects.create(**criterion_data, route=route)
-            added_criteria_ids.append(criterion_data['criterion_id'])
-
-    if places_ids is not None:
-        models.RoutePlace.objects.bulk_create([models.RoutePlace(place_id=place_id, route=route)
-                                               for place_id in places_ids])
-
-    if not is_create_operation:
-        if criteria_data is not None:
-            if remove_criteria_ids := existed_criteria_ids - set(added_criteria_ids):
-                models.RouteCriterion.objects.filter(criterion__id__in=remove_criteria_ids).delete()
+        route = models.Route.objects.only('id', 'uuid', 'version').get(author=author, uuid=route_uuid)
+        if expected_version is not None and route.version != expected_version:
+            raise RouteVersionConflict('Маршрут изменен другим запросом')
+        models.RouteGuide.objects.filter(route=route).delete()
 
+    with _defer_routes_summary():
+        if criteria_data is not None:
+            _set_route_criteria(route, criteria_data)
         if places_ids is not None:
-            if remove_places_ids := existed_places_ids - set(places_ids):
-                models.RoutePlace.objects.filter(place__id__in=remove_places_ids).delete()
+            _set_route_places(route, places_ids)
+
+    routes = models.Route.objects.filter(id=route.id)
+    if route_uuid:
+        if expected_version is not None:
+            routes = routes.filter(version=expected_version)
+        if not routes.update(**route_data, **_get_routes_summary_values(),
+                             version=F('version') + 1, updated_at=timezone.now()):
+            raise RouteVersionConflict('Маршрут изменен другим запросом')
+    elif criteria_data is not None or places_ids is not None:
+        routes.update(**_get_routes_summary_values())
+
+    if has_details:
+        save_route_details(route.uuid, details)
 
+    routers.pin_primary(author.id)
     route.refresh_from_db()
-    setattr(route, 'is_draft', bool(route.details))
 
     return route
 
 
+@transaction.atomic
+def save_route_details(route_uuid: uuid.UUID, details: Optional[dict]) -> None:
+    """
+    Сохранение результата строительства маршрута в сжатом виде.
+    На маршруте остаются хеш содержимого и краткая детализация из небольших скалярных значений.
+    Ожидающие строительства клиенты получают событие при фиксации транзакции
+    :param route_uuid: UUID маршрута
+    :param details: детализация маршрута
+    :return: None
+    """
+    route = models.Route.objects.only('id', 'author_id', 'details_digest').get(uuid=route_uuid)
+    routers.pin_primary(route.author_id)
+    build_events.notify(route_uuid)
+
+    if not details:
+        models.RouteDetails.objects.filter(route=route).delete()
+        models.RouteGuide.objects.filter(route=route).delete()
+        models.Route.objects.filter(id=route.id).update(details_digest=None, details_summary=None, is_draft=True)
+        return
+
+    content = compression.dump_json(details)
+    if compression.get_digest(content) == route.details_digest:
+        return
+
+    stored_details, _ = models.RouteDetails.objects.update_or_create(
+        route=route, defaults=compression.compress_variants(content))
+    models.Route.objects.filter(id=route.id).update(details_digest=stored_details.digest,
+                                                    details_summary=summarize_details(details),
+                                                    is_draft=False)
+
+    save_route_guide(models.Route.objects.get(id=route.id))
+
+
+@transaction.atomic
+def start_segmented_build(route_uuid: uuid.UUID, segments_count: int) -> uuid.UUID:
+    """
+    Начало строительства маршрута сегментами: ожидаемые сегменты новой группы заменяют сегменты
+    предыдущего строительства, поэтому запоздавшие ответы предыдущего строительства не сохраняются
+    :param route_uuid: UUID маршрута
+    :param segments_count: количество сегментов
+    :return: UUID группы строительства
+    """
+    route_id = models.Route.objects.select_for_update().filter(uuid=route_uuid).values_list('id', flat=True).get()
+    group = uuid.uuid4()
+
+    models.RouteBuildSegment.objects.filter(route_id=route_id).delete()
+    models.RouteBuildSegment.objects.bulk_create(
+        models.RouteBuildSegment(route_id=route_id, group=group, index=index) for index in range(segments_count))
+
+    return group
+
+
+@transaction.atomic
+def save_route_segment_details(route_uuid: uuid.UUID, group: uuid.UUID, index: int, details: Optional[dict]) -> bool:
+    """
+    Сохранение результата строительства сегмента. После получения всех сегментов группы
+    детализации объединяются и сохраняются как результат строительства маршрута.
+    Строка маршрута блокируется, чтобы последний сегмент определялся при одновременных ответах.
+    Пустой ответ означает, что сегмент не построен: группа завершается, прежний результат строительства сохраняется,
+    а ожидающие строительства клиенты получают событие, чтобы не ждать до таймаута
+    :param route_uuid: UUID маршрута
+    :param group: UUID группы строительства
+    :param index: номер сегмента
+    :param details: детализация сегмента
+    :return: маршрут построен
+    """
+    route_id = models.Route.objects.select_for_update().filter(uuid=route_uuid).values_list('id', flat=True).get()
+    group_segments = models.RouteBuildSegment.objects.filter(route_id=route_id, group=group)
+
+    if not details:
+        build_events.notify(route_uuid)
+        group_segments.delete()
+        return False
+
+    if not group_segments.filter(index=index).update(details=details):
+        return False
+
+    segments_details = list(group_segments.order_by('index').values_list('details', flat=True))
+    if None in segments_details:
+        return False
+
+    group_segments.delete()
+    save_route_details(route_uuid, segments.merge_details(segments_details))
+    return True
+
+
+@transaction.atomic
+def clone_route(route_uuid: uuid.UUID, author, name: Optional[str] = None, with_details: bool = False) -> models.Route:
+    """
+    Копирование маршрута вместе с местами и критериями запросами INSERT ... SELECT без выборки строк.
+    Сводка маршрута копируется вместе со строкой маршрута, поэтому сигналы не нужны
+    :param route_uuid: UUID копируемого маршрута
+    :param author: автор маршрута
+    :param name: наименование копии. None - наименование маршрута
+    :param with_details: копировать результат строительства маршрута
+    :return: копия маршрута
+    """
+    source_id = models.Route.objects.filter(author=author, uuid=route_uuid).values_list('id', flat=True).get()
+
+    now = timezone.now()
+    route_values = {'uuid': uuid.uuid4(), 'author': author.id, 'version': 1, 'created_at': now, 'updated_at': now}
+    if name is not None:
+        route_values['name'] = name
+    if not with_details:
+        route_values.update(details_digest=None, details_summary=None, is_draft=True)
+
+    route_id, = _copy_rows(models.Route, 'id', source_id, route_values)
+    _copy_rows(models.RoutePlace, 'route', source_id, {'route': route_id})
+    _copy_rows(models.RouteCriterion, 'route', source_id, {'route': route_id})
+    if with_details:
+        _copy_rows(models.RouteDetails, 'route', source_id, {'route': route_id, 'created_at': now})
+
+    routers.pin_primary(author.id)
+    return models.Route.objects.get(id=route_id)
+
+
+@transaction.atomic
+def delete_routes(author, routes_uuids: List[uuid.UUID]) -> List[dict]:
+    """
+    Удаление маршрутов автора
+    :param author: автор маршрутов
+    :param routes_uuids: UUID маршрутов
+    :return: результаты по маршрутам вида {'uuid': UUID, 'status': 'deleted' | 'not_found'}
+    """
+    routes_ids = dict(models.Route.objects.filter(author=author, uuid__in=routes_uuids).values_list('uuid', 'id'))
+    models.Route.objects.filter(id__in=routes_ids.values()).delete()
+
+    routers.pin_primary(author.id)
+    return [{'uuid': route_uuid, 'status': ROUTE_DELETED if route_uuid in routes_ids else ROUTE_NOT_FOUND}
+            for route_uuid in routes_uuids]
+
+
+@transaction.atomic
+def update_routes(author, routes_uuids: List[uuid.UUID], route_data: dict) -> List[dict]:
+    """
+    Изменение маршрутов автора: поля обновляются одним UPDATE, значения критериев сохраняются одним запросом
+    :param author: автор маршрутов
+    :param routes_uuids: UUID маршрутов
+    :param route_data: значения полей; criteria - значения критериев, добавляемые или заменяемые у всех маршрутов
+    :return: результаты по маршрутам вида {'uuid': UUID, 'status': 'updated' | 'not_found', 'version': версия}
+    """
+    route_data = dict(route_data)
+    criteria_data = route_data.pop('criteria', None)
+
+    routes_ids = list(models.Route.objects.filter(author=author, uuid__in=routes_uuids).values_list('id', flat=True))
+
+    if criteria_data:
+        criteria_values = _validate_criteria_values(criteria_data)
+        models.RouteCriterion.objects.bulk_create(
+            [models.RouteCriterion(route_id=route_id, criterion_id=criterion_id, value=value)
+             for route_id in routes_ids for criterion_id, value in criteria_values],
+            update_conflicts=True, unique_fields=['route', 'criterion'], update_fields=['value'],
+        )
+        route_data.update(_get_routes_summary_values())
+
+    models.RouteGuide.objects.filter(route_id__in=routes_ids).delete()
+    models.Route.objects.filter(id__in=routes_ids).update(**route_data, version=F('version') + 1,
+                                                          updated_at=timezone.now())
+
+    routers.pin_primary(author.id)
+    versions = dict(models.Route.objects.filter(id__in=routes_ids).values_list('uuid', 'version'))
+    return [{'uuid': route_uuid, 'status': ROUTE_UPDATED if route_uuid in versions else ROUTE_NOT_FOUND,
+             'version': versions.get(route_uuid)}
+            for route_uuid in routes_uuids]
+
+
+def save_route_guide(route: models.Route) -> models.RouteGuide:
+    """
+    Подготовка путеводителя маршрута и сохранение его сжатых вариантов
+    :param route: маршрут
+    :return: сохраненный путеводитель
+    """
+    content = render_to_string('guide.html', context={
+        'route': route,
+        'route_places': list(route.places.order_by('routeplace__position').values('name', 'description')),
+    })
+
+    route_guide, _ = models.RouteGuide.objects.update_or_create(
+        route=route, defaults=compression.compress_variants(content.encode()))
+    return route_guide
+
+
+def summarize_details(details: dict) -> dict:
+    """
+    Получение краткой детализации маршрута
+    :param details: детализация маршрута
+    :return: словарь небольших скалярных значений детализации
+    """
+    return {key: value for key, value in details.items()
+            if value is None or isinstance(value, (bool, int, float))
+            or (isinstance(value, str) and len(value) <= DETAILS_SUMMARY_MAX_LENGTH)}
+
+
+@transaction.atomic
+def insert_route_place(route: models.Route, place_id: int, after_place_id: Optional[int] = None) -> models.RoutePlace:
+    """
+    Добавление места в маршрут после указанного места
+    :param route: маршрут
+    :param place_id: id добавляемого места
+    :param after_place_id: id места, после которого добавляется место. None - в начало маршрута
+    :return: связь маршрута и места
+    """
+    models.RouteGuide.objects.filter(route=route).delete()
+    route_place = models.RoutePlace.objects.create(route=route, place_id=place_id,
+                                                   position=_get_free_position(route, after_place_id))
+    _increment_route_version(route)
+    return route_place
+
+
+@transaction.atomic
+def move_route_place(route: models.Route, place_id: int, after_place_id: Optional[int] = None) -> None:
+    """
+    Перемещение места маршрута после указанного места.
+    Обновляется одна строка; маршрут перенумеровывается, только если между соседями не осталось позиций
+    :param route: маршрут
+    :param place_id: id перемещаемого места
+    :param after_place_id: id места, после которого ставится место. None - в начало маршрута
+    :return: None
+    """
+    route_place = models.RoutePlace.objects.select_for_update().get(route=route, place_id=place_id)
+    if after_place_id == place_id:
+        return
+
+    route_place.position = _get_free_position(route, after_place_id, exclude_place_id=place_id)
+    route_place.save(update_fields=['position'])
+    models.RouteGuide.objects.filter(route=route).delete()
+    _increment_route_version(route)
+
+
+@transaction.atomic
+def optimize_route_places_order(route: models.Route, time_budget: Optional[float] = None) -> None:
+    """
+    Оптимизация порядка мест маршрута по расстоянию.
+    Первое место остается началом маршрута, найденный порядок сохраняется в позициях мест
+    :param route: маршрут
+    :param time_budget: бюджет времени в секундах на улучшение порядка. None - optimizer.DEFAULT_TIME_BUDGET
+    :return: None
+    """
+    # numpy загружается при первой оптимизации, а не при запуске процесса
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    from route_settings_builder import optimizer  # pylint: disable=import-outside-toplevel
+
+    route_places = list(models.RoutePlace.objects
+                        .select_for_update(of=('self', ))
+                        .filter(route=route)
+                        .order_by('position')
+                        .values_list('place_id',
+                                     ExpressionWrapper(F('place__latitude'), output_field=FloatField()),
+                                     ExpressionWrapper(F('place__longitude'), output_field=FloatField())))
+    if not route_places:
+        return
+
+    order = optimizer.optimize_order(np.array([route_place[1:] for route_place in route_places]),
+                                     optimizer.DEFAULT_TIME_BUDGET if time_budget is None else time_budget)
+    _set_route_places(route, [route_places[index][0] for index in order])
+    models.RouteGuide.objects.filter(route=route).delete()
+    _increment_route_version(route)
+
+
+def update_routes_summary(route_ids: Iterable[int]) -> None:
+    """
+    Обновление сводки маршрутов для перечня: количества мест, границ мест и значений критериев.
+    Сводка пересчитывается одним запросом по местам и критериям маршрутов
+    :param route_ids: id маршрутов
+    :return: None
+    """
+    if _routes_summary_deferred.get():
+        return
+
+    models.Route.objects.filter(id__in=route_ids).update(**_get_routes_summary_values())
+
+
+def _get_routes_summary_values() -> dict:
+    """
+    Получение выражений сводки маршрута для UPDATE
+    :return: словарь вида {поле: выражение}
+    """
+    route_places = (models.RoutePlace.objects
+                    .filter(route=OuterRef('pk'))
+                    .order_by()
+                    .values('route'))
+    route_criteria = (models.RouteCriterion.objects
+                      .filter(route=OuterRef('pk'))
+                      .order_by()
+                      .values('route'))
+
+    places_bbox = Func(*(Cast(aggregate(f'place__{field_name}'), FloatField())
+                         for aggregate, field_name in ((Min, 'longitude'), (Min, 'latitude'),
+                                                       (Max, 'longitude'), (Max, 'latitude'))),
+                       function='jsonb_build_array', output_field=JSONField())
+    criteria_map = Func(F('criterion__internal_name'), F('value'),
+                        function='jsonb_object_agg', output_field=JSONField())
+
+    return {
+        'places_count': Coalesce(Subquery(route_places.annotate(count=Count('id')).values('count')), 0),
+        'places_bbox': Subquery(route_places.annotate(bbox=places_bbox).values('bbox')),
+        'criteria_map': Coalesce(Subquery(route_criteria.annotate(map=criteria_map).values('map')),
+                                 Value({}, output_field=JSONField())),
+    }
+
+
+@contextmanager
+def _defer_routes_summary():
+    """
+    Отключение пересчета сводки маршрутов по сигналам: вызывающий код обновляет сводку сам
+    :return: контекстный менеджер
+    """
+    token = _routes_summary_deferred.set(True)
+    try:
+        yield
+    finally:
+        _routes_summary_deferred.reset(token)
+
+
 def get_points_coordinates_from_route_places(route: models.Route) -> List[Tuple[decimal.Decimal]]:
     """
-    Получение списка координат мест из маршрута
+    Получение списка координат мест из маршрута в порядке следования
     :param route: маршрут
     :return: список координат
     """
-    return list(route.places.values_list(ExpressionWrapper(F('latitude'), output_field=FloatField()),
-                                         ExpressionWrapper(F('longitude'), output_field=FloatField())))
+    return list(models.RoutePlace.objects
+                .filter(route=route)
+                .order_by('position')
+                .values_list(ExpressionWrapper(F('place__latitude'), output_field=FloatField()),
+                             ExpressionWrapper(F('place__longitude'), output_field=FloatField())))
+
+
+def _copy_rows(model, source_field_name: str, source_id: int, values: dict) -> List[int]:
+    """
+    Копирование строк модели одним запросом INSERT ... SELECT
+    :param model: модель
+    :param source_field_name: поле, по которому выбираются копируемые строки
+    :param source_id: значение поля копируемых строк
+    :param values: значения полей копий вида {поле: значение}, остальные поля копируются
+    :return: id копий
+    """
+    meta = model._meta  # pylint: disable=protected-access
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    quote_name = connection.ops.quote_name
+
+    select_columns = []
+    params = []
+    for field in fields:
+        if field.name in values:
+            select_columns.append('%s')
+            params.append(field.get_db_prep_save(values[field.name], connection))
+        else:
+            select_columns.append(quote_name(field.column))
+    params.append(source_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {quote_name(meta.db_table)} ({', '.join(quote_name(field.column) for field in fields)})
+            SELECT {', '.join(select_columns)}
+            FROM {quote_name(meta.db_table)}
+            WHERE {quote_name(meta.get_field(source_field_name).column)} = %s
+            RETURNING {quote_name(meta.pk.column)}
+            """,
+            params
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _increment_route_version(route: models.Route) -> None:
+    """
+    Увеличение версии маршрута после изменения порядка или состава мест
+    :param route: маршрут
+    :return: None
+    """
+    models.Route.objects.filter(id=route.id).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def _set_route_criteria(route: models.Route, criteria_data: List[dict]) -> None:
+    """
+    Привязка критериев к маршруту: значения проверяются по типам критериев,
+    критерии сохраняются одним запросом, отсутствующие в данных удаляются
+    :param route: маршрут
+    :param criteria_data: список словарей вида {'criterion_id': id, 'value': значение}
+    :return: None
+    """
+    criteria_values = _validate_criteria_values(criteria_data)
+    route_criteria = [models.RouteCriterion(route=route, criterion_id=criterion_id, value=value)
+                      for criterion_id, value in criteria_values]
+
+    models.RouteCriterion.objects.filter(route=route).exclude(
+        criterion_id__in=[criterion_id for criterion_id, _ in criteria_values]).delete()
+    models.RouteCriterion.objects.bulk_create(route_criteria, update_conflicts=True,
+                                              unique_fields=['route', 'criterion'], update_fields=['value'])
+
+
+def _validate_criteria_values(criteria_data: List[dict]) -> List[Tuple[int, str]]:
+    """
+    Проверка значений критериев по их типам одним запросом
+    :param criteria_data: список словарей вида {'criterion_id': id, 'value': значение}
+    :return: список (id критерия, значение)
+    """
+    value_types = dict(models.Criterion.objects
+                       .filter(id__in=[criterion_data['criterion_id'] for criterion_data in criteria_data])
+                       .values_list('id', 'value_type'))
+
+    criteria_values = []
+    for criterion_data in criteria_data:
+        if (value_type := value_types.get(criterion_data['criterion_id'])) is None:
+            raise models.Criterion.DoesNotExist(f'Критерий не найден: {criterion_data["criterion_id"]}')
+        criteria_values.append((criterion_data['criterion_id'],
+                                models.validate_value(value_type, criterion_data['value'])))
+    return criteria_values
+
+
+def _set_route_places(route: models.Route, places_ids: List[int]) -> None:
+    """
+    Привязка мест к маршруту в заданном порядке. Позиции обновляются только у переставленных мест
+    :param route: маршрут
+    :param places_ids: список id мест в порядке следования
+    :return: None
+    """
+    route_places = models.RoutePlace.objects.filter(route=route).only('id', 'place_id', 'position')
+    existed_route_places = {route_place.place_id: route_place for route_place in route_places}
+    models.RoutePlace.objects.filter(route=route).exclude(place_id__in=places_ids).delete()
+
+    added_route_places = []
+    moved_route_places = []
+    for index, place_id in enumerate(places_ids, start=1):
+        position = index * models.ROUTE_PLACE_POSITION_STEP
+
+        if (route_place := existed_route_places.get(place_id)) is None:
+            added_route_places.append(models.RoutePlace(route=route, place_id=place_id, position=position))
+        elif route_place.position != position:
+            route_place.position = position
+            moved_route_places.append(route_place)
+
+    models.RoutePlace.objects.bulk_create(added_route_places)
+    models.RoutePlace.objects.bulk_update(moved_route_places, ['position'])
+
+
+def _get_free_position(route: models.Route, after_place_id: Optional[int],
+                       exclude_place_id: Optional[int] = None) -> int:
+    """
+    Получение свободной позиции между местом after_place_id и следующим за ним
+    :param route: маршрут
+    :param after_place_id: id места, после которого нужна позиция. None - в начало маршрута
+    :param exclude_place_id: id места, не учитываемого при поиске соседей (перемещаемое место)
+    :return: позиция
+    """
+    route_places = models.RoutePlace.objects.filter(route=route).exclude(place_id=exclude_place_id)
+
+    previous_position = None
+    if after_place_id is not None:
+        previous_position = route_places.values_list('position', flat=True).get(place_id=after_place_id)
+        route_places = route_places.filter(position__gt=previous_position)
+
+    next_position = route_places.order_by('position').values_list('position', flat=True).first()
+
+    if next_position is None:
+        return (previous_position or 0) + models.ROUTE_PLACE_POSITION_STEP
+    if previous_position is None:
+        return next_position - models.ROUTE_PLACE_POSITION_STEP
+    if next_position - previous_position > 1:
+        return (previous_position + next_position) // 2
+
+    _renumber_route_places(route)
+    return _get_free_position(route, after_place_id, exclude_place_id)
+
+
+def _renumber_route_places(route: models.Route) -> None:
+    """
+    Перенумерация мест маршрута с равным шагом
+    :param route: маршрут
+    :return: None
+    """
+    route_places = list(models.RoutePlace.objects.select_for_update().filter(route=route).order_by('position'))
+    for index, route_place in enumerate(route_places, start=1):
+        route_place.position = index * models.ROUTE_PLACE_POSITION_STEP
+
+    models.RoutePlace.objects.bulk_update(route_places, ['position'])
 
 
 def get_criteria_from_route(route: models.Route) -> dict:
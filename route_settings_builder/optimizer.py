@@ -0,0 +1,189 @@
+"""
+Оптимизация порядка мест маршрута.
+Маршрут - незамкнутый путь с фиксированной первой точкой: начальный порядок строится
+методом ближайшего соседа и улучшается перестановками 2-opt и Or-opt, пока они дают выигрыш
+и не исчерпан бюджет времени.
+"""
+import time
+from typing import List
+
+import numpy as np
+
+from route_settings_builder import geo
+
+
+DEFAULT_TIME_BUDGET = 0.5
+
+OR_OPT_SEGMENT_LENGTHS = (1, 2, 3, )
+
+_EPSILON = 1e-7
+
+
+def optimize_order(coordinates: np.ndarray, time_budget: float = DEFAULT_TIME_BUDGET) -> List[int]:
+    """
+    Получение порядка обхода точек
+    :param coordinates: массив (n, 2) координат (широта, долгота); первая точка - начало маршрута
+    :param time_budget: бюджет времени в секундах на улучшение порядка
+    :return: список индексов точек в порядке обхода
+    """
+    if len(coordinates) < 4:
+        return list(range(len(coordinates)))
+
+    deadline = time.monotonic() + time_budget
+    distances = geo.haversine_matrix(coordinates)
+    order = nearest_neighbour_order(distances)
+
+    while time.monotonic() < deadline:
+        improved = _two_opt_pass(order, distances, deadline)
+        improved = _or_opt_pass(order, distances, deadline) or improved
+        if not improved:
+            break
+
+    return order.tolist()
+
+
+def get_path_length(order, distances: np.ndarray) -> float:
+    """
+    Получение длины незамкнутого пути
+    :param order: порядок обхода
+    :param distances: матрица расстояний
+    :return: длина пути
+    """
+    order = np.asarray(order)
+    return float(distances[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbour_order(distances: np.ndarray) -> np.ndarray:
+    """
+    Построение порядка обхода методом ближайшего соседа, начиная с точки 0
+    :param distances: матрица расстояний
+    :return: порядок обхода
+    """
+    points_count = len(distances)
+    order = np.empty(points_count, dtype=np.intp)
+    visited = np.zeros(points_count, dtype=bool)
+
+    current = order[0] = 0
+    visited[0] = True
+    for index in range(1, points_count):
+        current = order[index] = np.argmin(np.where(visited, np.inf, distances[current]))
+        visited[current] = True
+
+    return order
+
+
+def _two_opt_pass(order: np.ndarray, distances: np.ndarray, deadline: float) -> bool:
+    """
+    Проход 2-opt: разворот участка order[i:j + 1], если он сокращает путь.
+    Для каждого i выбирается лучшее j, выигрыш считается векторно
+    :param order: порядок обхода, изменяется на месте
+    :param distances: матрица расстояний
+    :param deadline: момент окончания бюджета времени
+    :return: был ли улучшен путь
+    """
+    points_count = len(order)
+    improved = False
+
+    for i in range(1, points_count - 1):
+        previous_point, first_point = order[i - 1], order[i]
+        last_points = order[i + 1:]
+
+        gains = distances[previous_point, first_point] - distances[previous_point, last_points]
+        gains[:-1] += distances[last_points[:-1], order[i + 2:]] - distances[first_point, order[i + 2:]]
+
+        best = int(np.argmax(gains))
+        if gains[best] > _EPSILON:
+            j = i + 1 + best
+            order[i:j + 1] = order[i:j + 1][::-1].copy()
+            improved = True
+
+        if time.monotonic() >= deadline:
+            break
+
+    return improved
+
+
+def _or_opt_pass(order: np.ndarray, distances: np.ndarray, deadline: float) -> bool:
+    """
+    Проход Or-opt: перенос участка из 1-3 точек (в прямом или обратном порядке) в лучшее место пути
+    :param order: порядок обхода, изменяется на месте
+    :param distances: матрица расстояний
+    :param deadline: момент окончания бюджета времени
+    :return: был ли улучшен путь
+    """
+    points_count = len(order)
+    improved = False
+
+    for segment_length in OR_OPT_SEGMENT_LENGTHS:
+        i = 1
+        while i + segment_length <= points_count:
+            if time.monotonic() >= deadline:
+                return improved
+
+            if _move_best_segment(order, distances, i, segment_length):
+                improved = True
+            i += 1
+
+    return improved
+
+
+def _move_best_segment(order: np.ndarray, distances: np.ndarray, start: int, length: int) -> bool:
+    """
+    Перенос участка order[start:start + length] в место, дающее наибольший выигрыш
+    :param order: порядок обхода, изменяется на месте
+    :param distances: матрица расстояний
+    :param start: индекс начала участка
+    :param length: длина участка
+    :return: был ли перенесен участок
+    """
+    end = start + length
+    segment = order[start:end].copy()
+    rest = np.concatenate((order[:start], order[end:]))
+
+    forward_costs = _get_insertion_costs(rest, distances, segment[0], segment[-1])
+    backward_costs = _get_insertion_costs(rest, distances, segment[-1], segment[0])
+
+    best_forward, best_backward = int(np.argmin(forward_costs)), int(np.argmin(backward_costs))
+    if forward_costs[best_forward] <= backward_costs[best_backward]:
+        position, cost = best_forward, forward_costs[best_forward]
+    else:
+        position, cost, segment = best_backward, backward_costs[best_backward], segment[::-1]
+
+    if _get_removal_gain(order, distances, start, end) - cost <= _EPSILON:
+        return False
+
+    order[:] = np.concatenate((rest[:position + 1], segment, rest[position + 1:]))
+    return True
+
+
+def _get_removal_gain(order: np.ndarray, distances: np.ndarray, start: int, end: int) -> float:
+    """
+    Получение сокращения пути при удалении участка order[start:end]
+    :param order: порядок обхода
+    :param distances: матрица расстояний
+    :param start: индекс начала участка
+    :param end: индекс точки после участка
+    :return: сокращение длины пути
+    """
+    previous_point, first_point, last_point = order[start - 1], order[start], order[end - 1]
+
+    removal_gain = distances[previous_point, first_point]
+    if end < len(order):
+        next_point = order[end]
+        removal_gain += distances[last_point, next_point] - distances[previous_point, next_point]
+
+    return removal_gain
+
+
+def _get_insertion_costs(rest: np.ndarray, distances: np.ndarray, first_point: int, last_point: int) -> np.ndarray:
+    """
+    Получение удлинения пути при вставке участка между rest[k] и rest[k + 1], последний вариант - в конец пути
+    :param rest: порядок обхода без участка
+    :param distances: матрица расстояний
+    :param first_point: первая точка участка в порядке вставки
+    :param last_point: последняя точка участка в порядке вставки
+    :return: массив удлинений пути по местам вставки
+    """
+    left, right = rest[:-1], rest[1:]
+    return np.append(distances[left, first_point] + distances[last_point, right] - distances[left, right],
+                     distances[rest[-1], first_point])
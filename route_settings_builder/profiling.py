@@ -0,0 +1,157 @@
+"""
+Профилирование отдельных запросов по требованию сотрудника.
+Запрос с заголовком X-Profile или параметром ?profile=1 от пользователя is_staff (сессия или API-ключ)
+выполняется под cProfile, запросы к БД записываются. Профиль сохраняется в RequestProfile,
+его id возвращается в заголовке X-Profile-Id. Без заголовка и параметра запрос выполняется без изменений.
+"""
+from contextlib import ExitStack
+from typing import Optional
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AbstractUser
+from ninja_apikey.security import check_apikey
+
+from route_settings_builder import models, slow_queries
+
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# Количество функций в текстовой статистике профиля
+PROFILE_STATS_LIMIT = 50
+
+# Количество хранимых профилей
+PROFILES_LIMIT = 200
+
+_false_values = ('', '0', 'false', 'no', 'off')
+
+
+def is_requested(request) -> bool:
+    """
+    Проверка запроса профилирования
+    :param request: HTTP-запрос
+    :return: профилирование запрошено
+    """
+    if (flag := request.headers.get(PROFILE_HEADER)) is None:
+        if PROFILE_QUERY_PARAM not in request.META.get('QUERY_STRING', ''):
+            return False
+        flag = request.GET.get(PROFILE_QUERY_PARAM)
+    return flag is not None and flag.strip().lower() not in _false_values
+
+
+def get_staff_user(request) -> Optional[AbstractUser]:
+    """
+    Получение сотрудника, запросившего профилирование: по сессии или по API-ключу
+    :param request: HTTP-запрос
+    :return: пользователь или None, если пользователь не сотрудник
+    """
+    user = request.user
+    if not user.is_authenticated:
+        user = check_apikey(request.headers.get('X-API-Key'))
+    return user if user and user.is_staff else None
+
+
+def profile_request(request, get_response, user):
+    """
+    Выполнение запроса под профилировщиком с журналом запросов к БД и сохранение профиля
+    :param request: HTTP-запрос
+    :param get_response: обработка запроса
+    :param user: сотрудник, запросивший профилирование
+    :return: HTTP-ответ
+    """
+    run = {'profilers': [], 'queries': [], 'started_at': time.perf_counter()}
+    with _start_profile(run):
+        response = get_response(request)
+    return _save_profile(request, response, user, run)
+
+
+async def aprofile_request(request, get_response, user):
+    """
+    Асинхронное выполнение запроса под профилировщиком с журналом запросов к БД и сохранение профиля.
+    Профилируются поток цикла событий и поток sync_to_async запроса, в котором выполняются обращения к БД.
+    Профиль потока цикла событий может содержать сопрограммы параллельных запросов
+    :param request: HTTP-запрос
+    :param get_response: асинхронная обработка запроса
+    :param user: сотрудник, запросивший профилирование
+    :return: HTTP-ответ
+    """
+    run = {'profilers': [], 'queries': [], 'started_at': time.perf_counter()}
+    sync_stack = await sync_to_async(_start_profile)(run)
+    try:
+        with _start_profile(run):
+            response = await get_response(request)
+    finally:
+        await sync_to_async(sync_stack.close)()
+    return await sync_to_async(_save_profile)(request, response, user, run)
+
+
+def _start_profile(run: dict) -> ExitStack:
+    """
+    Включение профилировщика и журнала запросов к БД в текущем потоке
+    :param run: профилируемое выполнение: профилировщики потоков, журнал запросов к БД и время начала
+    :return: стек, при закрытии которого профилирование и журнал выключаются
+    """
+    def record_query(execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            run['queries'].append({'database': context['connection'].alias, 'sql': sql,
+                                   'duration': round((time.perf_counter() - started_at) * 1000, 3)})
+
+    profiler = cProfile.Profile()
+    run['profilers'].append(profiler)
+    stack = slow_queries.wrap_connections(record_query)
+    profiler.enable()
+    stack.callback(profiler.disable)
+    return stack
+
+
+def _save_profile(request, response, user, run: dict):
+    """
+    Сохранение профиля запроса
+    :param request: HTTP-запрос
+    :param response: HTTP-ответ
+    :param user: сотрудник, запросивший профилирование
+    :param run: профилируемое выполнение: профилировщики потоков, журнал запросов к БД и время начала
+    :return: HTTP-ответ с id профиля в заголовке
+    """
+    duration = (time.perf_counter() - run['started_at']) * 1000
+    queries = run['queries']
+
+    stats_text = io.StringIO()
+    stats = pstats.Stats(*run['profilers'], stream=stats_text)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_STATS_LIMIT)
+
+    request_profile = models.RequestProfile.objects.create(
+        operation=slow_queries.get_request_operation(request),
+        path=request.get_full_path(),
+        status_code=response.status_code,
+        duration=round(duration, 3),
+        queries_count=len(queries),
+        queries_duration=round(sum(query['duration'] for query in queries), 3),
+        queries=queries,
+        stats=stats_text.getvalue(),
+        profile=marshal.dumps(stats.stats),
+        user=user,
+    )
+    _delete_old_profiles()
+
+    response.headers[PROFILE_ID_HEADER] = str(request_profile.id)
+    return response
+
+
+def _delete_old_profiles() -> None:
+    """
+    Удаление профилей сверх PROFILES_LIMIT последних
+    :return: None
+    """
+    profiles_ids = models.RequestProfile.objects.order_by('-id').values_list('id', flat=True)
+    if newest_deleted_id := next(iter(profiles_ids[PROFILES_LIMIT:PROFILES_LIMIT + 1]), None):
+        models.RequestProfile.objects.filter(id__lte=newest_deleted_id).delete()
@@ -1,13 +1,78 @@
+from typing import Iterable
+
 from django.db import models
+from django.db.models.functions import Cast
+
+
+PLACE_LIST_COLUMNS = ('id', 'name', 'latitude', 'longitude', )
+
+
+class PlaceQuerySet(models.QuerySet):
+    """ QuerySet к модели Place """
+    def select_fields(self, fields: Iterable[str]):
+        """
+        Ограничение выборки запрошенными полями ответа
+        :param fields: наименования полей схемы ответа
+        :return: QuerySet
+        """
+        fields = set(fields)
+        queryset = self.only(*(fields & set(PLACE_LIST_COLUMNS)))
+
+        if 'criteria' in fields:
+            criteria_through = self.model.criteria.through
+            queryset = queryset.prefetch_related(
+                models.Prefetch('placecriterion_set', queryset=criteria_through.objects.select_related('criterion')))
+
+        return queryset
+
+    def values_rows(self, fields: Iterable[str]):
+        """
+        Получение строк перечня мест в виде кортежей значений без создания моделей
+        :param fields: наименования полей схемы ответа
+        :return: QuerySet кортежей в порядке fields
+        """
+        return self.values_list(*(Cast(field_name, models.FloatField())
+                                  if field_name in ('latitude', 'longitude', ) else field_name
+                                  for field_name in fields))
 
 
 class RouteQuerySet(models.QuerySet):
     """ QuerySet к модели Route """
-    def add_is_draft_field(self):
+    def select_fields(self, fields: Iterable[str]):
         """
-        Добавление поля is_draft в запрос
+        Ограничение выборки запрошенными полями ответа
+        :param fields: наименования полей схемы ответа
         :return: QuerySet
         """
-        return self.annotate(is_draft=models.Case(models.When(details=None, then=True),
-                                                  models.When(details={}, then=True),
-                                                  default=False))
+        fields = set(fields)
+        # версия нужна для заголовка ETag независимо от запрошенных полей
+        columns = fields & {'uuid', 'updated_at', 'name', 'is_draft', 'places_count', 'places_bbox', 'criteria_map', }
+        columns.add('version')
+
+        if 'details' in fields:
+            # детализация хранится сжатой в отдельной таблице и читается только по запросу;
+            # для распаковки достаточно основного варианта сжатия, вариант brotli не читается
+            columns |= {'details_digest', 'stored_details__encoding', 'stored_details__payload', }
+            queryset = self.select_related('stored_details').only(*columns)
+        else:
+            queryset = self.only(*columns)
+
+        if 'places' in fields:
+            places_model = self.model.places.rel.model
+            queryset = queryset.prefetch_related(
+                models.Prefetch('places', queryset=places_model.objects.only(*PLACE_LIST_COLUMNS)
+                                .order_by('routeplace__position')))
+        if 'criteria' in fields:
+            criteria_through = self.model.criteria.through
+            queryset = queryset.prefetch_related(
+                models.Prefetch('routecriterion_set', queryset=criteria_through.objects.select_related('criterion')))
+
+        return queryset
+
+    def values_rows(self, fields: Iterable[str]):
+        """
+        Получение строк перечня маршрутов в виде кортежей значений без создания моделей
+        :param fields: наименования полей схемы ответа
+        :return: QuerySet кортежей в порядке fields
+        """
+        return self.values_list(*fields)
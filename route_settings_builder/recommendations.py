@@ -0,0 +1,120 @@
+"""
+Подбор мест по критериям маршрута.
+Критерии мест хранятся в снимке - разреженной матрице место×признак в координатном виде:
+строка снимка - пара (id места, признак), где признак - хеш пары (критерий, нормализованное значение).
+Оценка места - доля критериев маршрута, значения которых совпадают со значениями критериев места.
+"""
+from hashlib import blake2b
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from route_settings_builder import models, distances, snapshots
+
+
+SNAPSHOT_FILE_NAME = 'place_criteria.npy'
+
+SNAPSHOT_DTYPE = np.dtype([('place_id', np.int64), ('feature', np.int64)])
+
+DEFAULT_LIMIT = 10
+
+# Отступ в градусах вокруг границ мест маршрута при подборе рядом с маршрутом
+ROUTE_BBOX_MARGIN = 0.05
+
+
+def normalize_value(value_type: str, value: str) -> str:
+    """
+    Нормализация значения критерия для сравнения
+    :param value_type: тип значения
+    :param value: значение
+    :return: нормализованное значение
+    """
+    if value_type == 'numeric':
+        return repr(float(value))
+    if value_type == 'boolean':
+        return 'true' if value in ('1', 'true') else 'false'
+
+    return value.strip().casefold()
+
+
+def get_feature(criterion_id: int, value_type: str, value: str) -> int:
+    """
+    Получение признака - хеша пары (критерий, нормализованное значение)
+    :param criterion_id: id критерия
+    :param value_type: тип значения
+    :param value: значение
+    :return: признак
+    """
+    digest = blake2b(f'{criterion_id}:{normalize_value(value_type, value)}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+class PlaceCriteriaMatrix(snapshots.Snapshot):
+    """ Разреженная матрица признаков мест """
+    file_name = SNAPSHOT_FILE_NAME
+
+    def collect(self) -> np.ndarray:
+        """
+        Сбор признаков мест
+        :return: структурированный массив SNAPSHOT_DTYPE, отсортированный по id места
+        """
+        rows = (models.PlaceCriterion.objects
+                .order_by('place_id', 'criterion_id')
+                .values_list('place_id', 'criterion_id', 'criterion__value_type', 'value'))
+        return np.fromiter(((place_id, get_feature(criterion_id, value_type, value))
+                            for place_id, criterion_id, value_type, value in rows.iterator()),
+                           dtype=SNAPSHOT_DTYPE)
+
+    def score(self, features: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Подсчет совпавших признаков по местам
+        :param features: признаки
+        :return: id мест, имеющих хотя бы один признак, и количество совпавших признаков
+        """
+        snapshot = self.get_snapshot()
+        matched = np.isin(snapshot['feature'], np.fromiter(features, dtype=np.int64))
+        return np.unique(snapshot['place_id'][matched], return_counts=True)
+
+
+place_criteria = PlaceCriteriaMatrix()
+
+
+def suggest_places(route: models.Route, limit: int = DEFAULT_LIMIT,
+                   near_route: bool = False) -> List[Tuple[models.Place, float]]:
+    """
+    Подбор мест, подходящих по критериям маршрута. Места маршрута не предлагаются
+    :param route: маршрут
+    :param limit: количество мест
+    :param near_route: ограничить подбор границами мест маршрута
+    :return: список пар (место, оценка от 0 до 1) по убыванию оценки
+    """
+    route_criteria = (models.RouteCriterion.objects
+                      .filter(route=route)
+                      .values_list('criterion_id', 'criterion__value_type', 'value'))
+    features = [get_feature(criterion_id, value_type, value) for criterion_id, value_type, value in route_criteria]
+    if not features or limit <= 0:
+        return []
+
+    place_ids, matches = place_criteria.score(features)
+
+    route_place_ids = np.fromiter(models.RoutePlace.objects.filter(route=route).values_list('place_id', flat=True),
+                                  dtype=np.int64)
+    is_candidate = ~np.isin(place_ids, route_place_ids)
+
+    if near_route and len(route_place_ids) and is_candidate.any():
+        route_coordinates = distances.place_distances.get_coordinates(route_place_ids)
+        coordinates = distances.place_distances.get_coordinates(place_ids[is_candidate])
+        is_inside = np.all((coordinates >= route_coordinates.min(axis=0) - ROUTE_BBOX_MARGIN)
+                           & (coordinates <= route_coordinates.max(axis=0) + ROUTE_BBOX_MARGIN), axis=1)
+        is_candidate[is_candidate] = is_inside
+
+    place_ids, matches = place_ids[is_candidate], matches[is_candidate]
+    if len(place_ids) > limit:
+        top = np.argpartition(-matches, limit - 1)[:limit]
+        place_ids, matches = place_ids[top], matches[top]
+
+    order = np.lexsort((place_ids, -matches))
+    places = models.Place.objects.in_bulk(place_ids.tolist())
+    return [(places[place_id], matches_count / len(features))
+            for place_id, matches_count in zip(place_ids[order].tolist(), matches[order].tolist())
+            if place_id in places]
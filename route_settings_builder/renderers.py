@@ -0,0 +1,65 @@
+from functools import wraps
+from typing import Any, Type
+
+import orjson
+from django.http import HttpResponse
+from ninja import Schema
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+_fallback_encoder = NinjaJSONEncoder()
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Сериализация данных в JSON. Массивы numpy сериализуются напрямую.
+    Даты и неизвестные orjson типы (Decimal и т.д.) кодируются так же, как NinjaJSONEncoder
+    :param data: данные
+    :return: JSON
+    """
+    return orjson.dumps(data, default=_fallback_encoder.default,
+                        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class ORJSONRenderer(BaseRenderer):  # pylint: disable=too-few-public-methods
+    """ Рендерер JSON-ответов на базе orjson """
+    media_type = 'application/json'
+
+    def render(self, request, data: Any, *, response_status: int) -> bytes:
+        return dumps(data)
+
+
+def json_response(data: Any, status: int = 200) -> HttpResponse:
+    """
+    Получение JSON-ответа
+    :param data: данные
+    :param status: код ответа
+    :return: ответ
+    """
+    return HttpResponse(dumps(data), status=status, content_type=JSON_CONTENT_TYPE)
+
+
+def render_rows(schema: Type[Schema]):
+    """
+    Декоратор быстрой сериализации пагинированного перечня.
+    Представление возвращает values_list с полями из параметра fieldset в порядке схемы,
+    строки собираются в ответ без создания моделей и валидации схемой.
+    Схема используется только для документации ответа.
+    :param schema: схема элемента перечня
+    :return: декоратор
+    """
+    def decorator(func):
+        @wraps(func)
+        def view(request, *args, **kwargs):
+            result = func(request, *args, **kwargs)
+
+            fields = kwargs['fieldset'].select(schema)
+            return json_response({'items': [dict(zip(fields, row)) for row in result['items']],
+                                  'count': result['count']})
+
+        return view
+
+    return decorator
@@ -0,0 +1,110 @@
+"""
+Маршрутизация запросов к БД: чтения распределяются по репликам, записи выполняются на основной БД.
+Чтобы пользователь видел свои изменения, после записи чтения выполняются на основной БД:
+до конца текущего запроса и, для пользователя, в течение DATABASE_PRIMARY_STICKINESS секунд.
+Привязка пользователя хранится в общем для процессов кеше в таблице основной БД (DatabaseCache),
+поэтому запросы к кешу всегда выполняются на основной БД.
+"""
+from contextvars import ContextVar
+from typing import Optional
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+PRIMARY_PIN_CACHE_PREFIX = 'db-primary-pin:'
+
+# Приложение модели таблицы кеша DatabaseCache
+CACHE_APP_LABEL = 'django_cache'
+
+_primary_pinned = ContextVar('primary_pinned', default=False)
+
+
+def get_replicas() -> list:
+    """
+    Получение псевдонимов реплик
+    :return: список псевдонимов подключений
+    """
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def reset() -> None:
+    """
+    Сброс привязки к основной БД в начале запроса
+    :return: None
+    """
+    _primary_pinned.set(False)
+
+
+def pin_primary(user_id: Optional[int] = None) -> None:
+    """
+    Привязка чтений к основной БД: для текущего запроса и, если указан пользователь и есть реплики,
+    для его следующих запросов
+    :param user_id: id пользователя
+    :return: None
+    """
+    _primary_pinned.set(True)
+    if user_id is not None and settings.DATABASE_PRIMARY_STICKINESS > 0 and get_replicas():
+        cache.set(f'{PRIMARY_PIN_CACHE_PREFIX}{user_id}', True, timeout=settings.DATABASE_PRIMARY_STICKINESS)
+
+
+def use_primary_if_pinned(user_id: int) -> None:
+    """
+    Привязка чтений текущего запроса к основной БД, если пользователь недавно изменял данные
+    :param user_id: id пользователя
+    :return: None
+    """
+    if get_replicas() and cache.get(f'{PRIMARY_PIN_CACHE_PREFIX}{user_id}'):
+        _primary_pinned.set(True)
+
+
+def _is_cache_model(model) -> bool:
+    """
+    Проверка, что модель - таблица кеша DatabaseCache
+    :param model: модель
+    :return: модель кеша
+    """
+    return model._meta.app_label == CACHE_APP_LABEL  # pylint: disable=protected-access
+
+
+class ReplicaRouter:
+    """ Маршрутизатор запросов к основной БД и репликам """
+    def db_for_read(self, model, **_hints) -> str:
+        """
+        Выбор БД для чтения: реплика, если чтения не привязаны к основной БД
+        :param model: модель
+        :return: псевдоним подключения
+        """
+        replicas = get_replicas()
+        if (not replicas or _primary_pinned.get() or _is_cache_model(model)
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **_hints) -> str:
+        """
+        Выбор БД для записи: основная БД. Следующие чтения запроса привязываются к основной БД
+        :param model: модель
+        :return: псевдоним подключения
+        """
+        if not _is_cache_model(model):
+            _primary_pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, *_args, **_hints) -> bool:
+        """
+        Связи разрешены: реплики содержат те же данные, что и основная БД
+        :return: True
+        """
+        return True
+
+    def allow_migrate(self, database: str, *_args, **_hints) -> bool:
+        """
+        Миграции выполняются только на основной БД
+        :param database: псевдоним подключения
+        :return: миграция разрешена
+        """
+        return database == DEFAULT_DB_ALIAS
@@ -1,5 +1,6 @@
 # pylint: disable=too-few-public-methods,missing-class-docstring
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+import uuid
 
 from ninja import Schema, ModelSchema, Field
 
@@ -16,6 +17,19 @@ class PlaceSchema(ModelSchema):
         model_fields = ('id', 'name', 'longitude', 'latitude', )
 
 
+class SuggestedPlaceSchema(PlaceSchema):
+    """ Схема места, подобранного по критериям маршрута """
+    score: float
+
+
+class PlaceClusterSchema(Schema):
+    """ Схема кластера мест: количество, центр и границы мест (запад, юг, восток, север) """
+    count: int
+    latitude: float
+    longitude: float
+    bbox: Tuple[float, float, float, float]
+
+
 class CriterionSchema(ModelSchema):
     """ Схема к сущности критерия """
     class Config:
@@ -39,8 +53,11 @@ class DetailedPlaceSchema(PlaceSchema):
 
 
 class ListRouteSchema(ModelSchema):
-    """ Схема сущности маршрута для перечня """
+    """ Схема сущности маршрута для перечня со сводкой: количество мест, границы мест и значения критериев """
     is_draft: bool
+    places_count: int
+    places_bbox: Optional[Tuple[float, float, float, float]]
+    criteria_map: Dict[str, str]
 
     class Config:
         model = models.Route
@@ -48,14 +65,15 @@ class ListRouteSchema(ModelSchema):
 
 
 class DetailedRouteSchema(ListRouteSchema):
-    """ Схема детализации сущности маршрута """
+    """ Схема детализации сущности маршрута. version совпадает с ETag маршрута """
+    version: int
     criteria: List[NestedCriterionSchema] = Field([], alias='routecriterion_set')
     details: Optional[dict]
     places: List[PlaceSchema]
 
     class Config:
         model = models.Route
-        model_fields = ('uuid', 'updated_at', 'name', 'details', 'places', )
+        model_fields = ('uuid', 'updated_at', 'name', 'places', )
 
 
 class NestedSaveRouteCriterionSchema(Schema):
@@ -73,3 +91,68 @@ class UpdateRouteSchema(Schema):
 class CreateRouteSchema(UpdateRouteSchema):
     name: str
     places: List[int]
+
+
+class CloneRouteSchema(Schema):
+    """ Параметры копирования маршрута. details - копировать результат строительства """
+    name: Optional[str]
+    details: bool = False
+
+
+class BatchRoutesSchema(Schema):
+    uuids: List[uuid.UUID] = Field(..., min_items=1, max_items=1000)
+
+
+class BatchUpdateRoutesSchema(BatchRoutesSchema):
+    """ Изменение маршрутов: переименование, описание путеводителя, значения критериев (добавляются или заменяются) """
+    name: Optional[str]
+    guide_description: Optional[str]
+    criteria: Optional[List[NestedSaveRouteCriterionSchema]]
+
+
+class BatchRouteResultSchema(Schema):
+    """ Результат операции над маршрутом: deleted, updated или not_found """
+    uuid: uuid.UUID
+    status: str
+    version: Optional[int]
+
+
+class PlaceDistancesRequestSchema(Schema):
+    place_ids: List[int] = Field(..., max_items=1000)
+    other_place_ids: Optional[List[int]] = Field(None, max_items=1000)
+
+
+class PlaceDistancesSchema(Schema):
+    """ Матрица расстояний между местами в метрах """
+    distances: List[List[float]]
+
+
+class MoveRoutePlaceSchema(Schema):
+    after_place_id: Optional[int]
+
+
+class InsertRoutePlaceSchema(MoveRoutePlaceSchema):
+    place_id: int
+
+
+class TypeaheadPlaceSchema(Schema):
+    id: int
+    name: str
+
+
+class TypeaheadRouteSchema(Schema):
+    uuid: uuid.UUID
+    name: str
+
+
+class TypeaheadCriterionSchema(Schema):
+    id: int
+    name: str
+    internal_name: str
+
+
+class TypeaheadSchema(Schema):
+    """ Подсказки при вводе по местам, маршрутам пользователя и критериям """
+    places: List[TypeaheadPlaceSchema]
+    routes: List[TypeaheadRouteSchema]
+    criteria: List[TypeaheadCriterionSchema]
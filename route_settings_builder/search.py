@@ -0,0 +1,88 @@
+"""
+Полнотекстовый поиск по наименованиям с русской морфологией.
+Поиск выполняется по выражению to_tsvector, для которого у моделей объявлены GIN-индексы
+(см. SEARCH_FIELDS), поэтому выражения запросов и индексов должны совпадать.
+"""
+from typing import List, Optional, Tuple
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import QuerySet
+
+
+SEARCH_CONFIG = 'russian'
+
+# Поля поиска по моделям: {наименование модели: поля}
+SEARCH_FIELDS = {
+    'Place': ('name', ),
+    'Route': ('name', ),
+    'Criterion': ('name', 'internal_name', ),
+}
+
+TYPEAHEAD_LIMIT = 5
+
+_word_re = re.compile(r'\w+')
+
+
+def get_search_vector(model_name: str) -> SearchVector:
+    """
+    Получение поискового выражения модели
+    :param model_name: наименование модели
+    :return: выражение to_tsvector
+    """
+    return SearchVector(*SEARCH_FIELDS[model_name], config=SEARCH_CONFIG)
+
+
+def get_prefix_query(text: str) -> Optional[SearchQuery]:
+    """
+    Получение запроса по началам слов для подсказок при вводе
+    :param text: введенный текст
+    :return: запрос или None, если в тексте нет слов
+    """
+    if not (words := _word_re.findall(text)):
+        return None
+
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+def apply(queryset: QuerySet, text: Optional[str]) -> QuerySet:
+    """
+    Поиск по тексту запроса (синтаксис websearch_to_tsquery). Без текста QuerySet не изменяется
+    :param queryset: QuerySet
+    :param text: текст запроса
+    :return: QuerySet
+    """
+    if not text or not text.strip():
+        return queryset
+
+    return search(queryset, SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch'))
+
+
+def search(queryset: QuerySet, query: SearchQuery) -> QuerySet:
+    """
+    Поиск с сортировкой по релевантности
+    :param queryset: QuerySet
+    :param query: поисковый запрос
+    :return: QuerySet
+    """
+    vector = get_search_vector(queryset.model.__name__)
+    return (queryset
+            .alias(search_vector=vector)
+            .annotate(search_rank=SearchRank(vector, query))
+            .filter(search_vector=query)
+            .order_by('-search_rank', 'pk'))
+
+
+def typeahead(queryset: QuerySet, text: str, fields: Tuple[str, ...], limit: int = TYPEAHEAD_LIMIT) -> List[dict]:
+    """
+    Подсказки при вводе: поиск по началам слов
+    :param queryset: QuerySet
+    :param text: введенный текст
+    :param fields: поля подсказки
+    :param limit: количество подсказок
+    :return: список словарей полей
+    """
+    if (query := get_prefix_query(text)) is None:
+        return []
+
+    return list(search(queryset, query).values(*fields)[:limit])
@@ -0,0 +1,72 @@
+"""
+Строительство длинных маршрутов сегментами.
+Упорядоченные координаты делятся на сегменты, соседние сегменты имеют общую точку (SEGMENT_OVERLAP),
+поэтому маршрут не разрывается на стыках. Сегменты строятся параллельно, время строительства
+зависит от размера сегмента, а не от длины маршрута. Детализации сегментов объединяются в одну.
+"""
+from typing import Any, List, Optional, Sequence
+
+
+SEGMENT_OVERLAP = 1
+
+
+def split_points(points: Sequence, size: int) -> List[list]:
+    """
+    Деление координат на сегменты с общими точками на стыках
+    :param points: координаты в порядке следования
+    :param size: наибольшее количество точек сегмента. Меньше 2 - без деления
+    :return: список сегментов
+    """
+    points = list(points)
+    if size <= SEGMENT_OVERLAP or len(points) <= size:
+        return [points]
+
+    step = size - SEGMENT_OVERLAP
+    return [points[start:start + size] for start in range(0, len(points) - SEGMENT_OVERLAP, step)]
+
+
+def merge_details(segments_details: Sequence[Optional[dict]]) -> Optional[dict]:
+    """
+    Объединение детализаций сегментов в порядке следования: числа складываются, списки и строки
+    (фрагменты HTML) соединяются, словари объединяются по ключам, логические значения - по "и"
+    :param segments_details: детализации сегментов
+    :return: детализация маршрута или None, если хотя бы один сегмент не построен
+    """
+    if not all(segments_details):
+        return None
+
+    merged = {}
+    for details in segments_details:
+        merged = _merge_dicts(merged, details)
+    return merged
+
+
+def _merge_dicts(details: dict, other_details: dict) -> dict:
+    """
+    Объединение словарей детализации соседних сегментов по ключам
+    :param details: словарь предыдущих сегментов
+    :param other_details: словарь следующего сегмента
+    :return: словарь
+    """
+    merged = dict(details)
+    for key, value in other_details.items():
+        merged[key] = _merge_values(merged[key], value) if key in merged else value
+    return merged
+
+
+def _merge_values(value: Any, other_value: Any) -> Any:
+    """
+    Объединение значений детализации соседних сегментов
+    :param value: значение предыдущих сегментов
+    :param other_value: значение следующего сегмента
+    :return: значение; при несовпадении типов - значение следующего сегмента
+    """
+    if isinstance(value, bool) or isinstance(other_value, bool):
+        return value and other_value if type(value) is type(other_value) else other_value
+    if isinstance(value, (int, float)) and isinstance(other_value, (int, float)):
+        return value + other_value
+    if isinstance(value, (list, str)) and type(value) is type(other_value):
+        return value + other_value
+    if isinstance(value, dict) and isinstance(other_value, dict):
+        return _merge_dicts(value, other_value)
+    return other_value
@@ -8,5 +8,48 @@ DATABASES = {
         'PASSWORD': env.str('POSTGRES_PASSWORD'),
         'HOST': env.str('POSTGRES_DB_HOST'),
         'PORT': env.int('POSTGRES_DB_PORT'),
+        # Подключение через PgBouncer в режиме пула транзакций: серверные курсоры не переживают смену подключения
+        'DISABLE_SERVER_SIDE_CURSORS': env.bool('POSTGRES_PGBOUNCER', default=False),
     }
 }
+
+# Общий для процесса пул подключений (ASGI): подключения не открываются на каждый запрос,
+# а их количество ограничено POSTGRES_POOL_MAX_SIZE. Статистика пулов процесса - GET /api/v1/health/db-pools
+if env.bool('POSTGRES_POOL', default=False):
+    DATABASES['default'].update({
+        'ENGINE': 'route_settings_builder.db_pool',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'pool': {
+                'min_size': env.int('POSTGRES_POOL_MIN_SIZE', default=1),
+                'max_size': env.int('POSTGRES_POOL_MAX_SIZE', default=10),
+                'timeout': env.float('POSTGRES_POOL_TIMEOUT', default=30),
+                'health_check_interval': env.float('POSTGRES_POOL_HEALTH_CHECK_INTERVAL', default=30),
+                'max_idle': env.float('POSTGRES_POOL_MAX_IDLE', default=600),
+            },
+        },
+    })
+
+# Реплики для чтения: список вида host[:port] через запятую
+for replica_index, replica_address in enumerate(env.list('POSTGRES_REPLICA_HOSTS', default=[])):
+    replica_host, _, replica_port = replica_address.strip().partition(':')
+    DATABASES[f'replica_{replica_index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': int(replica_port) if replica_port else DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['route_settings_builder.routers.ReplicaRouter']
+
+# Общий для процессов сервиса кеш в таблице основной БД (создается командой createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': env.str('CACHE_TABLE', default='route_settings_builder_cache'),
+    }
+}
+
+# Время в секундах, в течение которого чтения пользователя после его записи выполняются на основной БД.
+# Привязка хранится в общем кеше (CACHES), поэтому действует во всех процессах сервиса
+DATABASE_PRIMARY_STICKINESS = env.int('DATABASE_PRIMARY_STICKINESS', default=5)
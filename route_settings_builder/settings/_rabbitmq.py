@@ -11,3 +11,18 @@ RMQ_QUEUE = env.str('RMQ_QUEUE')
 RMQ_URL_QUERY_PARAMS = env.str('RMQ_URL_QUERY_PARAMS', default='')
 
 RMQ_URL = f"amqp://{RMQ_USER}:{RMQ_PASSWORD}@{RMQ_HOST}:{RMQ_PORT}/?{RMQ_URL_QUERY_PARAMS}"
+
+# Обратное давление: при глубине очереди строительства не меньше RMQ_QUEUE_MAX_DEPTH (0 - без ограничения)
+# запросы на строительство отклоняются с 503 и Retry-After. Глубина кешируется в процессе на RMQ_QUEUE_DEPTH_TTL сек.
+RMQ_QUEUE_MAX_DEPTH = env.int('RMQ_QUEUE_MAX_DEPTH', default=1000)
+RMQ_QUEUE_DEPTH_TTL = env.float('RMQ_QUEUE_DEPTH_TTL', default=5)
+RMQ_QUEUE_RETRY_AFTER = env.int('RMQ_QUEUE_RETRY_AFTER', default=30)
+
+# Ограничение частоты строительства маршрутов автора (token bucket): запас запросов и пополнение в минуту.
+# BUILD_RATE_LIMIT_PER_MINUTE = 0 - без ограничения
+BUILD_RATE_LIMIT_BURST = env.int('BUILD_RATE_LIMIT_BURST', default=10)
+BUILD_RATE_LIMIT_PER_MINUTE = env.float('BUILD_RATE_LIMIT_PER_MINUTE', default=6)
+
+# Строительство длинных маршрутов сегментами: координаты делятся на сегменты по BUILD_SEGMENT_SIZE точек
+# с общей точкой на стыке, сегменты строятся параллельно. 0 - маршрут строится одним запросом
+BUILD_SEGMENT_SIZE = env.int('BUILD_SEGMENT_SIZE', default=0)
@@ -0,0 +1,28 @@
+"""
+Настройки процессов, обслуживающих только API (DJANGO_SETTINGS_MODULE=route_settings_builder.settings.api):
+без администраторской панели, ckeditor, сообщений и статики, которые не нужны API и замедляют запуск
+"""
+# pylint: disable=wildcard-import,unused-wildcard-import
+from .main import *
+
+ADMIN_APPS = (
+    'django_light',
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'ckeditor',
+)
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ADMIN_APPS]
+
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE
+              if middleware != 'django.contrib.messages.middleware.MessageMiddleware']
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'context_processors': [context_processor for context_processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                               if context_processor != 'django.contrib.messages.context_processors.messages'],
+    },
+}]
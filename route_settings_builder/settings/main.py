@@ -1,5 +1,6 @@
 from pathlib import Path
 from dotenv import load_dotenv
+from envparse import env
 
 from split_settings.tools import include
 
@@ -13,6 +14,16 @@ include(
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Каталог снимков данных, разделяемых процессами сервиса (координаты мест и т.д.)
+SNAPSHOTS_DIR = env.str('SNAPSHOTS_DIR', default=str(BASE_DIR.parent / 'snapshots'))
+
+# Журнал медленных запросов к БД (см. slow_queries): порог в мс, доля случайно записываемых запросов,
+# построение плана EXPLAIN (ANALYZE, BUFFERS) и файл журнала с ротацией
+SLOW_QUERY_THRESHOLD_MS = env.float('SLOW_QUERY_THRESHOLD_MS', default=200)
+SLOW_QUERY_SAMPLE_RATE = env.float('SLOW_QUERY_SAMPLE_RATE', default=0)
+SLOW_QUERY_EXPLAIN = env.bool('SLOW_QUERY_EXPLAIN', default=False)
+SLOW_QUERY_LOG_FILE = env.str('SLOW_QUERY_LOG_FILE', default=str(BASE_DIR.parent / 'slow_queries.log'))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
@@ -49,10 +60,14 @@ INSTALLED_APPS = REQUIRED_APPS + PROJECT_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'route_settings_builder.middleware.SlowQueryMiddleware',
+    'route_settings_builder.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'route_settings_builder.middleware.DatabaseRoutingMiddleware',
+    'route_settings_builder.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -132,12 +147,29 @@ LOGGING = {
             'level': 'DEBUG',
             'filters': ['require_debug_true'],
             'class': 'logging.StreamHandler',
-        }
+        },
+        'slow_queries': {
+            'level': 'INFO',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
     },
     'loggers': {
         'django.db.backends': {
             'level': 'DEBUG',
             'handlers': ['console'],
-        }
+        },
+        'route_settings_builder.db_pool': {
+            'level': 'WARNING',
+            'handlers': ['console'],
+        },
+        'route_settings_builder.slow_queries': {
+            'level': 'INFO',
+            'handlers': ['slow_queries'],
+            'propagate': False,
+        },
     }
 }
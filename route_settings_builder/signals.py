@@ -0,0 +1,106 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from route_settings_builder import models, models_utils
+
+
+@receiver(pre_save, sender=models.Place)
+def on_place_saving(instance: models.Place, **_kwargs) -> None:
+    """
+    Запоминание прежних координат места перед сохранением
+    :param instance: место
+    :return: None
+    """
+    instance.previous_coordinates = (models.Place.objects.filter(pk=instance.pk)
+                                     .values_list('latitude', 'longitude')
+                                     .first() if instance.pk else None)
+
+
+@receiver(post_save, sender=models.Place)
+def on_place_saved(instance: models.Place, created: bool, **_kwargs) -> None:
+    """
+    Обработка сохранения места: кластеры и границы мест маршрутов изменяются при изменении координат
+    :param instance: место
+    :param created: место создано
+    :return: None
+    """
+    # модули производных данных используют numpy и загружаются при первом изменении мест, а не при запуске процесса
+    from route_settings_builder import clusters  # pylint: disable=import-outside-toplevel
+
+    previous_coordinates = getattr(instance, 'previous_coordinates', None)
+    coordinates = (instance.latitude, instance.longitude)
+
+    if previous_coordinates is None or created:
+        clusters.add_place(*coordinates)
+    elif tuple(map(float, previous_coordinates)) != tuple(map(float, coordinates)):
+        clusters.remove_place(*previous_coordinates)
+        clusters.add_place(*coordinates)
+        models_utils.update_routes_summary(models.RoutePlace.objects.filter(place=instance).values('route_id'))
+
+
+@receiver(post_delete, sender=models.Place)
+def on_place_deleted(instance: models.Place, **_kwargs) -> None:
+    """
+    Обработка удаления места: место удаляется из кластеров
+    :param instance: место
+    :return: None
+    """
+    from route_settings_builder import clusters  # pylint: disable=import-outside-toplevel
+
+    clusters.remove_place(instance.latitude, instance.longitude)
+
+
+@receiver([post_save, post_delete], sender=models.Place)
+def on_place_changed(instance: models.Place, **_kwargs) -> None:
+    """
+    Обработка изменения места: производные данные по координатам мест перестраиваются
+    :param instance: место
+    :return: None
+    """
+    from route_settings_builder import distances, tiles  # pylint: disable=import-outside-toplevel
+
+    coordinates = [(instance.latitude, instance.longitude)]
+    if previous_coordinates := getattr(instance, 'previous_coordinates', None):
+        coordinates.append(previous_coordinates)
+
+    transaction.on_commit(distances.place_distances.invalidate)
+    transaction.on_commit(partial(tiles.invalidate_tiles, coordinates))
+
+
+@receiver([post_save, post_delete], sender=models.PlaceCriterion)
+def on_place_criterion_changed(**_kwargs) -> None:
+    """
+    Обработка изменения критерия места: матрица признаков мест перестраивается
+    :return: None
+    """
+    from route_settings_builder import recommendations  # pylint: disable=import-outside-toplevel
+
+    transaction.on_commit(recommendations.place_criteria.invalidate)
+
+
+@receiver(post_save, sender=models.Criterion)
+def on_criterion_saved(instance: models.Criterion, created: bool, **_kwargs) -> None:
+    """
+    Обработка сохранения критерия: значения критериев в сводке маршрутов хранятся по внутреннему наименованию
+    :param instance: критерий
+    :param created: критерий создан
+    :return: None
+    """
+    if not created:
+        models_utils.update_routes_summary(models.RouteCriterion.objects.filter(criterion=instance).values('route_id'))
+
+
+@receiver(post_save, sender=models.RoutePlace)
+@receiver(post_save, sender=models.RouteCriterion)
+def on_route_relation_saved(instance, **_kwargs) -> None:
+    """
+    Обработка сохранения места или критерия маршрута: сводка маршрута пересчитывается.
+    Обработчиков удаления нет, чтобы удаление маршрута не загружало его места и критерии:
+    при удалении мест и критериев маршрута сводка пересчитывается явно
+    :param instance: место или критерий маршрута
+    :return: None
+    """
+    models_utils.update_routes_summary([instance.route_id])
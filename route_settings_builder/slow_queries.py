@@ -0,0 +1,224 @@
+"""
+Журнал медленных запросов к БД.
+Запросы дольше SLOW_QUERY_THRESHOLD_MS и случайная выборка остальных (SLOW_QUERY_SAMPLE_RATE)
+записываются с операцией API и отпечатком SQL в журнал route_settings_builder.slow_queries
+(ротируемый файл) и в сводку SlowQuery по отпечатку и операции для администраторской страницы.
+При SLOW_QUERY_EXPLAIN к записи добавляется план EXPLAIN (ANALYZE, BUFFERS); запросы, изменяющие данные,
+не выполняются повторно, для них план строится без ANALYZE.
+"""
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Optional
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from route_settings_builder import models
+
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_SIZE = 8
+MAX_SQL_LENGTH = 10000
+
+_request = ContextVar('slow_queries_request', default=None)
+_recording = ContextVar('slow_queries_recording', default=False)
+
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r'\b\d+(?:\.\d+)?\b')
+_placeholders_list_re = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_values_list_re = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_whitespace_re = re.compile(r'\s+')
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Нормализация SQL для группировки запросов: значения заменяются на ?, списки значений сворачиваются
+    :param sql: SQL запроса
+    :return: нормализованный SQL
+    """
+    sql = _string_re.sub('?', sql.replace('%s', '?'))
+    sql = _number_re.sub('?', sql)
+    sql = _placeholders_list_re.sub('(...)', sql)
+    sql = _values_list_re.sub(r'\1', sql)
+    return _whitespace_re.sub(' ', sql).strip()
+
+
+def get_fingerprint(normalized_sql: str) -> str:
+    """
+    Получение отпечатка нормализованного SQL
+    :param normalized_sql: нормализованный SQL
+    :return: отпечаток
+    """
+    return hashlib.blake2b(normalized_sql.encode(), digest_size=FINGERPRINT_SIZE).hexdigest()
+
+
+def get_operation() -> Optional[str]:
+    """
+    Получение операции API текущего запроса
+    :return: метод и шаблон пути или None вне запроса
+    """
+    if (request := _request.get()) is None:
+        return None
+    return get_request_operation(request)
+
+
+def get_request_operation(request) -> str:
+    """
+    Получение операции API запроса
+    :param request: HTTP-запрос
+    :return: метод и шаблон пути или путь, если путь еще не сопоставлен
+    """
+    if (resolver_match := request.resolver_match) is None:
+        return f'{request.method} {request.path}'
+    return f'{request.method} /{resolver_match.route}'
+
+
+@contextmanager
+def record(request=None):
+    """
+    Запись медленных запросов ко всем БД в контексте
+    :param request: HTTP-запрос, операция которого указывается в записях
+    :return: контекстный менеджер
+    """
+    token = _request.set(request)
+    try:
+        with wrap_connections(record_query):
+            yield
+    finally:
+        _request.reset(token)
+
+
+@asynccontextmanager
+async def arecord(request=None):
+    """
+    Запись медленных запросов ко всем БД в контексте асинхронной обработки.
+    Подключения Django принадлежат потоку, поэтому обертки устанавливаются в потоке sync_to_async запроса
+    :param request: HTTP-запрос, операция которого указывается в записях
+    :return: асинхронный контекстный менеджер
+    """
+    token = _request.set(request)
+    try:
+        stack = await sync_to_async(wrap_connections)(record_query)
+        try:
+            yield
+        finally:
+            await sync_to_async(stack.close)()
+    finally:
+        _request.reset(token)
+
+
+def wrap_connections(wrapper) -> ExitStack:
+    """
+    Установка обертки выполнения запросов (connection.execute_wrapper) на подключения ко всем БД текущего потока
+    :param wrapper: обертка выполнения запроса
+    :return: стек, при закрытии которого обертки снимаются
+    """
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        return stack.pop_all()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запроса (connection.execute_wrapper): замер времени и запись медленного запроса
+    :param execute: выполнение запроса
+    :param sql: SQL запроса
+    :param params: параметры запроса
+    :param many: пакетное выполнение
+    :param context: контекст выполнения
+    :return: результат выполнения
+    """
+    if _recording.get():
+        return execute(sql, params, many, context)
+
+    started_at = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started_at) * 1000
+
+    if duration >= settings.SLOW_QUERY_THRESHOLD_MS or random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+        token = _recording.set(True)
+        try:
+            _record(context['connection'], sql, None if many else params, duration)
+        finally:
+            _recording.reset(token)
+
+    return result
+
+
+def explain(connection, sql: str, params) -> Optional[list]:
+    """
+    Получение плана выполненного запроса. План строится в точке сохранения, чтобы ошибка не прервала транзакцию
+    :param connection: подключение Django
+    :param sql: SQL запроса
+    :param params: параметры запроса
+    :return: план в формате JSON или None, если план не получен
+    """
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if sql.lstrip()[:6].upper() == 'SELECT' else 'FORMAT JSON'
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+            plan = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def _record(connection, sql: str, params, duration: float) -> None:
+    """
+    Запись медленного запроса в журнал и, после фиксации транзакции, в сводку
+    :param connection: подключение Django
+    :param sql: SQL запроса
+    :param params: параметры запроса. None - пакетное выполнение, план не строится
+    :param duration: длительность, мс
+    :return: None
+    """
+    normalized_sql = normalize_sql(sql)
+    entry = {
+        'fingerprint': get_fingerprint(normalized_sql),
+        'operation': get_operation() or '',
+        'database': connection.alias,
+        'duration': round(duration, 3),
+        'sql': normalized_sql[:MAX_SQL_LENGTH],
+        'plan': explain(connection, sql, params) if settings.SLOW_QUERY_EXPLAIN and params is not None else None,
+    }
+    logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+    transaction.on_commit(partial(_save, entry), using=connection.alias)
+
+
+def _save(entry: dict) -> None:
+    """
+    Добавление медленного запроса в сводку по отпечатку и операции
+    :param entry: запись журнала
+    :return: None
+    """
+    table_name = models.SlowQuery._meta.db_table  # pylint: disable=protected-access
+    token = _recording.set(True)
+    try:
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table_name} AS slow_query
+                    (fingerprint, operation, sql, calls, total_duration, max_duration, plan, last_seen_at)
+                VALUES (%s, %s, %s, 1, %s, %s, %s, NOW())
+                ON CONFLICT (fingerprint, operation) DO UPDATE SET
+                    calls = slow_query.calls + 1,
+                    total_duration = slow_query.total_duration + EXCLUDED.total_duration,
+                    max_duration = GREATEST(slow_query.max_duration, EXCLUDED.max_duration),
+                    plan = COALESCE(EXCLUDED.plan, slow_query.plan),
+                    last_seen_at = EXCLUDED.last_seen_at
+                """,
+                [entry['fingerprint'], entry['operation'], entry['sql'], entry['duration'], entry['duration'],
+                 None if entry['plan'] is None else json.dumps(entry['plan'])]
+            )
+    finally:
+        _recording.reset(token)
@@ -0,0 +1,78 @@
+"""
+Снимки производных данных каталога мест в файлах numpy.
+Процессы открывают снимок через mmap, поэтому страницы файла разделяются между ними,
+и перечитывают его при изменении файла. При изменении исходных данных снимок удаляется
+и пересоздается при следующем обращении.
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+
+class Snapshot(ABC):
+    """ Снимок - структурированный массив numpy в каталоге SNAPSHOTS_DIR """
+    file_name: str
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[np.ndarray] = None
+        self._snapshot_version: Optional[int] = None
+
+    @property
+    def path(self) -> Path:
+        """ Путь к файлу снимка """
+        return Path(settings.SNAPSHOTS_DIR) / self.file_name
+
+    @property
+    def version(self) -> Optional[int]:
+        """ Версия снимка - время изменения файла, нс. None - снимка нет """
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @abstractmethod
+    def collect(self) -> np.ndarray:
+        """
+        Сбор данных снимка
+        :return: массив снимка
+        """
+
+    def build_snapshot(self) -> None:
+        """
+        Построение снимка. Файл заменяется атомарно
+        :return: None
+        """
+        snapshot = self.collect()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.path.parent, suffix='.npy')
+        with os.fdopen(file_descriptor, 'wb') as snapshot_file:
+            np.save(snapshot_file, snapshot)
+        os.replace(temporary_path, self.path)
+
+    def invalidate(self) -> None:
+        """
+        Удаление снимка. Новый снимок будет построен при следующем обращении
+        :return: None
+        """
+        self.path.unlink(missing_ok=True)
+
+    def get_snapshot(self) -> np.ndarray:
+        """
+        Получение снимка, открытого через mmap
+        :return: массив снимка
+        """
+        if (version := self.version) is None:
+            self.build_snapshot()
+            version = self.path.stat().st_mtime_ns
+
+        if version != self._snapshot_version:
+            self._snapshot = np.load(self.path, mmap_mode='r')
+            self._snapshot_version = version
+
+        return self._snapshot
@@ -0,0 +1,94 @@
+import pytest
+
+from route_settings_builder import admin, models
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def routes(admin_user):
+    """ Маршруты с местом """
+    place = models.Place.objects.create(name='Красная площадь', latitude=55.75, longitude=37.62)
+    routes = [models.Route.objects.create(name=f'Прогулки по центру {index}', author=admin_user)
+              for index in range(3)]
+    for route in routes:
+        models.RoutePlace.objects.create(route=route, place=place)
+    return routes
+
+
+def test_route_changelist(admin_client, routes, django_assert_max_num_queries):
+    """ Перечень маршрутов: автор выбирается вместе с маршрутами, количество запросов не зависит от числа строк """
+    with django_assert_max_num_queries(8):
+        response = admin_client.get('/admin/route_settings_builder/route/')
+
+    assert response.status_code == 200
+    assert response.context['cl'].result_count == len(routes)
+
+
+@pytest.mark.parametrize('search_term, expected_count', [
+    ('прогулка', 3),
+    ('прогул центр', 3),
+    ('площадь', 0),
+    ('admin', 3),
+])
+def test_route_search(admin_client, routes, search_term, expected_count):
+    """ Поиск маршрутов по полнотекстовому индексу и точному совпадению автора """
+    response = admin_client.get('/admin/route_settings_builder/route/', {'q': search_term})
+
+    assert response.context['cl'].result_count == expected_count
+
+
+def test_place_search_by_id(admin_client, routes):
+    """ Поиск мест по точному совпадению идентификатора """
+    place = models.Place.objects.get()
+
+    response = admin_client.get('/admin/route_settings_builder/place/', {'q': str(place.id)})
+
+    assert list(response.context['cl'].result_list) == [place]
+
+
+def test_place_autocomplete(admin_client, routes):
+    """ Автодополнение мест по началам слов """
+    response = admin_client.get('/admin/autocomplete/', {
+        'term': 'красн', 'app_label': 'route_settings_builder', 'model_name': 'routeplace', 'field_name': 'place',
+    })
+
+    assert [item['text'] for item in response.json()['results']] == ['Красная площадь']
+
+
+def test_route_places_inline_limit(admin_client, routes, monkeypatch):
+    """ Места большого маршрута не выводятся на странице маршрута и открываются постранично """
+    monkeypatch.setattr(admin, 'ROUTE_PLACES_INLINE_LIMIT', 0)
+    route = models.Route.objects.get(id=routes[0].id)
+
+    response = admin_client.get(f'/admin/route_settings_builder/route/{route.id}/change/')
+    assert response.status_code == 200
+    assert 'routeplace_set-TOTAL_FORMS' not in response.content.decode()
+
+    response = admin_client.get('/admin/route_settings_builder/routeplace/', {'route__id__exact': route.id})
+    assert response.status_code == 200
+    assert response.context['cl'].result_count == 1
+
+
+def test_route_places_delete_action(admin_client, routes):
+    """ Удаление мест маршрутов из перечня пересчитывает сводку маршрутов """
+    route_place = models.RoutePlace.objects.get(route=routes[0])
+
+    response = admin_client.post('/admin/route_settings_builder/routeplace/', {
+        'action': 'delete_selected', '_selected_action': [route_place.id], 'post': 'yes',
+    })
+
+    assert response.status_code == 302
+    assert models.Route.objects.get(id=routes[0].id).places_count == 0
+    assert models.Route.objects.get(id=routes[1].id).places_count == 1
+
+
+def test_estimated_count_paginator(monkeypatch):
+    """ Для больших выборок количество берется из плана запроса """
+    models.Place.objects.create(name='place', latitude=0, longitude=0)
+
+    assert admin.EstimatedCountPaginator(models.Place.objects.order_by('id'), 10).count == 1
+
+    monkeypatch.setattr(admin, 'EXACT_COUNT_LIMIT', 0)
+    assert admin.EstimatedCountPaginator(models.Place.objects.order_by('id'), 10).count > 1
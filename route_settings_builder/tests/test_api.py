@@ -1,6 +1,13 @@
+import uuid
+
 import pytest
 
 from django.test import Client
+from ninja_apikey.models import APIKey
+from ninja_apikey.security import generate_key
+
+from route_settings_builder import models, models_utils, compression, gateways, build_events
+from route_settings_builder.db_pool import pool as db_pool
 
 
 api_client = Client()
@@ -11,4 +18,383 @@ def test_health_api():
     assert response.status_code == 200
 
 
-# TODO: тестирование API
+@pytest.mark.django_db
+def test_db_pools_stats(auth_headers, admin_user, monkeypatch):
+    """ Статистика пулов подключений доступна только сотрудникам """
+    monkeypatch.setattr(db_pool, 'get_pools_stats', lambda: {'default': {'in_use': 1}})
+
+    response = api_client.get('/api/v1/health/db-pools', **auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {'default': {'in_use': 1}}
+
+    admin_user.is_staff = False
+    admin_user.save()
+    response = api_client.get('/api/v1/health/db-pools', **auth_headers)
+    assert response.status_code == 403
+
+
+@pytest.fixture
+def auth_headers(admin_user) -> dict:
+    """ Заголовки авторизации по API-ключу администратора """
+    key_data = generate_key()
+    APIKey.objects.create(prefix=key_data.prefix, hashed_key=key_data.hashed_key, user=admin_user, label='test')
+    return {'HTTP_X_API_KEY': f'{key_data.prefix}.{key_data.key}'}
+
+
+@pytest.fixture
+def route(admin_user) -> models.Route:
+    """ Маршрут с местом, критерием и результатом строительства """
+    route = models.Route.objects.create(name='route', author=admin_user)
+    models_utils.save_route_details(route.uuid, {'map': '<div></div>'})
+    place = models.Place.objects.create(name='place', latitude=10, longitude=20)
+    criterion = models.Criterion.objects.create(name='criterion', internal_name='criterion')
+    models.RoutePlace.objects.create(route=route, place=place)
+    models.RouteCriterion.objects.create(route=route, criterion=criterion, value='value')
+    return route
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query, expected_fields', [
+    ('', {'uuid', 'updated_at', 'name', 'is_draft', 'places_count', 'places_bbox', 'criteria_map',
+          'version', 'criteria', 'details', 'places'}),
+    ('?fields=name,places,criteria', {'name', 'places', 'criteria'}),
+    ('?exclude=details', {'uuid', 'updated_at', 'name', 'is_draft', 'places_count', 'places_bbox', 'criteria_map',
+                          'version', 'criteria', 'places'}),
+    ('?fields=name,details&exclude=details', {'name'}),
+])
+def test_get_route_fieldset(auth_headers, route, query, expected_fields):
+    """ Проверка выборки полей маршрута """
+    response = api_client.get(f'/api/v1/routes/{route.uuid}{query}', **auth_headers)
+
+    assert response.status_code == 200
+    assert set(response.json()) == expected_fields
+
+
+@pytest.mark.django_db
+def test_get_route_fieldset_skips_details_column(auth_headers, route, django_assert_num_queries):
+    """ Проверка того, что исключенное поле не запрашивается из БД """
+    with django_assert_num_queries(3) as context:  # API-ключ, пользователь, маршрут
+        api_client.get(f'/api/v1/routes/{route.uuid}?fields=name', **auth_headers)
+
+    assert all('routedetails' not in query['sql'] for query in context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_get_route_details_field_skips_brotli_payload(auth_headers, route, django_assert_num_queries):
+    """ Детализация в ответе распаковывается из основного варианта, вариант brotli не запрашивается """
+    with django_assert_num_queries(3) as context:  # API-ключ, пользователь, маршрут с детализацией
+        response = api_client.get(f'/api/v1/routes/{route.uuid}?fields=details', **auth_headers)
+
+    assert response.json()['details'] == {'map': '<div></div>'}
+    assert all('brotli_payload' not in query['sql'] for query in context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_get_routes(auth_headers, route, django_assert_num_queries):
+    """ Проверка перечня маршрутов со сводкой, собираемого без создания моделей """
+    with django_assert_num_queries(4):  # API-ключ, пользователь, количество, маршруты
+        response = api_client.get('/api/v1/routes', **auth_headers)
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/json; charset=utf-8'
+    assert response.json()['items'] == [{'uuid': str(route.uuid),
+                                         'updated_at': response.json()['items'][0]['updated_at'],
+                                         'name': route.name,
+                                         'is_draft': False,
+                                         'places_count': 1,
+                                         'places_bbox': [20.0, 10.0, 20.0, 10.0],
+                                         'criteria_map': {'criterion': 'value'}}]
+
+    response = api_client.get('/api/v1/places', **auth_headers)
+    assert response.json()['items'] == [{'id': route.places.get().id, 'name': 'place',
+                                         'longitude': 20.0, 'latitude': 10.0}]
+
+
+@pytest.mark.django_db
+def test_get_routes_fieldset(auth_headers, route):
+    """ Проверка выборки полей перечня маршрутов """
+    response = api_client.get('/api/v1/routes?fields=uuid,name', **auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()['count'] == 1
+    assert response.json()['items'] == [{'uuid': str(route.uuid), 'name': route.name}]
+
+
+@pytest.mark.django_db
+def test_get_places_fieldset(auth_headers, route):
+    """ Проверка выборки полей перечня мест и детализации места """
+    response = api_client.get('/api/v1/places?exclude=latitude,longitude', **auth_headers)
+    place = response.json()['items'][0]
+    assert set(place) == {'id', 'name'}
+
+    response = api_client.get(f'/api/v1/places/{place["id"]}?fields=criteria', **auth_headers)
+    assert response.json() == {'criteria': []}
+
+
+@pytest.mark.django_db
+def test_get_route_unknown_field(auth_headers, route):
+    """ Проверка ошибки при запросе неизвестного поля """
+    response = api_client.get(f'/api/v1/routes/{route.uuid}?fields=author', **auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_get_route_guide_precompressed(auth_headers, route):
+    """ Проверка выдачи путеводителя, сжатого при строительстве маршрута """
+    stored_guide = models.RouteGuide.objects.get(route=route)
+
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/guide/', HTTP_ACCEPT_ENCODING='br', **auth_headers)
+
+    assert response.status_code == 200
+    assert response['Content-Encoding'] == 'br'
+    assert response.content == bytes(stored_guide.brotli_payload)
+
+    models_utils.create_or_update_route({'name': 'renamed', 'author': route.author}, route.uuid)
+    assert not models.RouteGuide.objects.filter(route=route).exists()
+
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/guide/', **auth_headers)
+    assert 'renamed' in response.content.decode()
+    assert '<div></div>' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_get_route_details(auth_headers, route):
+    """ Проверка выдачи результата строительства маршрута """
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/details/', HTTP_ACCEPT_ENCODING='gzip', **auth_headers)
+
+    assert response['Content-Encoding'] == 'gzip'
+    assert compression.decode_json(response.content) == {'map': '<div></div>'}
+
+
+@pytest.mark.django_db
+def test_clone_route(auth_headers, route):
+    """ Проверка копирования маршрута """
+    response = api_client.post(f'/api/v1/routes/{route.uuid}/clone/', {'name': 'clone', 'details': True},
+                               content_type='application/json', **auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()['name'] == 'clone'
+    assert response.json()['details'] == {'map': '<div></div>'}
+    assert [item['id'] for item in response.json()['places']] == list(route.places.values_list('id', flat=True))
+
+    response = api_client.post(f'/api/v1/routes/{uuid.uuid4()}/clone/', {},
+                               content_type='application/json', **auth_headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_batch_routes(auth_headers, route):
+    """ Проверка изменения и удаления нескольких маршрутов """
+    missing_uuid = str(uuid.uuid4())
+
+    response = api_client.patch('/api/v1/routes/batch/', {'uuids': [str(route.uuid), missing_uuid], 'name': 'new'},
+                                content_type='application/json', **auth_headers)
+    assert response.status_code == 200
+    assert response.json() == [{'uuid': str(route.uuid), 'status': 'updated', 'version': 2},
+                               {'uuid': missing_uuid, 'status': 'not_found', 'version': None}]
+
+    response = api_client.post('/api/v1/routes/batch/delete/', {'uuids': [str(route.uuid), missing_uuid]},
+                               content_type='application/json', **auth_headers)
+    assert response.status_code == 200
+    assert [item['status'] for item in response.json()] == ['deleted', 'not_found']
+    assert not models.Route.objects.exists()
+
+
+@pytest.mark.django_db
+def test_build_route_throttled(auth_headers, route, settings, monkeypatch):
+    """ Проверка ограничения частоты строительства маршрутов автора """
+    settings.BUILD_RATE_LIMIT_BURST = 1
+    settings.BUILD_RATE_LIMIT_PER_MINUTE = 1
+    built_routes = []
+
+    async def check_queue_depth():
+        pass
+
+    async def build_route(route_uuid, request):
+        built_routes.append(route_uuid)
+
+    monkeypatch.setattr(gateways, 'check_queue_depth', check_queue_depth)
+    monkeypatch.setattr(gateways, 'build_route', build_route)
+
+    response = api_client.post(f'/api/v1/routes/{route.uuid}/build/', **auth_headers)
+    assert response.status_code == 204
+
+    response = api_client.post(f'/api/v1/routes/{route.uuid}/build/', **auth_headers)
+    assert response.status_code == 429
+    assert response['Retry-After'] == '60'
+    assert built_routes == [route.uuid]
+
+
+@pytest.fixture
+def build_events_listener():
+    """ Подключение LISTEN процесса закрывается после теста, чтобы не удерживать тестовую БД """
+    yield build_events.listener
+    build_events.listener.close()
+
+
+@pytest.mark.django_db
+def test_get_route_build_events(auth_headers, route, build_events_listener, monkeypatch):
+    """ Проверка события завершения строительства: сразу при новом результате, иначе после ожидания """
+    monkeypatch.setattr(build_events, 'BUILD_EVENTS_TIMEOUT', 0.1)
+    route.refresh_from_db()
+
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/build/events/?after=stale', **auth_headers)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/event-stream'
+    assert f'id: {route.details_digest}\nevent: built\n' in response.content.decode()
+
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/build/events/',
+                              HTTP_LAST_EVENT_ID=route.details_digest, **auth_headers)
+    assert response.status_code == 200
+    assert 'event:' not in response.content.decode()
+
+    response = api_client.get(f'/api/v1/routes/{uuid.uuid4()}/build/events/', **auth_headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_get_route_build_events_without_last_event_id(auth_headers, route, build_events_listener, monkeypatch):
+    """ Без известного клиенту результата событие отправляется сразу, если маршрут уже построен """
+    monkeypatch.setattr(build_events, 'BUILD_EVENTS_TIMEOUT', 0.1)
+    route.refresh_from_db()
+
+    # строительство завершилось до подписки
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/build/events/', **auth_headers)
+    assert f'id: {route.details_digest}\nevent: built\n' in response.content.decode()
+
+    models.Route.objects.filter(id=route.id).update(details_digest=None, details_summary=None, is_draft=True)
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/build/events/', **auth_headers)
+    assert 'event:' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_move_route_place(auth_headers, route):
+    """ Проверка вставки и перемещения места маршрута """
+    first_place = route.places.get()
+    place = models.Place.objects.create(name='second', latitude=0, longitude=0)
+
+    response = api_client.post(f'/api/v1/routes/{route.uuid}/places/', {'place_id': place.id},
+                               content_type='application/json', **auth_headers)
+    assert response.status_code == 204
+
+    response = api_client.post(f'/api/v1/routes/{route.uuid}/places/{first_place.id}/move/',
+                               {'after_place_id': place.id}, content_type='application/json', **auth_headers)
+    assert response.status_code == 204
+
+    response = api_client.get(f'/api/v1/routes/{route.uuid}?fields=places', **auth_headers)
+    assert [item['id'] for item in response.json()['places']] == [place.id, first_place.id]
+
+
+@pytest.mark.django_db
+def test_get_places_distances(auth_headers, route, settings, tmp_path):
+    """ Проверка получения матрицы расстояний между местами """
+    settings.SNAPSHOTS_DIR = str(tmp_path)
+    place_id = route.places.get().id
+
+    response = api_client.post('/api/v1/places/distances', {'place_ids': [place_id, place_id]},
+                               content_type='application/json', **auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {'distances': [[0.0, 0.0], [0.0, 0.0]]}
+
+    response = api_client.post('/api/v1/places/distances', {'place_ids': [place_id], 'other_place_ids': [0]},
+                               content_type='application/json', **auth_headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_get_suggested_places(auth_headers, route, settings, tmp_path):
+    """ Проверка подбора мест по критериям маршрута """
+    settings.SNAPSHOTS_DIR = str(tmp_path)
+    criterion = route.criteria.get()
+    place = models.Place.objects.create(name='suggested', latitude=10, longitude=20)
+    models.PlaceCriterion.objects.create(place=place, criterion=criterion, value='value')
+
+    response = api_client.get(f'/api/v1/routes/{route.uuid}/suggested-places?near_route=true', **auth_headers)
+
+    assert response.status_code == 200
+    assert response.json() == [{'id': place.id, 'name': 'suggested', 'latitude': 10.0, 'longitude': 20.0, 'score': 1.0}]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query, status_code', [
+    ('bbox=19,9,21,11&zoom=8', 200),
+    ('bbox=21,9,19,11&zoom=8', 400),
+    ('bbox=19,9&zoom=8', 400),
+])
+def test_get_places_clusters(auth_headers, route, query, status_code):
+    """ Проверка получения кластеров мест """
+    response = api_client.get(f'/api/v1/places/clusters?{query}', **auth_headers)
+
+    assert response.status_code == status_code
+    if status_code == 200:
+        assert response.json() == [{'count': 1, 'latitude': 10.0, 'longitude': 20.0, 'bbox': [20.0, 10.0, 20.0, 10.0]}]
+
+
+@pytest.mark.django_db
+def test_get_places_tile(auth_headers, route, settings, tmp_path):
+    """ Проверка получения тайла мест """
+    settings.SNAPSHOTS_DIR = str(tmp_path)
+
+    response = api_client.get('/api/v1/places/tiles/0/0/0', **auth_headers)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/vnd.place-tile'
+    assert response.content[:8] == b'PLT1\x01\x00\x00\x00'
+
+    response = api_client.get('/api/v1/places/tiles/0/0/0', HTTP_IF_NONE_MATCH=response['ETag'], **auth_headers)
+    assert response.status_code == 304
+
+    response = api_client.get('/api/v1/places/tiles/1/2/0', **auth_headers)
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_search(auth_headers, route):
+    """ Проверка полнотекстового поиска и подсказок при вводе """
+    museums = models.Place.objects.create(name='Музеи Москвы', latitude=1, longitude=1)
+    museum = models.Place.objects.create(name='Исторический музей', latitude=1, longitude=1)
+    models.Place.objects.create(name='Парк', latitude=1, longitude=1)
+
+    response = api_client.get('/api/v1/places?q=музей&fields=id', **auth_headers)
+    assert response.status_code == 200
+    assert {item['id'] for item in response.json()['items']} == {museums.id, museum.id}
+
+    response = api_client.get('/api/v1/places?q=музей -исторический&fields=id', **auth_headers)
+    assert response.json()['items'] == [{'id': museums.id}]
+
+    response = api_client.get('/api/v1/routes?q=route&fields=name', **auth_headers)
+    assert response.json()['items'] == [{'name': 'route'}]
+
+    response = api_client.get('/api/v1/criteria?q=criterion', **auth_headers)
+    assert [item['internal_name'] for item in response.json()] == ['criterion']
+
+    response = api_client.get('/api/v1/search/typeahead?q=муз', **auth_headers)
+    assert response.status_code == 200
+    assert {item['name'] for item in response.json()['places']} == {'Музеи Москвы', 'Исторический музей'}
+    assert response.json()['routes'] == [] and response.json()['criteria'] == []
+
+    response = api_client.get('/api/v1/search/typeahead?q=rou', **auth_headers)
+    assert response.json()['routes'] == [{'uuid': str(route.uuid), 'name': 'route'}]
+
+
+@pytest.mark.django_db
+def test_update_route_if_match(auth_headers, route):
+    """ Проверка обновления маршрута с проверкой версии """
+    response = api_client.get(f'/api/v1/routes/{route.uuid}?fields=name', **auth_headers)
+    etag = response['ETag']
+    assert etag == f'"{route.version}"'
+
+    response = api_client.patch(f'/api/v1/routes/{route.uuid}/', {'name': 'first'}, content_type='application/json',
+                                HTTP_IF_MATCH=etag, **auth_headers)
+    assert response.status_code == 200
+    assert response['ETag'] == f'"{route.version + 1}"'
+    assert response.json()['version'] == route.version + 1
+
+    response = api_client.patch(f'/api/v1/routes/{route.uuid}/', {'name': 'second'}, content_type='application/json',
+                                HTTP_IF_MATCH=etag, **auth_headers)
+    assert response.status_code == 412
+    assert models.Route.objects.get(id=route.id).name == 'first'
+
+    response = api_client.put(f'/api/v1/routes/{route.uuid}/', {'name': 'third', 'places': []},
+                              content_type='application/json', **auth_headers)
+    assert response.status_code == 200
+    assert response['ETag'] == f'"{route.version + 2}"'
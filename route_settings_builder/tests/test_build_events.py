@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+
+from route_settings_builder import models, models_utils, build_events
+
+
+@pytest.fixture(autouse=True)
+def close_listener():
+    """ Подключение LISTEN процесса закрывается после теста, чтобы не удерживать тестовую БД """
+    yield
+    build_events.listener.close()
+
+
+def test_format_event():
+    """ Событие содержит id результата строительства, без события ответ содержит только комментарий """
+    event = build_events.format_event({'uuid': 'uuid', 'is_draft': False, 'details_digest': 'digest'})
+
+    assert event.startswith(f'retry: {build_events.BUILD_EVENTS_RETRY}\n')
+    assert '\nid: digest\nevent: built\ndata: {"uuid": "uuid", "is_draft": false, ' in event
+    assert event.endswith('\n\n')
+    assert 'event:' not in build_events.format_event(None)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_listener_receives_build_event(admin_user):
+    """ Сохранение результата строительства будит подписку маршрута после фиксации транзакции """
+    route = models.Route.objects.create(name='route', author=admin_user)
+    other_route = models.Route.objects.create(name='other route', author=admin_user)
+
+    async def wait_build_events():
+        async with build_events.listener.subscribe(route.uuid) as build_finished, \
+                build_events.listener.subscribe(other_route.uuid) as other_build_finished:
+            await sync_to_async(models_utils.save_route_details)(route.uuid, {'distance': 10.5})
+            return (await build_events.listener.wait(build_finished, timeout=5),
+                    await build_events.listener.wait(other_build_finished, timeout=0.1))
+
+    assert async_to_sync(wait_build_events)() == (True, False)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_listener_close(admin_user):
+    """ При закрытии подключения ожидающие подписки завершаются без события """
+    route = models.Route.objects.create(name='route', author=admin_user)
+
+    async def wait_build_event():
+        async with build_events.listener.subscribe(route.uuid) as build_finished:
+            asyncio.get_running_loop().call_soon(build_events.listener.close)
+            return await build_events.listener.wait(build_finished, timeout=5)
+
+    assert async_to_sync(wait_build_event)() is False
+
+
+@pytest.mark.django_db(transaction=True)
+def test_listener_shared_between_event_loops(admin_user):
+    """ Запросы в разных циклах событий (async_to_sync под WSGI) используют одно подключение LISTEN """
+    route = models.Route.objects.create(name='route', author=admin_user)
+
+    async def get_listen_connection():
+        async with build_events.listener.subscribe(route.uuid):
+            return build_events.listener._connection  # pylint: disable=protected-access
+
+    assert async_to_sync(get_listen_connection)() is async_to_sync(get_listen_connection)()
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from route_settings_builder import models, clusters, geo
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+def get_clusters_state() -> list:
+    return list(models.PlaceCluster.objects
+                .order_by('zoom', 'x', 'y')
+                .values_list('zoom', 'x', 'y', 'count', 'min_latitude', 'max_latitude',
+                             'min_longitude', 'max_longitude'))
+
+
+def test_get_grid_cells():
+    """ Проверка ячеек сетки и их границ """
+    cells = geo.get_grid_cells([[55.75, 37.62], [-33.86, 151.21]], 10)
+    assert cells.tolist() == [[619, 320], [942, 614]]
+
+    west, south, east, north = geo.get_grid_cell_bounds(619, 320, 10)
+    assert west <= 37.62 < east and south < 55.75 <= north
+
+
+def test_clusters_follow_place_changes():
+    """ Проверка того, что кластеры при изменении мест совпадают с полным построением """
+    places = [models.Place.objects.create(name=str(i), latitude=55 + i / 100, longitude=37 + i / 100)
+              for i in range(5)]
+
+    places[4].latitude, places[4].longitude = -33, 151
+    places[4].save()
+    places[0].delete()
+    places[1].name = 'renamed'
+    places[1].save()
+
+    state = get_clusters_state()
+    clusters.rebuild_place_clusters()
+
+    assert get_clusters_state() == state
+    top_cluster = models.PlaceCluster.objects.get(zoom=0, x=2, y=1)
+    assert top_cluster.count == 3
+    assert np.allclose((top_cluster.latitude, top_cluster.longitude), (55.02, 37.02))
+    assert np.allclose(top_cluster.bbox, (37.01, 55.01, 37.03, 55.03))
+
+
+def test_get_clusters_limits_cells():
+    """ Проверка уменьшения масштаба при большом количестве ячеек в области """
+    models.Place.objects.create(name='place', latitude=55, longitude=37)
+
+    assert clusters.get_clusters((-180, -85, 180, 85), 10).get().zoom == 3
+    assert clusters.get_clusters((36, 54, 38, 56), 10).get().zoom == 10
+    assert not clusters.get_clusters((0, 0, 1, 1), 10).exists()
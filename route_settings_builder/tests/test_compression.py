@@ -0,0 +1,56 @@
+import pytest
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from route_settings_builder import compression
+from route_settings_builder.middleware import CompressionMiddleware
+
+
+@pytest.mark.parametrize('accept_encoding, expected_encoding', [
+    ('', None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('br;q=0, *', 'gzip'),
+    ('*', 'br'),
+])
+def test_choose_encoding(accept_encoding, expected_encoding):
+    assert compression.choose_encoding(accept_encoding, ('br', 'gzip')) == expected_encoding
+
+
+@pytest.mark.parametrize('accept_encoding', ['br', 'gzip', ''])
+def test_precompressed_response(accept_encoding):
+    """ Проверка выдачи заранее сжатого варианта без повторного сжатия """
+    content = b'<html>' + b'guide' * 100 + b'</html>'
+    variants = compression.compress_variants(content)
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    response = compression.precompressed_response(
+        request, {'gzip': variants['payload'], 'br': variants['brotli_payload']}, 'text/html', variants['digest'])
+    response = CompressionMiddleware(lambda _: response)(request)
+
+    encoding = response.get('Content-Encoding')
+    assert encoding == (accept_encoding or None)
+    assert (compression.decompress(response.content, encoding) if encoding else response.content) == content
+    assert response['ETag'] == f'"{variants["digest"]}"'
+
+    request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=f'"{variants["digest"]}"')
+    assert compression.precompressed_response(request, {'gzip': variants['payload']}, 'text/html',
+                                              variants['digest']).status_code == 304
+
+
+def test_compression_middleware():
+    """ Проверка сжатия ответа "на лету" """
+    content = b'{"name": "route"}' * 100
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+
+    response = CompressionMiddleware(lambda _: HttpResponse(content))(request)
+
+    assert response['Content-Encoding'] == 'br'
+    assert 'Accept-Encoding' in response['Vary']
+    assert compression.decompress(response.content, 'br') == content
+
+    response = CompressionMiddleware(lambda _: HttpResponse(b'short'))(request)
+    assert not response.has_header('Content-Encoding')
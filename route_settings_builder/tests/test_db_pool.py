@@ -0,0 +1,89 @@
+import pytest
+from django.db import connection
+
+from route_settings_builder.db_pool import pool
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def connection_pool():
+    """ Пул подключений к тестовой БД """
+    connection_pool = pool.ConnectionPool(connection.get_connection_params(),
+                                          pool.PoolOptions(min_size=1, max_size=2, timeout=0.1))
+    yield connection_pool
+    connection_pool.close()
+
+
+def test_warm_up(connection_pool):
+    """ Пул заранее открывает min_size подключений и выдает их без открытия новых """
+    connection_pool.options.min_size = 2
+    connection_pool.warm_up()
+    assert connection_pool.get_stats()['idle'] == 2
+
+    pooled_connection = connection_pool.getconn()
+    connection_pool.warm_up()
+
+    stats = connection_pool.get_stats()
+    assert (stats['idle'], stats['in_use'], stats['connections_opened']) == (1, 1, 2)
+    connection_pool.putconn(pooled_connection)
+
+
+def test_reuse_connection(connection_pool):
+    """ Возвращенное подключение выдается повторно """
+    first_connection = connection_pool.getconn()
+    connection_pool.putconn(first_connection)
+    second_connection = connection_pool.getconn()
+
+    assert second_connection is first_connection
+    assert connection_pool.get_stats() | {'wait_time': 0} == {
+        'min_size': 1, 'max_size': 2, 'in_use': 1, 'idle': 0, 'waiting': 0, 'wait_time': 0,
+        'connections_opened': 1, 'connections_discarded': 0, 'checkouts': 2, 'waits': 0, 'timeouts': 0,
+        'peak_in_use': 1, 'peak_waiting': 1,
+    }
+    connection_pool.putconn(second_connection)
+
+
+def test_pool_timeout(connection_pool):
+    """ При занятости всех подключений запрос ждет и получает ошибку по истечении времени ожидания """
+    connections = [connection_pool.getconn(), connection_pool.getconn()]
+
+    with pytest.raises(pool.PoolTimeout):
+        connection_pool.getconn()
+
+    stats = connection_pool.get_stats()
+    assert (stats['in_use'], stats['waits'], stats['timeouts']) == (2, 1, 1)
+
+    for pooled_connection in connections:
+        connection_pool.putconn(pooled_connection)
+    assert connection_pool.get_stats()['idle'] == 2
+
+
+def test_health_check(connection_pool):
+    """ Неработающее подключение заменяется новым """
+    connection_pool.options.health_check_interval = 0
+    broken_connection = connection_pool.getconn()
+    connection_pool.putconn(broken_connection)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_terminate_backend(%s)', [broken_connection.get_backend_pid()])
+
+    new_connection = connection_pool.getconn()
+
+    assert new_connection is not broken_connection
+    with new_connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        assert cursor.fetchone() == (1, )
+    assert connection_pool.get_stats()['connections_discarded'] == 1
+    connection_pool.putconn(new_connection)
+
+
+def test_rollback_on_release(connection_pool):
+    """ Незавершенная транзакция откатывается при возврате подключения """
+    pooled_connection = connection_pool.getconn()
+    with pooled_connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+    connection_pool.putconn(pooled_connection)
+
+    assert pooled_connection.info.transaction_status == 0
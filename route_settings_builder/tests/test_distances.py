@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from route_settings_builder import models
+from route_settings_builder.distances import PlaceDistanceService
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def place_distances(settings, tmp_path) -> PlaceDistanceService:
+    """ Сервис расстояний со снимком во временном каталоге """
+    settings.SNAPSHOTS_DIR = str(tmp_path)
+    return PlaceDistanceService()
+
+
+def test_get_distance_matrix(place_distances):
+    """ Проверка матрицы расстояний по произвольному набору мест """
+    places = [models.Place.objects.create(name=str(i), latitude=i, longitude=0) for i in range(3)]
+
+    distance_matrix = place_distances.get_distance_matrix([places[2].id, places[0].id], [places[1].id])
+
+    assert distance_matrix.dtype == np.float32
+    assert distance_matrix.shape == (2, 1)
+    assert np.allclose(distance_matrix, 111_195, rtol=1e-3)
+    assert place_distances.get_distance_matrix([]).shape == (0, 0)
+
+    with pytest.raises(models.Place.DoesNotExist):
+        place_distances.get_distance_matrix([places[0].id, -1])
+
+
+def test_snapshot_refresh_on_place_change(place_distances, django_capture_on_commit_callbacks):
+    """ Проверка обновления снимка при изменении места """
+    place = models.Place.objects.create(name='place', latitude=0, longitude=0)
+    other_place = models.Place.objects.create(name='other', latitude=1, longitude=0)
+    assert place_distances.get_distance_matrix([place.id], [other_place.id])[0, 0] == pytest.approx(111_195, rel=1e-3)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        place.latitude = 2
+        place.save()
+
+    assert not place_distances.path.exists()
+    assert place_distances.get_distance_matrix([place.id], [other_place.id])[0, 0] == pytest.approx(111_195, rel=1e-3)
+    assert place_distances.get_coordinates([place.id])[0, 0] == 2
@@ -1,11 +1,14 @@
 import decimal
+import uuid
 from typing import List, Tuple, Optional, Set
 
 import pytest
 
 from django.contrib.auth.models import AbstractUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from route_settings_builder import models, models_utils
+from route_settings_builder import build_events, models, models_utils, routers
 
 
 M2M_COUNT = 3
@@ -69,6 +72,25 @@ def test_update_route(admin_user, route_data):
         assert getattr(route, field_name) == value
 
 
+def test_update_route_version(admin_user, django_user_model):
+    """ Проверка версии маршрута при обновлении """
+    route = _create_route(admin_user)
+    places = _create_places()
+
+    route = models_utils.create_or_update_route({'author': admin_user, 'places': [places[0].id]}, route.uuid,
+                                                expected_version=route.version)
+    assert route.version == 2
+
+    with pytest.raises(models_utils.RouteVersionConflict):
+        models_utils.create_or_update_route({'author': admin_user, 'name': 'stale', 'places': [places[1].id]},
+                                            route.uuid, expected_version=1)
+    assert (models.Route.objects.get(id=route.id).name, _get_route_places_ids(route)) == (route.name, [places[0].id])
+
+    other_user = django_user_model.objects.create(username='other')
+    with pytest.raises(models.Route.DoesNotExist):
+        models_utils.create_or_update_route({'author': other_user, 'name': 'foreign'}, route.uuid)
+
+
 def test_get_points_coordinates_from_places(admin_user):
     """ Проверка запроса на получение списка точек маршрута """
     route = _create_route(admin_user)
@@ -82,6 +104,84 @@ def test_get_points_coordinates_from_places(admin_user):
     assert isinstance(points_coordinates[0][0], float)
 
 
+def test_route_places_order(admin_user):
+    """ Проверка порядка мест маршрута, перемещения и вставки мест """
+    places = _create_places() + [models.Place.objects.create(name='3', latitude=30, longitude=30)]
+    route = models_utils.create_or_update_route({'name': 'test', 'author': admin_user,
+                                                 'places': [places[2].id, places[0].id, places[1].id]})
+
+    assert models_utils.get_points_coordinates_from_route_places(route) == [(20.0, 20.0), (0.0, 0.0), (10.0, 10.0)]
+
+    models_utils.move_route_place(route, places[2].id, after_place_id=places[1].id)
+    models_utils.move_route_place(route, places[1].id, after_place_id=None)
+    models_utils.insert_route_place(route, places[3].id, after_place_id=places[0].id)
+
+    assert _get_route_places_ids(route) == [places[1].id, places[0].id, places[3].id, places[2].id]
+
+    models_utils.create_or_update_route({'author': admin_user, 'places': [places[3].id, places[0].id]}, route.uuid)
+    assert _get_route_places_ids(route) == [places[3].id, places[0].id]
+
+
+def test_move_route_place_renumbers_when_no_gap(admin_user):
+    """ Проверка перенумерации мест маршрута при исчерпании позиций между соседями """
+    route = _create_route(admin_user)
+    places = _create_places()
+    for position, place in enumerate(places):
+        models.RoutePlace.objects.create(route=route, place=place, position=position)
+
+    models_utils.move_route_place(route, places[2].id, after_place_id=places[0].id)
+
+    assert _get_route_places_ids(route) == [places[0].id, places[2].id, places[1].id]
+
+
+def test_optimize_route_places_order(admin_user):
+    """ Проверка сохранения оптимизированного порядка мест маршрута """
+    places = [models.Place.objects.create(name=str(i), latitude=latitude, longitude=0)
+              for i, latitude in enumerate((0, 3, 1, 4, 2))]
+    route = models_utils.create_or_update_route({'name': 'test', 'author': admin_user,
+                                                 'places': [place.id for place in places]})
+
+    models_utils.optimize_route_places_order(route)
+
+    assert models_utils.get_points_coordinates_from_route_places(route) == [(float(latitude), 0.0)
+                                                                            for latitude in range(5)]
+
+
+def test_update_routes_summary(admin_user):
+    """ Проверка сводки маршрута при изменении мест, их координат и критериев """
+    places = _create_places()
+    criteria = _create_criteria()
+    route = models_utils.create_or_update_route({'name': 'route', 'author': admin_user,
+                                                 'places': [places[0].id, places[2].id],
+                                                 'criteria': [{'criterion_id': criteria[0].id, 'value': 'v'}]})
+    assert (route.places_count, route.places_bbox) == (2, [0, 0, 20, 20])
+    assert route.criteria_map == {criteria[0].internal_name: 'v'}
+
+    models_utils.insert_route_place(route, places[1].id)
+    places[2].latitude = 15
+    places[2].save()
+    models_utils.create_or_update_route({'author': admin_user, 'criteria': []}, route.uuid)
+    route.refresh_from_db()
+    assert (route.places_count, route.places_bbox, route.criteria_map) == (3, [0, 0, 20, 15], {})
+
+    models_utils.create_or_update_route({'author': admin_user, 'places': [places[0].id, places[1].id]}, route.uuid)
+    route.refresh_from_db()
+    assert (route.places_count, route.places_bbox) == (2, [0, 0, 10, 10])
+
+
+def test_delete_route_fast_deletes_relations(admin_user):
+    """ Места и критерии маршрута удаляются каскадно без выборки строк """
+    route = models_utils.create_or_update_route({'name': 'route', 'author': admin_user,
+                                                 'places': [place.id for place in _create_places()]})
+
+    with CaptureQueriesContext(connection) as context:
+        route.delete()
+
+    table_name = models.RoutePlace._meta.db_table  # pylint: disable=protected-access
+    assert not [query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('SELECT') and f'FROM "{table_name}"' in query['sql']]
+
+
 def test_get_criteria_from_route(admin_user):
     """ Проверка запроса на получение перечня критериев со значениями """
     route = _create_route(admin_user)
@@ -98,6 +198,123 @@ def test_get_criteria_from_route(admin_user):
     assert route_criteria_with_values[route_criteria[-1].criterion.internal_name] == float(route_criteria[-1].value)
 
 
+def test_save_route_details(admin_user):
+    """ Проверка сохранения детализации маршрута в сжатом виде """
+    route = _create_route(admin_user)
+    details = {'map': '<div>' * 1000, 'distance': 10.5}
+
+    models_utils.save_route_details(route.uuid, details)
+    route = models.Route.objects.get(id=route.id)
+    stored_details = models.RouteDetails.objects.get(route=route)
+
+    assert route.details == details
+    assert route.is_draft is False
+    assert route.details_summary == {'distance': 10.5}
+    assert route.details_digest == stored_details.digest
+    assert len(stored_details.payload) < stored_details.size
+
+    models_utils.save_route_details(route.uuid, None)
+    route = models.Route.objects.get(id=route.id)
+
+    assert route.details is None
+    assert route.is_draft is True
+    assert not models.RouteDetails.objects.filter(route=route).exists()
+
+
+def test_save_route_segment_details(admin_user):
+    """ Результат сохраняется после получения всех сегментов, ответы предыдущего строительства не сохраняются """
+    route = _create_route(admin_user)
+    previous_group = models_utils.start_segmented_build(route.uuid, 2)
+    group = models_utils.start_segmented_build(route.uuid, 2)
+
+    assert models_utils.save_route_segment_details(route.uuid, previous_group, 0, {'distance': 1}) is False
+    assert models_utils.save_route_segment_details(route.uuid, group, 1, {'distance': 2}) is False
+    assert models.Route.objects.get(id=route.id).details is None
+
+    assert models_utils.save_route_segment_details(route.uuid, group, 0, {'distance': 3}) is True
+    assert models.Route.objects.get(id=route.id).details == {'distance': 5}
+    assert not models.RouteBuildSegment.objects.exists()
+
+
+def test_save_route_segment_details_empty(admin_user, monkeypatch):
+    """ Пустой ответ сегмента завершает строительство группы без замены прежнего результата и отправляет событие """
+    route = _create_route(admin_user)
+    models_utils.save_route_details(route.uuid, {'distance': 10.5})
+    group = models_utils.start_segmented_build(route.uuid, 2)
+    notified_routes = []
+    monkeypatch.setattr(build_events, 'notify', notified_routes.append)
+
+    assert models_utils.save_route_segment_details(route.uuid, group, 0, {'distance': 1}) is False
+    assert not notified_routes
+    assert models_utils.save_route_segment_details(route.uuid, group, 1, {}) is False
+    assert notified_routes == [route.uuid]
+    assert models_utils.save_route_segment_details(route.uuid, group, 0, {'distance': 2}) is False
+
+    route = models.Route.objects.get(id=route.id)
+    assert (route.details, route.is_draft) == ({'distance': 10.5}, False)
+    assert not models.RouteBuildSegment.objects.exists()
+
+
+@pytest.mark.parametrize('with_details', [False, True])
+def test_clone_route(admin_user, with_details, django_assert_num_queries):
+    """ Проверка копирования маршрута запросами INSERT ... SELECT """
+    route = _create_route(admin_user)
+    route, _ = _relate_criteria_to_route(route, _create_criteria())
+    route, _ = _relate_places_to_route(route, _create_places())
+    models_utils.save_route_details(route.uuid, {'distance': 10.5})
+    route = models.Route.objects.get(id=route.id)
+
+    # маршрут, INSERT ... SELECT маршрута, мест, критериев (и детализации), копия, SAVEPOINT и RELEASE
+    with django_assert_num_queries(7 + with_details):
+        clone = models_utils.clone_route(route.uuid, admin_user, 'clone', with_details)
+
+    assert (clone.name, clone.version, clone.author_id) == ('clone', 1, admin_user.id)
+    assert clone.uuid != route.uuid
+    assert (clone.places_count, clone.places_bbox, clone.criteria_map) == (route.places_count, route.places_bbox,
+                                                                          route.criteria_map)
+    assert _get_route_places_ids(clone) == _get_route_places_ids(route)
+    assert (set(clone.routecriterion_set.values_list('criterion_id', 'value'))
+            == set(route.routecriterion_set.values_list('criterion_id', 'value')))
+    assert clone.is_draft is not with_details
+    assert clone.details == ({'distance': 10.5} if with_details else None)
+
+
+def test_delete_routes(admin_user, django_user_model, monkeypatch):
+    """ Проверка удаления нескольких маршрутов только автора; чтения автора привязываются к основной БД """
+    routes = [_create_route(admin_user) for _ in range(M2M_COUNT)]
+    _relate_places_to_route(routes[0], _create_places())
+    other_route = _create_route(django_user_model.objects.create(username='other'))
+    pinned_users = []
+    monkeypatch.setattr(routers, 'pin_primary', pinned_users.append)
+
+    results = models_utils.delete_routes(admin_user, [route.uuid for route in routes[:2]] + [other_route.uuid])
+
+    assert [result['status'] for result in results] == ['deleted', 'deleted', 'not_found']
+    assert pinned_users == [admin_user.id]
+    assert list(models.Route.objects.values_list('id', flat=True).order_by('id')) == [routes[2].id, other_route.id]
+
+
+def test_update_routes(admin_user, django_assert_num_queries):
+    """ Проверка изменения нескольких маршрутов набором запросов """
+    routes = [_create_route(admin_user) for _ in range(M2M_COUNT)]
+    criteria = _create_criteria()
+    _relate_criteria_to_route(routes[0], criteria[:1])
+    missing_uuid = uuid.uuid4()
+
+    with django_assert_num_queries(8):
+        results = models_utils.update_routes(
+            admin_user, [route.uuid for route in routes] + [missing_uuid],
+            {'name': 'renamed', 'criteria': [{'criterion_id': criteria[1].id, 'value': 'value'}]},
+        )
+
+    assert [(result['status'], result['version']) for result in results] == [('updated', 2)] * M2M_COUNT + [
+        ('not_found', None)]
+    for route in models.Route.objects.filter(id__in=[route.id for route in routes]):
+        assert route.name == 'renamed'
+        assert route.criteria_map[criteria[1].internal_name] == 'value'
+    assert len(models.Route.objects.get(id=routes[0].id).criteria_map) == 2
+
+
 def _assert_route_relations(route: models.Route, criteria_ids: Optional[Set[int]], places_ids: Optional[Set[int]]):
     """
     Проверка наличия всех необходимых связей
@@ -108,9 +325,20 @@ def _assert_route_relations(route: models.Route, criteria_ids: Optional[Set[int]
     """
     if criteria_ids:
         assert set(route.criteria.values_list('id', flat=True)) == criteria_ids
+        assert route.criteria_map == dict(route.routecriterion_set.values_list('criterion__internal_name', 'value'))
 
     if places_ids:
         assert set(route.places.values_list('id', flat=True)) == places_ids
+        assert route.places_count == len(places_ids)
+
+
+def _get_route_places_ids(route: models.Route) -> List[int]:
+    """
+    Получение id мест маршрута в порядке следования
+    :param route: маршрут
+    :return: список id мест
+    """
+    return list(models.RoutePlace.objects.filter(route=route).order_by('position').values_list('place_id', flat=True))
 
 
 def _create_route(user: AbstractUser) -> models.Route:
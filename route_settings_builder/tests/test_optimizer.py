@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+import pytest
+
+from route_settings_builder import geo, optimizer
+
+
+def test_haversine_matrix():
+    """ Проверка расчета расстояний: Москва - Санкт-Петербург около 634 км """
+    distances = geo.haversine_matrix(np.array([[55.7558, 37.6173], [59.9343, 30.3351]]))
+
+    assert distances.shape == (2, 2)
+    assert np.allclose(np.diag(distances), 0)
+    assert distances[0, 1] == pytest.approx(633_000, rel=0.01)
+    assert distances[0, 1] == distances[1, 0]
+
+
+@pytest.mark.parametrize('points_count', [0, 1, 3, 10, 300])
+def test_optimize_order(points_count):
+    """ Проверка оптимизации порядка: перестановка с фиксированным началом, не длиннее ближайшего соседа """
+    coordinates = np.random.default_rng(points_count).random((points_count, 2)) + (55.5, 37.5)
+
+    order = optimizer.optimize_order(coordinates)
+
+    assert sorted(order) == list(range(points_count))
+    if points_count:
+        assert order[0] == 0
+
+    if points_count > 3:
+        distances = geo.haversine_matrix(coordinates)
+        assert (optimizer.get_path_length(order, distances)
+                <= optimizer.get_path_length(optimizer.nearest_neighbour_order(distances), distances))
+
+
+def test_optimize_order_time_budget():
+    """ Проверка соблюдения бюджета времени на маршруте из нескольких сотен мест """
+    coordinates = np.random.default_rng(0).random((500, 2)) + (55.5, 37.5)
+
+    started_at = time.monotonic()
+    optimizer.optimize_order(coordinates, time_budget=0.3)
+
+    assert time.monotonic() - started_at < 0.5
@@ -0,0 +1,76 @@
+import marshal
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from ninja_apikey.models import APIKey
+from ninja_apikey.security import generate_key
+
+from route_settings_builder import models
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+def _get_auth_headers(user) -> dict:
+    """
+    Получение заголовков авторизации по API-ключу пользователя
+    :param user: пользователь
+    :return: заголовки
+    """
+    key_data = generate_key()
+    APIKey.objects.create(prefix=key_data.prefix, hashed_key=key_data.hashed_key, user=user, label='test')
+    return {'HTTP_X_API_KEY': f'{key_data.prefix}.{key_data.key}'}
+
+
+def test_profile_request(admin_user, admin_client):
+    """ Запрос сотрудника с заголовком профилирования сохраняет профиль и журнал запросов к БД """
+    models.Place.objects.create(name='place', latitude=0, longitude=0)
+
+    response = Client().get('/api/v1/places', HTTP_X_PROFILE='1', **_get_auth_headers(admin_user))
+
+    request_profile = models.RequestProfile.objects.get(id=response['X-Profile-Id'])
+    assert (request_profile.operation, request_profile.status_code, request_profile.user) == (
+        'GET /api/v1/places', 200, admin_user)
+    assert request_profile.queries_count == len(request_profile.queries) > 0
+    assert any(function_name == 'get_places' for _, _, function_name in marshal.loads(request_profile.profile))
+
+    response = admin_client.get(f'/admin/route_settings_builder/requestprofile/{request_profile.id}/download/')
+    assert marshal.loads(response.content)
+
+    response = admin_client.get(f'/admin/route_settings_builder/requestprofile/{request_profile.id}/change/')
+    assert response.status_code == 200
+
+
+def test_profile_request_async(admin_user):
+    """ Асинхронная обработка запроса сотрудника с заголовком профилирования сохраняет профиль """
+    models.Place.objects.create(name='place', latitude=0, longitude=0)
+    # AsyncClient передает дополнительные аргументы заголовками ASGI scope
+    headers = {'X-Profile': '1', 'X-API-Key': _get_auth_headers(admin_user)['HTTP_X_API_KEY']}
+
+    async def get_places():
+        return await AsyncClient().get('/api/v1/places', **headers)
+
+    response = async_to_sync(get_places)()
+
+    request_profile = models.RequestProfile.objects.get(id=response['X-Profile-Id'])
+    assert (request_profile.operation, request_profile.status_code) == ('GET /api/v1/places', 200)
+    assert request_profile.queries_count == len(request_profile.queries) > 0
+    assert any(function_name == 'get_places' for _, _, function_name in marshal.loads(request_profile.profile))
+
+
+@pytest.mark.parametrize('is_staff, query, headers', [
+    (False, '?profile=1', {}),
+    (True, '', {}),
+    (True, '?profile=0', {}),
+    (True, '', {'HTTP_X_PROFILE': 'false'}),
+])
+def test_profile_request_not_requested(django_user_model, is_staff, query, headers):
+    """ Без флага профилирования и для пользователей не из числа сотрудников профиль не сохраняется """
+    user = django_user_model.objects.create(username='user', is_staff=is_staff)
+
+    response = Client().get(f'/api/v1/places{query}', **headers, **_get_auth_headers(user))
+
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response
+    assert not models.RequestProfile.objects.exists()
@@ -0,0 +1,62 @@
+import pytest
+
+from route_settings_builder import models, distances, recommendations
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture(autouse=True)
+def snapshots_dir(settings, tmp_path):
+    """ Снимки во временном каталоге """
+    settings.SNAPSHOTS_DIR = str(tmp_path)
+    recommendations.place_criteria.invalidate()
+    distances.place_distances.invalidate()
+
+
+@pytest.fixture
+def criteria() -> tuple:
+    """ Критерии с разными типами значений """
+    return (models.Criterion.objects.create(name='Кухня', internal_name='cuisine'),
+            models.Criterion.objects.create(name='Рейтинг', internal_name='rating', value_type='numeric'),
+            models.Criterion.objects.create(name='Парковка', internal_name='parking', value_type='boolean'))
+
+
+def create_place(name: str, latitude: float, values: dict) -> models.Place:
+    place = models.Place.objects.create(name=name, latitude=latitude, longitude=0)
+    for criterion, value in values.items():
+        models.PlaceCriterion.objects.create(place=place, criterion=criterion, value=value)
+    return place
+
+
+def test_suggest_places(admin_user, criteria):
+    """ Проверка подбора мест по критериям маршрута """
+    cuisine, rating, parking = criteria
+    route_place = create_place('route place', 0, {cuisine: 'italian', rating: '5', parking: '1'})
+    best = create_place('best', 0.01, {cuisine: ' Italian', rating: '5.0', parking: 'true'})
+    partial = create_place('partial', 0.02, {cuisine: 'italian', parking: '0'})
+    far = create_place('far', 10, {cuisine: 'italian', rating: '5', parking: '1'})
+    create_place('other', 0.03, {cuisine: 'french'})
+
+    route = models.Route.objects.create(name='route', author=admin_user)
+    models.RoutePlace.objects.create(route=route, place=route_place)
+    for criterion, value in ((cuisine, 'italian'), (rating, '5'), (parking, 'true')):
+        models.RouteCriterion.objects.create(route=route, criterion=criterion, value=value)
+
+    assert recommendations.suggest_places(route) == [(best, 1.0), (far, 1.0), (partial, pytest.approx(1 / 3))]
+    assert recommendations.suggest_places(route, limit=1) == [(best, 1.0)]
+    assert recommendations.suggest_places(route, near_route=True) == [(best, 1.0), (partial, pytest.approx(1 / 3))]
+
+
+def test_place_criteria_refresh(admin_user, criteria, django_capture_on_commit_callbacks):
+    """ Проверка обновления матрицы признаков при изменении критериев места """
+    cuisine = criteria[0]
+    place = create_place('place', 0, {})
+    route = models.Route.objects.create(name='route', author=admin_user)
+    models.RouteCriterion.objects.create(route=route, criterion=cuisine, value='italian')
+    assert recommendations.suggest_places(route) == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        models.PlaceCriterion.objects.create(place=place, criterion=cuisine, value='italian')
+
+    assert recommendations.suggest_places(route) == [(place, 1.0)]
@@ -0,0 +1,71 @@
+import pytest
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from route_settings_builder import models, routers
+
+
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+@pytest.fixture(autouse=True)
+def replica(settings, monkeypatch):
+    """ Реплика для чтения; привязка к основной БД сбрасывается """
+    monkeypatch.setattr(routers, 'get_replicas', lambda: ['replica_0'])
+    settings.DATABASE_PRIMARY_STICKINESS = 5
+    routers.reset()
+    cache.clear()
+    yield
+    routers.reset()
+
+
+def test_read_from_replica():
+    """ Чтения выполняются на реплике, записи - на основной БД """
+    router = routers.ReplicaRouter()
+
+    assert router.db_for_read(models.Place) == 'replica_0'
+    assert router.db_for_write(models.Place) == DEFAULT_DB_ALIAS
+    assert router.db_for_read(models.Place) == DEFAULT_DB_ALIAS
+
+
+def test_read_without_replicas(monkeypatch):
+    """ Без реплик чтения выполняются на основной БД """
+    monkeypatch.setattr(routers, 'get_replicas', lambda: [])
+
+    assert routers.ReplicaRouter().db_for_read(models.Place) == DEFAULT_DB_ALIAS
+
+
+def test_primary_stickiness():
+    """ После записи пользователя его следующие запросы читают с основной БД """
+    router = routers.ReplicaRouter()
+
+    routers.pin_primary(1)
+    routers.reset()
+    assert router.db_for_read(models.Route) == 'replica_0'
+
+    routers.use_primary_if_pinned(2)
+    assert router.db_for_read(models.Route) == 'replica_0'
+
+    routers.use_primary_if_pinned(1)
+    assert router.db_for_read(models.Route) == DEFAULT_DB_ALIAS
+
+
+def test_primary_stickiness_disabled(settings):
+    """ Без времени привязки следующие запросы пользователя читают с реплики """
+    settings.DATABASE_PRIMARY_STICKINESS = 0
+    router = routers.ReplicaRouter()
+
+    routers.pin_primary(1)
+    routers.reset()
+    routers.use_primary_if_pinned(1)
+    assert router.db_for_read(models.Route) == 'replica_0'
+
+
+def test_cache_on_primary():
+    """ Запросы к таблице кеша выполняются на основной БД и не привязывают чтения к ней """
+    router = routers.ReplicaRouter()
+    cache_model = type('CacheEntry', (), {'_meta': type('Options', (), {'app_label': routers.CACHE_APP_LABEL})})
+
+    assert router.db_for_read(cache_model) == DEFAULT_DB_ALIAS
+    assert router.db_for_write(cache_model) == DEFAULT_DB_ALIAS
+    assert router.db_for_read(models.Route) == 'replica_0'
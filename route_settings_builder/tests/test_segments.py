@@ -0,0 +1,84 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import asyncio
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from route_settings_builder import models, segments, gateways
+
+
+@pytest.mark.parametrize('points_count, size, expected_segments', [
+    (5, 0, [[0, 1, 2, 3, 4]]),
+    (5, 5, [[0, 1, 2, 3, 4]]),
+    (7, 3, [[0, 1, 2], [2, 3, 4], [4, 5, 6]]),
+    (8, 3, [[0, 1, 2], [2, 3, 4], [4, 5, 6], [6, 7]]),
+])
+def test_split_points(points_count, size, expected_segments):
+    """ Соседние сегменты имеют общую точку, последний сегмент содержит не меньше двух точек """
+    assert segments.split_points(range(points_count), size) == expected_segments
+
+
+def test_merge_details():
+    """ Числа складываются, списки и строки соединяются, словари объединяются по ключам """
+    merged = segments.merge_details([
+        {'distance': 1.5, 'duration': 10, 'feasible': True, 'map': '<a>', 'legs': [1], 'stats': {'stops': 1}},
+        {'distance': 2, 'duration': 5, 'feasible': False, 'map': '<b>', 'legs': [2], 'stats': {'stops': 2, 'x': 1}},
+    ])
+
+    assert merged == {'distance': 3.5, 'duration': 15, 'feasible': False, 'map': '<a><b>', 'legs': [1, 2],
+                      'stats': {'stops': 3, 'x': 1}}
+    assert segments.merge_details([{'distance': 1}, {}]) is None
+
+
+class FakePublisher:
+    """ Издатель, на каждый запрос отвечающий от имени строителя маршрутов в обратном порядке """
+    def __init__(self) -> None:
+        self.consumer = None
+        self.requests = []
+
+    async def publish(self, message, correlation_id, reply_to):
+        self.requests.append(message)
+        points = message['points_coordinates']
+        body = json.dumps({'distance': len(points) - 1, 'map': f'<{points[0][0]}>'}).encode()
+
+        @asynccontextmanager
+        async def process():
+            yield
+
+        raw_message = SimpleNamespace(correlation_id=correlation_id, body=body, process=process)
+        asyncio.get_running_loop().call_later((10 - len(self.requests)) / 1000,
+                                              asyncio.ensure_future, self.consumer._handle_delivery(raw_message))
+
+
+@pytest.mark.django_db
+def test_build_route_segments(admin_user, settings, monkeypatch):
+    """ Сегменты публикуются параллельно, ответы объединяются в результат строительства маршрута """
+    settings.BUILD_SEGMENT_SIZE = 3
+    route = models.Route.objects.create(name='route', author=admin_user)
+    publisher = FakePublisher()
+
+    @asynccontextmanager
+    async def create_weak_publisher(*args, **kwargs):
+        yield publisher
+
+    async def create_consume_connection(consumer):
+        publisher.consumer = consumer
+        consumer.loop, consumer.futures, consumer.queue = asyncio.get_running_loop(), {}, SimpleNamespace(name='reply')
+
+    monkeypatch.setattr(gateways, 'create_weak_publisher', create_weak_publisher)
+    monkeypatch.setattr(gateways.ReplyToRouteSegmentsBuilderConsumer, 'create_consume_connection',
+                        create_consume_connection)
+
+    request = {'points_coordinates': [[index, index] for index in range(7)], 'criterion': 1}
+    async_to_sync(gateways.build_route)(route.uuid, request)
+
+    assert [segment_request['points_coordinates'][0][0] for segment_request in publisher.requests] == [0, 2, 4]
+    assert all('segment' not in segment_request for segment_request in publisher.requests)
+    assert all(segment_request['criterion'] == 1 for segment_request in publisher.requests)
+
+    route.refresh_from_db()
+    assert route.details == {'distance': 6, 'map': '<0><2><4>'}
+    assert route.is_draft is False
+    assert not models.RouteBuildSegment.objects.exists()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+
+from route_settings_builder import models, slow_queries
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def log_entries(settings, monkeypatch):
+    """ Записываются все запросы; записи журнала собираются в список """
+    settings.SLOW_QUERY_THRESHOLD_MS = 0
+    settings.SLOW_QUERY_SAMPLE_RATE = 0
+    settings.SLOW_QUERY_EXPLAIN = True
+
+    log_entries = []
+    monkeypatch.setattr(slow_queries.logger, 'info', lambda message: log_entries.append(json.loads(message)))
+    return log_entries
+
+
+@pytest.mark.parametrize('sql, normalized_sql', [
+    ('SELECT * FROM "place" WHERE "id" = %s', 'SELECT * FROM "place" WHERE "id" = ?'),
+    ("SELECT *  FROM t\n WHERE name = 'a''b' AND id IN (%s, %s, %s)",
+     'SELECT * FROM t WHERE name = ? AND id IN (...)'),
+    ('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s) RETURNING id', 'INSERT INTO t (a, b) VALUES (...) RETURNING id'),
+    ('SELECT 1 LIMIT 21', 'SELECT ? LIMIT ?'),
+])
+def test_normalize_sql(sql, normalized_sql):
+    """ Проверка нормализации SQL """
+    assert slow_queries.normalize_sql(sql) == normalized_sql
+
+
+def test_record_query(log_entries, django_capture_on_commit_callbacks):
+    """ Медленный запрос записывается в журнал и сводку с планом """
+    models.Place.objects.create(name='place', latitude=0, longitude=0)
+
+    with django_capture_on_commit_callbacks(execute=True), slow_queries.record():
+        list(models.Place.objects.filter(name='place'))
+        list(models.Place.objects.filter(name='other'))
+
+    assert len(log_entries) == 2
+    assert log_entries[0]['fingerprint'] == log_entries[1]['fingerprint']
+    slow_query = models.SlowQuery.objects.get()
+    assert slow_query.calls == 2
+    assert slow_query.operation == ''
+    assert slow_query.sql.endswith('WHERE "route_settings_builder_place"."name" = ?')
+    assert slow_query.plan[0]['Plan']['Actual Rows'] in (0, 1)
+
+
+def test_record_operation(log_entries, admin_client, django_capture_on_commit_callbacks):
+    """ Записи запросов содержат операцию """
+    with django_capture_on_commit_callbacks(execute=True):
+        admin_client.get('/admin/route_settings_builder/slowquery/')
+
+    operations = set(models.SlowQuery.objects.values_list('operation', flat=True))
+    assert 'GET /admin/route_settings_builder/slowquery/' in operations
+
+
+def test_record_operation_async(log_entries, admin_user, django_capture_on_commit_callbacks):
+    """ Записи запросов асинхронной обработки содержат операцию """
+    client = AsyncClient()
+    client.force_login(admin_user)
+
+    async def get_changelist():
+        return await client.get('/admin/route_settings_builder/slowquery/')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert async_to_sync(get_changelist)().status_code == 200
+
+    operations = set(models.SlowQuery.objects.values_list('operation', flat=True))
+    assert 'GET /admin/route_settings_builder/slowquery/' in operations
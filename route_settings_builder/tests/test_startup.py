@@ -0,0 +1,22 @@
+import io
+
+import pytest
+from django.core.management import CommandError, call_command
+
+
+@pytest.mark.parametrize('settings_module', ['route_settings_builder.settings', 'route_settings_builder.settings.api'])
+def test_startup_lazy_modules(settings_module):
+    """ Клиент брокера, библиотека изображений и numpy не загружаются при запуске процесса """
+    stdout = io.StringIO()
+
+    call_command('benchmark_startup', settings_modules=[settings_module], runs=1, stdout=stdout)
+
+    assert stdout.getvalue().startswith(f'{settings_module}: медиана')
+    assert 'загружены при запуске' not in stdout.getvalue()
+
+
+def test_startup_budget():
+    """ Превышение бюджета времени запуска - ошибка """
+    with pytest.raises(CommandError):
+        call_command('benchmark_startup', settings_modules=['route_settings_builder.settings.api'], runs=1, budget=0,
+                     stdout=io.StringIO())
@@ -0,0 +1,75 @@
+import datetime
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from route_settings_builder import models, throttling, gateways
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def rate_limit_settings(settings):
+    """ Запас из двух запросов, пополнение - запрос в секунду """
+    settings.BUILD_RATE_LIMIT_BURST = 2
+    settings.BUILD_RATE_LIMIT_PER_MINUTE = 60
+    return settings
+
+
+def test_consume_build_token(rate_limit_settings, admin_user):
+    """ Запас запросов автора расходуется и пополняется со временем """
+    throttling.consume_build_token(admin_user.id)
+    throttling.consume_build_token(admin_user.id)
+
+    with pytest.raises(throttling.BuildRateLimited) as exception_info:
+        throttling.consume_build_token(admin_user.id)
+    assert exception_info.value.retry_after == 1
+
+    models.BuildRateLimit.objects.filter(author=admin_user).update(
+        updated_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=10))
+    throttling.consume_build_token(admin_user.id)
+    assert models.BuildRateLimit.objects.get(author=admin_user).tokens == pytest.approx(1)
+
+
+def test_consume_build_token_per_author(rate_limit_settings, admin_user, django_user_model):
+    """ Запас запросов у каждого автора свой """
+    rate_limit_settings.BUILD_RATE_LIMIT_BURST = 1
+    other_user = django_user_model.objects.create(username='other')
+
+    throttling.consume_build_token(admin_user.id)
+    throttling.consume_build_token(other_user.id)
+
+    with pytest.raises(throttling.BuildRateLimited):
+        throttling.consume_build_token(admin_user.id)
+
+
+def test_consume_build_token_disabled(rate_limit_settings, admin_user):
+    """ Без пополнения ограничение отключено """
+    rate_limit_settings.BUILD_RATE_LIMIT_PER_MINUTE = 0
+
+    for _ in range(3):
+        throttling.consume_build_token(admin_user.id)
+
+
+def test_check_queue_depth(settings, monkeypatch):
+    """ Переполненная очередь отклоняет строительство, глубина запрашивается не чаще RMQ_QUEUE_DEPTH_TTL """
+    settings.RMQ_QUEUE_MAX_DEPTH = 10
+    settings.RMQ_QUEUE_DEPTH_TTL = 60
+    settings.RMQ_QUEUE_RETRY_AFTER = 30
+    depths = [9, 10]
+
+    async def get_queue_depth():
+        return depths.pop(0)
+
+    monkeypatch.setattr(gateways, 'get_queue_depth', get_queue_depth)
+    monkeypatch.setattr(gateways, '_queue_depth', (0, float('-inf')))
+
+    async_to_sync(gateways.check_queue_depth)()
+    async_to_sync(gateways.check_queue_depth)()
+    assert depths == [10]
+
+    monkeypatch.setattr(gateways, '_queue_depth', (0, float('-inf')))
+    with pytest.raises(throttling.BuildQueueOverloaded) as exception_info:
+        async_to_sync(gateways.check_queue_depth)()
+    assert exception_info.value.retry_after == 30
@@ -0,0 +1,69 @@
+import struct
+
+import numpy as np
+import pytest
+
+from route_settings_builder import models, distances, tiles
+
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture(autouse=True)
+def snapshots_dir(settings, tmp_path):
+    """ Снимки и тайлы во временном каталоге """
+    settings.SNAPSHOTS_DIR = str(tmp_path)
+    distances.place_distances.invalidate()
+
+
+def decode_tile(content: bytes) -> tuple:
+    assert content[:4] == tiles.TILE_MAGIC
+    count, = struct.unpack('<I', content[4:8])
+    place_ids = np.frombuffer(content, dtype='<i4', count=count, offset=8)
+    positions = np.frombuffer(content, dtype='<u2', count=2 * count, offset=8 + 4 * count).reshape(2, count).T
+    return place_ids.tolist(), positions.tolist()
+
+
+def test_get_tile():
+    """ Проверка содержимого тайла """
+    north_west = models.Place.objects.create(name='north west', latitude=45, longitude=-90)
+    south_east = models.Place.objects.create(name='south east', latitude=-45, longitude=90)
+
+    assert decode_tile(tiles.get_tile(0, 0, 0)) == ([north_west.id, south_east.id],
+                                                    [[16384, 23574], [49152, 41961]])
+    assert decode_tile(tiles.get_tile(1, 1, 1)) == ([south_east.id], [[32768, 18386]])
+    assert decode_tile(tiles.get_tile(1, 1, 0)) == ([], [])
+
+
+def test_tiles_invalidation_on_place_change(django_capture_on_commit_callbacks):
+    """ Проверка удаления тайлов, содержащих прежние и новые координаты места """
+    place = models.Place.objects.create(name='place', latitude=45, longitude=-90)
+    tiles.get_tile(1, 0, 0)
+    tiles.get_tile(1, 1, 1)
+    tiles.get_tile(1, 1, 0)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        place.latitude, place.longitude = -45, 90
+        place.save()
+
+    assert not tiles.get_tile_path(1, 0, 0).exists()
+    assert not tiles.get_tile_path(1, 1, 1).exists()
+    assert tiles.get_tile_path(1, 1, 0).exists()
+    assert decode_tile(tiles.get_tile(1, 1, 1))[0] == [place.id]
+
+
+def test_tile_built_from_invalidated_snapshot_is_not_stored(monkeypatch):
+    """ Тайл, построенный по снимку, удаленному во время построения, не сохраняется """
+    place = models.Place.objects.create(name='place', latitude=45, longitude=-90)
+    build_tile = tiles.build_tile
+
+    def build_tile_during_invalidation(*args):
+        content = build_tile(*args)
+        distances.place_distances.invalidate()
+        tiles.invalidate_tiles([(place.latitude, place.longitude)])
+        return content
+
+    monkeypatch.setattr(tiles, 'build_tile', build_tile_during_invalidation)
+
+    assert decode_tile(tiles.get_tile(1, 0, 0))[0] == [place.id]
+    assert not tiles.get_tile_path(1, 0, 0).exists()
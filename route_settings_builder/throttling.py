@@ -0,0 +1,73 @@
+"""
+Ограничение запросов на строительство маршрутов.
+Частота строительства ограничивается для каждого автора отдельно (token bucket в таблице BuildRateLimit,
+общей для процессов сервиса), поэтому один автор не вытесняет строительство остальных.
+Глубина очереди строительства проверяется в gateways.check_queue_depth
+"""
+import math
+
+from django.conf import settings
+from django.db import connection
+
+from route_settings_builder import models
+
+
+class Throttled(Exception):
+    """ Запрос отклонен, повторить можно через retry_after секунд """
+    status_code: int
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        """
+        :param message: сообщение
+        :param retry_after: время до повтора, сек.
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BuildRateLimited(Throttled):
+    """ Превышена частота строительства маршрутов автора """
+    status_code = 429
+
+
+class BuildQueueOverloaded(Throttled):
+    """ Строитель маршрутов не успевает обрабатывать очередь """
+    status_code = 503
+
+
+def consume_build_token(author_id: int) -> None:
+    """
+    Расход запроса на строительство из запаса автора. Запас пополняется со временем и проверяется
+    и расходуется одним запросом
+    :param author_id: id автора
+    :return: None
+    """
+    if (rate := settings.BUILD_RATE_LIMIT_PER_MINUTE / 60) <= 0:
+        return
+
+    table_name = models.BuildRateLimit._meta.db_table  # pylint: disable=protected-access
+    refilled_tokens = 'LEAST(%(burst)s, bucket.tokens + EXTRACT(EPOCH FROM NOW() - bucket.updated_at) * %(rate)s)'
+    params = {'author_id': author_id, 'burst': settings.BUILD_RATE_LIMIT_BURST, 'rate': rate}
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table_name} AS bucket (author_id, tokens, updated_at)
+            VALUES (%(author_id)s, %(burst)s - 1, NOW())
+            ON CONFLICT (author_id) DO UPDATE SET
+                tokens = {refilled_tokens} - 1,
+                updated_at = NOW()
+            WHERE {refilled_tokens} >= 1
+            RETURNING bucket.tokens
+            """,
+            params
+        )
+        if cursor.fetchone() is not None:
+            return
+
+        cursor.execute(f'SELECT {refilled_tokens} FROM {table_name} AS bucket WHERE author_id = %(author_id)s',
+                       params)
+        tokens, = cursor.fetchone()
+
+    raise BuildRateLimited('Превышена частота строительства маршрутов',
+                           retry_after=max(1, math.ceil((1 - tokens) / rate)))
@@ -0,0 +1,128 @@
+"""
+Тайлы мест для карты в компактном двоичном формате.
+Тайл zoom/tile_x/tile_y - ячейка сетки Web Mercator уровня zoom. Формат тайла (little-endian):
+    4 байта   - сигнатура TILE_MAGIC;
+    uint32    - количество мест n;
+    int32[n]  - id мест по возрастанию;
+    uint16[n] - положение мест внутри тайла по x (0..TILE_EXTENT - 1, с запада на восток);
+    uint16[n] - положение мест внутри тайла по y (0..TILE_EXTENT - 1, с севера на юг).
+Тайлы строятся по снимку координат мест и хранятся в файлах каталога SNAPSHOTS_DIR.
+При изменении места удаляются снимок и только тайлы, содержащие его прежние и новые координаты.
+Тайл, построенный по снимку, который был удален или перестроен во время построения, не сохраняется.
+"""
+from pathlib import Path
+from typing import Iterable, Tuple
+import os
+import struct
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+from route_settings_builder import distances, geo
+
+
+TILE_MAGIC = b'PLT1'
+TILE_EXTENT = 1 << 16
+MAX_TILE_ZOOM = 18
+TILE_CONTENT_TYPE = 'application/vnd.place-tile'
+TILES_DIR_NAME = 'tiles'
+
+
+def is_valid_tile(zoom: int, tile_x: int, tile_y: int) -> bool:
+    """
+    Проверка существования тайла
+    :param zoom: масштаб
+    :param tile_x: номер тайла по долготе
+    :param tile_y: номер тайла по широте
+    :return: тайл существует
+    """
+    return 0 <= zoom <= MAX_TILE_ZOOM and 0 <= tile_x < 1 << zoom and 0 <= tile_y < 1 << zoom
+
+
+def get_tile_path(zoom: int, tile_x: int, tile_y: int) -> Path:
+    """
+    Получение пути к файлу тайла
+    :param zoom: масштаб
+    :param tile_x: номер тайла по долготе
+    :param tile_y: номер тайла по широте
+    :return: путь
+    """
+    return Path(settings.SNAPSHOTS_DIR) / TILES_DIR_NAME / str(zoom) / str(tile_x) / f'{tile_y}.bin'
+
+
+def encode_tile(place_ids: np.ndarray, positions: np.ndarray) -> bytes:
+    """
+    Кодирование тайла
+    :param place_ids: id мест по возрастанию
+    :param positions: массив (n, 2) положений мест внутри тайла
+    :return: содержимое тайла
+    """
+    return b''.join((TILE_MAGIC,
+                     struct.pack('<I', len(place_ids)),
+                     place_ids.astype('<i4').tobytes(),
+                     positions[:, 0].astype('<u2').tobytes(),
+                     positions[:, 1].astype('<u2').tobytes()))
+
+
+def build_tile(zoom: int, tile_x: int, tile_y: int) -> bytes:
+    """
+    Построение тайла по снимку координат мест
+    :param zoom: масштаб
+    :param tile_x: номер тайла по долготе
+    :param tile_y: номер тайла по широте
+    :return: содержимое тайла
+    """
+    snapshot = distances.place_distances.get_snapshot()
+    positions = geo.to_mercator(snapshot['coordinates']) * (1 << zoom) - (tile_x, tile_y)
+    is_inside = np.all((positions >= 0) & (positions < 1), axis=1)
+
+    return encode_tile(snapshot['id'][is_inside],
+                       np.minimum(positions[is_inside] * TILE_EXTENT, TILE_EXTENT - 1))
+
+
+def get_tile(zoom: int, tile_x: int, tile_y: int) -> bytes:
+    """
+    Получение тайла. Построенный тайл сохраняется в файл, файл заменяется атомарно.
+    Версия снимка проверяется после замены файла: снимок удаляется до тайлов, поэтому тайл,
+    записанный после удаления тайлов при изменении места, обнаруживается и удаляется
+    :param zoom: масштаб
+    :param tile_x: номер тайла по долготе
+    :param tile_y: номер тайла по широте
+    :return: содержимое тайла
+    """
+    path = get_tile_path(zoom, tile_x, tile_y)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    if (snapshot_version := distances.place_distances.version) is None:
+        distances.place_distances.get_snapshot()
+        snapshot_version = distances.place_distances.version
+
+    content = build_tile(zoom, tile_x, tile_y)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, suffix='.bin')
+    with os.fdopen(file_descriptor, 'wb') as tile_file:
+        tile_file.write(content)
+    os.replace(temporary_path, path)
+
+    if snapshot_version is None or distances.place_distances.version != snapshot_version:
+        path.unlink(missing_ok=True)
+
+    return content
+
+
+def invalidate_tiles(coordinates: Iterable[Tuple[float, float]]) -> None:
+    """
+    Удаление тайлов всех масштабов, содержащих точки
+    :param coordinates: координаты (широта, долгота) точек
+    :return: None
+    """
+    coordinates = np.array(list(coordinates), dtype=np.float64).reshape(-1, 2)
+
+    for zoom in range(MAX_TILE_ZOOM + 1):
+        for tile_x, tile_y in geo.get_grid_cells(coordinates, zoom).tolist():
+            get_tile_path(zoom, tile_x, tile_y).unlink(missing_ok=True)
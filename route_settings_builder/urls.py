@@ -1,11 +1,15 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path
 
 from route_settings_builder.api import api
 
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-
     path('api/v1/', api.urls),
 ]
+
+# в процессах только для API (settings.api) администраторская панель не подключается
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from django.contrib import admin  # pylint: disable=ungrouped-imports
+
+    urlpatterns.insert(0, path('admin/', admin.site.urls))